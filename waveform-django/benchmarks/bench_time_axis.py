@@ -0,0 +1,176 @@
+"""
+Benchmark of building the time axis of a figure with the real
+`WaveformVizTools.get_graph_info`, `get_trace` and `get_xaxis`, before and
+after it was sent as a start and step (`x0` / `dx`) instead of one x-value
+per sample. The "before" methods are loaded from the git history and the
+"after" ones from the current tree.
+
+Run from `waveform-django`: `python benchmarks/bench_time_axis.py [REV]`,
+where `REV` is the commit to take the "before" methods from.
+"""
+import os
+import subprocess
+import sys
+import timeit
+import types
+
+import django
+from django.conf import settings
+from django.db import connection
+import numpy as np
+
+
+# The commit before the time axis was sent as `x0` / `dx`
+BEFORE_REV = 'f65225a'
+# The module with the methods being compared, relative to the repository
+MODULE_PATH = ('waveform-django/waveforms/dash_apps/finished_apps/'
+               'waveform_vis_tools.py')
+# The sampling rate and number of signals of the sample data
+FS = 250
+N_SIGS = 4
+# The username the benchmark settings are made for
+USERNAME = 'benchmark'
+
+
+def set_up_django():
+    """
+    Configure Django with an in-memory database holding the default
+    settings of one user, since `WaveformVizTools` reads them on creation.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    N/A
+
+    """
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website.settings.base')
+    settings.DATABASES['default']['NAME'] = ':memory:'
+    django.setup()
+    from waveforms.models import User, UserSettings
+    with connection.schema_editor() as editor:
+        editor.create_model(User)
+        editor.create_model(UserSettings)
+    UserSettings.objects.create(
+        user=User.objects.create(username=USERNAME,
+                                 email=f'{USERNAME}@example.com')
+    )
+
+
+def load_before(rev):
+    """
+    Load the visualization module as it was at a previous commit.
+
+    Parameters
+    ----------
+    rev : str
+        The commit to load the module from.
+
+    Returns
+    -------
+    module : module
+        The module at `rev`.
+
+    """
+    source = subprocess.run(['git', 'show', f'{rev}:{MODULE_PATH}'],
+                            check=True, capture_output=True,
+                            text=True).stdout
+    module = types.ModuleType('waveform_vis_tools_before')
+    exec(compile(source, f'{rev}:{MODULE_PATH}', 'exec'), module.__dict__)
+    return module
+
+
+def time_axis_before(tools, signals):
+    """
+    Build the traces and x-axes of every subplot the way
+    `create_final_figure` did, with one x-value per sample.
+
+    Parameters
+    ----------
+    tools : WaveformVizTools
+        The visualization tools at the "before" commit.
+    signals : list[ndarray]
+        The y-values of each signal.
+
+    Returns
+    -------
+    N/A : list
+        The trace and x-axis of each subplot.
+
+    """
+    axes = []
+    for idx,y_vals in enumerate(signals):
+        x_vals, y_vals, x_string, y_string, *_ = tools.get_graph_info(
+            idx, len(y_vals), 0, y_vals, FS
+        )
+        trace = tools.get_trace(x_vals, y_vals, x_string, y_string, 'N/A')
+        xaxis = tools.get_xaxis(x_vals, idx == (len(signals)-1), None)
+        axes.append((trace, xaxis))
+    return axes
+
+
+def time_axis_after(tools, signals):
+    """
+    Build the traces and x-axes of every subplot the way
+    `create_final_figure` does now, with a start and step.
+
+    Parameters
+    ----------
+    tools : WaveformVizTools
+        The visualization tools of the current tree.
+    signals : list[ndarray]
+        The y-values of each signal.
+
+    Returns
+    -------
+    N/A : list
+        The trace and x-axis of each subplot.
+
+    """
+    axes = []
+    for idx,y_vals in enumerate(signals):
+        x_step, y_vals, x_string, y_string, *_ = tools.get_graph_info(
+            idx, len(y_vals), 0, y_vals, FS
+        )
+        x_range = (-tools.TIME_RANGE_MIN,
+                   -tools.TIME_RANGE_MIN + x_step*(len(y_vals)-1))
+        trace = tools.get_trace(x_range[0], x_step, y_vals, x_string,
+                                y_string, 'N/A')
+        xaxis = tools.get_xaxis(x_range, idx == (len(signals)-1), None)
+        axes.append((trace, xaxis))
+    return axes
+
+
+if __name__ == '__main__':
+    set_up_django()
+    from waveforms.dash_apps.finished_apps import waveform_vis_tools
+    before = load_before(sys.argv[1] if len(sys.argv) > 1 else BEFORE_REV)
+    before_tools = before.WaveformVizTools(USERNAME)
+    after_tools = waveform_vis_tools.WaveformVizTools(USERNAME)
+
+    # The displayed time range of the default settings
+    n_samples = int(FS * (after_tools.TIME_RANGE_MIN
+                          + after_tools.TIME_RANGE_MAX))
+    rng = np.random.default_rng(0)
+    signals = [rng.standard_normal(n_samples).astype(np.float32)
+               for _ in range(N_SIGS)]
+
+    # Both must place the samples and ticks the same
+    for (trace_before, xaxis_before), (trace_after, xaxis_after) in zip(
+            time_axis_before(before_tools, signals),
+            time_axis_after(after_tools, signals)):
+        x_vals = (trace_after.x0
+                  + trace_after.dx*np.arange(len(trace_after.y)))
+        assert np.allclose(trace_before.x, x_vals)
+        assert xaxis_before['tickvals'] == xaxis_after['tickvals']
+        assert xaxis_before['ticktext'] == xaxis_after['ticktext']
+
+    n_runs = 20
+    for name, func, tools in [('before', time_axis_before, before_tools),
+                              ('after', time_axis_after, after_tools)]:
+        best = min(timeit.repeat(lambda: func(tools, signals),
+                                 number=n_runs, repeat=5)) / n_runs
+        print(f'{name}: {best*1e3:.3f} ms per figure')
@@ -1,38 +1,222 @@
-from datetime import datetime
+import csv
+from datetime import datetime, timedelta
+import gzip
+import json
 import os
 
-import pandas as pd
+from django.db.models import BooleanField, Value
 import pytz
 
+from waveforms.exports import (ANNOTATION_FIELDS, iter_annotations_csv, pq,
+                               write_annotations_parquet,
+                               write_consensus_parquet)
 from waveforms.models import Annotation
 from website.settings import base
 
 
-def update_annotations():
+# The column names of the backup CSV files, `deleted` marks the annotations
+# deleted since the previous backup
+BACKUP_COLUMNS = ['username', 'project', 'record', 'event', 'decision',
+                  'comments', 'decision_date', 'is_adjudication', 'deleted']
+# The fields which identify an annotation across backups
+KEY_FIELDS = ['user__username', 'project', 'record', 'event',
+              'is_adjudication']
+# Records the time of the last backup and of the last full backup
+WATERMARK_FILE = 'watermark.json'
+# Records the annotations in the backups, to find which were deleted since
+KEYS_FILE = 'backup-keys.csv.gz'
+# The latest copies of the annotations and per-event consensus as Parquet
+ANNOTATIONS_PARQUET_FILE = 'all-anns.parquet'
+CONSENSUS_PARQUET_FILE = 'event-consensus.parquet'
+
+
+def read_watermark(backup_dir):
+    """
+    Read the start time of the last backup and of the last full backup.
+
+    Parameters
+    ----------
+    backup_dir : str
+        The directory of the backups.
+
+    Returns
+    -------
+    N/A : dict
+        The `last_date` and `last_full` backup times (datetime.datetime), or
+        None if there has not been a backup.
+
+    """
+    try:
+        with open(os.path.join(backup_dir, WATERMARK_FILE), 'r') as f:
+            watermark = json.load(f)
+    except FileNotFoundError:
+        return None
+    return {k: datetime.fromisoformat(v) for k,v in watermark.items()}
+
+
+def write_watermark(backup_dir, watermark):
     """
-    Automatically download the annotations to a CSV file as a cron job.
+    Record the start time of the last backup and of the last full backup.
 
     Parameters
     ----------
+    backup_dir : str
+        The directory of the backups.
+    watermark : dict
+        The `last_date` and `last_full` backup times (datetime.datetime).
+
+    Returns
+    -------
     N/A
 
+    """
+    # Replace the file at once so an interrupted backup keeps the old one
+    temp_path = os.path.join(backup_dir, WATERMARK_FILE + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump({k: v.isoformat() for k,v in watermark.items()}, f)
+    os.replace(temp_path, os.path.join(backup_dir, WATERMARK_FILE))
+
+
+def read_backup_keys(backup_dir):
+    """
+    Read the annotations which were in the backups as of the last backup.
+
+    Parameters
+    ----------
+    backup_dir : str
+        The directory of the backups.
+
+    Returns
+    -------
+    N/A : set[tuple]
+        The values of `KEY_FIELDS` of each annotation, as strings, or None
+        if they have not been recorded.
+
+    """
+    try:
+        with gzip.open(os.path.join(backup_dir, KEYS_FILE), 'rt',
+                       newline='', encoding='utf-8') as f:
+            return set(tuple(k) for k in csv.reader(f))
+    except FileNotFoundError:
+        return None
+
+
+def write_backup_keys(backup_dir, keys):
+    """
+    Record the annotations which are in the backups.
+
+    Parameters
+    ----------
+    backup_dir : str
+        The directory of the backups.
+    keys : set[tuple]
+        The values of `KEY_FIELDS` of each annotation, as strings.
+
+    Returns
+    -------
+    N/A
+
+    """
+    # Replace the file at once so an interrupted backup keeps the old one
+    temp_path = os.path.join(backup_dir, KEYS_FILE + '.tmp')
+    with gzip.open(temp_path, 'wt', newline='', encoding='utf-8') as f:
+        csv.writer(f, lineterminator='\n').writerows(sorted(keys))
+    os.replace(temp_path, os.path.join(backup_dir, KEYS_FILE))
+
+
+def update_parquet_files(backup_dir):
+    """
+    Replace the Parquet copies of all the annotations and of the per-event
+    consensus, which can be read with
+    `pyarrow.parquet.read_table(path, memory_map=True)`.
+
+    Parameters
+    ----------
+    backup_dir : str
+        The directory of the backups.
+
     Returns
     -------
     N/A
 
+    """
+    # Write temporary files and then replace the old ones at once so
+    # readers never see a partial file
+    annotations_path = os.path.join(backup_dir, ANNOTATIONS_PARQUET_FILE)
+    write_annotations_parquet(
+        annotations_path + '.tmp',
+        Annotation.objects.order_by('id').values_list(*ANNOTATION_FIELDS)
+    )
+    consensus_path = os.path.join(backup_dir, CONSENSUS_PARQUET_FILE)
+    write_consensus_parquet(consensus_path + '.tmp')
+    os.replace(annotations_path + '.tmp', annotations_path)
+    os.replace(consensus_path + '.tmp', consensus_path)
+
+
+def update_annotations(backup_dir=base.BACKUP_DIR):
+    """
+    Automatically back up the annotations to a gzipped CSV file as a cron
+    job. Only the annotations made or changed since the last backup started
+    (by their server-side `modified_at`, since `decision_date` is set by the
+    client) and the keys of those deleted since are written,
+    except every `BACKUP_FULL_INTERVAL` days when all of the annotations
+    are. Nothing is written if nothing changed. The Parquet copies are also
+    updated if pyarrow is installed.
+
+    To restore the annotations, start from the latest full backup and apply
+    every later changes backup in order, replacing the annotation with the
+    same `KEY_FIELDS` by each row, or deleting it if the row is `deleted`.
+
+    Parameters
+    ----------
+    backup_dir : str, optional
+        The directory of the backups.
+
+    Returns
+    -------
+    out_file : str
+        The backup file written, or None if nothing changed.
+
     """
     # Update the annotation CSV file each night at midnight.
-    all_anns = Annotation.objects.all()
-    csv_df = pd.DataFrame.from_dict({
-        'username': [a.user.username for a in all_anns],
-        'project' : [a.project for a in all_anns],
-        'record': [a.record for a in all_anns],
-        'event': [a.event for a in all_anns],
-        'decision': [a.decision for a in all_anns],
-        'comments': [a.comments for a in all_anns],
-        'decision_date': [str(a.decision_date) for a in all_anns],
-        'is_adjudication': [a.is_adjudication for a in all_anns],
-    })
-    file_name = datetime.now(pytz.timezone(base.TIME_ZONE)).strftime('all-anns_%H_%M_%d_%m_%Y.csv')
-    out_file = os.path.join(base.HEAD_DIR, 'backups', file_name)
-    csv_df.to_csv(out_file, sep=',', index=False)
+    # Taken before reading the annotations so a change made during the run
+    # is backed up again by the next one rather than missed
+    now = datetime.now(pytz.timezone(base.TIME_ZONE))
+    watermark = read_watermark(backup_dir)
+    backup_keys = read_backup_keys(backup_dir)
+    keys = set(tuple(str(v) for v in k) for k in
+               Annotation.objects.values_list(*KEY_FIELDS).iterator())
+    all_anns = Annotation.objects.order_by('id')
+    # Deletions are only known if the keys of the last backup were recorded
+    if (watermark and (backup_keys is not None)
+            and (now - watermark['last_full'] <
+                 timedelta(days=base.BACKUP_FULL_INTERVAL))):
+        backup_type = 'changes'
+        all_anns = all_anns.filter(modified_at__gt=watermark['last_date'])
+        deleted_keys = sorted(backup_keys - keys)
+        if (not deleted_keys) and (not all_anns.exists()):
+            return None
+    else:
+        backup_type = 'full'
+        watermark = {'last_full': now}
+        deleted_keys = []
+    watermark['last_date'] = now
+
+    file_name = now.strftime(f'all-anns_{backup_type}_%H_%M_%d_%m_%Y.csv.gz')
+    out_file = os.path.join(backup_dir, file_name)
+    all_anns = all_anns.annotate(
+        deleted=Value(False, output_field=BooleanField())
+    ).values_list(*ANNOTATION_FIELDS, 'deleted')
+    with gzip.open(out_file, 'wt', newline='', encoding='utf-8') as f:
+        for line in iter_annotations_csv(all_anns, BACKUP_COLUMNS):
+            f.write(line)
+        writer = csv.writer(f, lineterminator='\n')
+        for username, project, record, event, is_adj in deleted_keys:
+            writer.writerow([username, project, record, event, '', '', '',
+                             is_adj, True])
+
+    write_backup_keys(backup_dir, keys)
+    write_watermark(backup_dir, watermark)
+    if pq is not None:
+        update_parquet_files(backup_dir)
+    return out_file
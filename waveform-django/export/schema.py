@@ -1,10 +1,155 @@
+import base64
+
 import graphene
+from graphene.relay import PageInfo
 from graphene_django.types import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
+from promise import Promise
+from promise.dataloader import DataLoader
 
 from waveforms.models import User, Annotation, UserSettings
 
 
+# The prefix of the cursors of the connections
+CURSOR_PREFIX = 'keyset:'
+
+
+class UserLoader(DataLoader):
+    """
+    Load the users of every annotation or user settings of a response with
+    one query.
+    """
+    def batch_load_fn(self, keys):
+        """
+        Get the users with the requested IDs.
+
+        Parameters
+        ----------
+        keys : list[int]
+            The IDs of the users.
+
+        Returns
+        -------
+        N/A : Promise
+            The User of each ID.
+
+        """
+        users = User.objects.in_bulk(keys)
+        return Promise.resolve([users.get(k) for k in keys])
+
+
+def get_user_loader(context):
+    """
+    Get the user loader of a request, so each user is fetched at most once
+    and together with the others.
+
+    Parameters
+    ----------
+    context : HttpRequest
+        The request being answered.
+
+    Returns
+    -------
+    N/A : UserLoader
+        The user loader of the request.
+
+    """
+    if context is None:
+        return UserLoader()
+    if not hasattr(context, 'user_loader'):
+        context.user_loader = UserLoader()
+    return context.user_loader
+
+
+def to_cursor(pk):
+    """
+    Get the cursor of a row.
+
+    Parameters
+    ----------
+    pk : int
+        The primary key of the row.
+
+    Returns
+    -------
+    N/A : str
+        The opaque cursor of the row.
+
+    """
+    return base64.b64encode(f'{CURSOR_PREFIX}{pk}'.encode()).decode()
+
+
+def from_cursor(cursor):
+    """
+    Get the primary key of the row of a cursor.
+
+    Parameters
+    ----------
+    cursor : str
+        The cursor of the row.
+
+    Returns
+    -------
+    N/A : int
+        The primary key of the row.
+
+    """
+    try:
+        value = base64.b64decode(cursor).decode()
+        assert value.startswith(CURSOR_PREFIX)
+        return int(value[len(CURSOR_PREFIX):])
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+class KeysetConnectionField(DjangoFilterConnectionField):
+    """
+    A filtered connection whose cursors hold the primary key of each row, so
+    every page is read with an indexed `WHERE pk > after LIMIT first`
+    instead of an offset and a count of every row.
+    """
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        first = args.get('first')
+        last = args.get('last')
+        if (first is None) and (last is None):
+            first = max_limit
+
+        queryset = iterable.order_by('pk')
+        if args.get('after'):
+            queryset = queryset.filter(pk__gt=from_cursor(args['after']))
+        if args.get('before'):
+            queryset = queryset.filter(pk__lt=from_cursor(args['before']))
+
+        # Read one more row than requested to know if there are more
+        if first is not None:
+            nodes = list(queryset[:first + 1])
+            has_more = len(nodes) > first
+            nodes = nodes[:first]
+            if last is not None:
+                nodes = nodes[-last:]
+            has_next_page = has_more
+            has_previous_page = bool(args.get('after'))
+        else:
+            nodes = list(queryset.reverse()[:last + 1])[::-1]
+            has_more = len(nodes) > last
+            nodes = nodes[-last:]
+            has_next_page = bool(args.get('before'))
+            has_previous_page = has_more
+
+        edges = [connection.Edge(node=node, cursor=to_cursor(node.pk))
+                 for node in nodes]
+        return connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page
+            )
+        )
+
+
 # View results at:
 # http://localhost:8000/waveform-annotation/graphql?query={all_users{edges{node{username,join_date}}}}
 class UserType(DjangoObjectType):
@@ -19,18 +164,19 @@ class UserType(DjangoObjectType):
 class AnnotationType(DjangoObjectType):
     class Meta:
         model = Annotation
-        user = graphene.Field(UserType)
         filter_fields = ['user', 'project', 'record', 'event', 'decision',
                          'comments', 'decision_date']
         interfaces = (graphene.relay.Node, )
 
+    def resolve_user(self, info):
+        return get_user_loader(info.context).load(self.user_id)
+
 
 # View results at:
 # http://localhost:8000/waveform-annotation/graphql?query={all_user_settings{edges{node{user{username},fig_height,fig_width,margin_left,margin_top,margin_right,margin_bottom,grid_color,sig_color,sig_thickness,ann_color,grid_delta_major,max_y_labels,n_ekg_sigs,down_sample_ekg,down_sample,time_range_min,time_range_max,window_size_min,window_size_max}}}}
 class UserSettingsType(DjangoObjectType):
     class Meta:
         model = UserSettings
-        user = graphene.Field(UserType)
         filter_fields = ['user', 'fig_height', 'fig_width', 'margin_left',
                          'margin_top', 'margin_right', 'margin_bottom',
                          'grid_color', 'sig_color', 'sig_thickness',
@@ -40,8 +186,11 @@ class UserSettingsType(DjangoObjectType):
                          'window_size_min', 'window_size_max']
         interfaces = (graphene.relay.Node, )
 
+    def resolve_user(self, info):
+        return get_user_loader(info.context).load(self.user_id)
+
 
 class Query(graphene.ObjectType):
-    all_users = DjangoFilterConnectionField(UserType)
-    all_annotations = DjangoFilterConnectionField(AnnotationType)
-    all_user_settings = DjangoFilterConnectionField(UserSettingsType)
+    all_users = KeysetConnectionField(UserType)
+    all_annotations = KeysetConnectionField(AnnotationType)
+    all_user_settings = KeysetConnectionField(UserSettingsType)
@@ -1,15 +1,55 @@
+import json
+from unittest import mock
+
+from django.test import RequestFactory
 from django.test.testcases import TestCase
+from django.urls import reverse
+from django.utils import timezone
 import graphene
-import json
+from graphene_django.settings import graphene_settings
 from schema import Query
 
-from waveforms.models import Annotation
+from waveforms.models import Annotation, User
+from website.settings import base
 
 
 class TestGraphQL(TestCase):
     """
     Test the GraphQL API queries.
     """
+    def setUp(self):
+        self.schema = graphene.Schema(query=Query, auto_camelcase=False)
+        users = [User.objects.create(username=f'user{i}',
+                                     email=f'user{i}@example.com')
+                 for i in range(3)]
+        for i in range(9):
+            Annotation.objects.create(
+                user=users[i % 3], project='project', record='100',
+                event=f'100_{i}', decision='True', comments='',
+                decision_date=timezone.now()
+            )
+
+    def execute(self, query, **kwargs):
+        """
+        Run a query with the context of a request, as the view does.
+
+        Parameters
+        ----------
+        query : str
+            The query to be run.
+        kwargs : dict
+            The other arguments of `Schema.execute`.
+
+        Returns
+        -------
+        N/A : ExecutionResult
+            The result of the query.
+
+        """
+        return self.schema.execute(
+            query, context_value=RequestFactory().get('/'), **kwargs
+        )
+
     def test_all_annotations(self):
         """
         Test querying for annotations and their attributes.
@@ -23,48 +63,203 @@ class TestGraphQL(TestCase):
         N/A
 
         """
-        schema = graphene.Schema(query=Query, auto_camelcase=False)
         query_correct = """
             query {
                 all_annotations {
-                    user
-                    project
-                    record
-                    event
-                    decision
-                    comments
-                    decision_date
+                    edges {
+                        node {
+                            user {
+                                username
+                            }
+                            project
+                            record
+                            event
+                            decision
+                            comments
+                            decision_date
+                        }
+                    }
                 }
             }
         """
         query_incorrect = """
             query {
                 all_annotations {
-                    user
-                    project
-                    record
-                    event
-                    decision
-                    comments
+                    edges {
+                        node {
+                            user
+                            project
+                            record
+                            event
+                            decision
+                            comments
+                        }
+                    }
                 }
             }
         """
         correct_output = []
         for p in Annotation.objects.all():
             correct_output.append({
-                'user': p.user,
+                'user': {'username': p.user.username},
                 'project': p.project,
                 'record': p.record,
                 'event': p.event,
-                'slug': p.slug,
                 'decision': p.decision,
                 'comments': p.comments,
-                'decision_date': p.decision_date,
+                'decision_date': p.decision_date.isoformat(),
             })
-        result_correct = schema.execute(query_correct)
+        result_correct = self.execute(query_correct)
         self.assertIsNone(result_correct.errors)
-        result_incorrect = schema.execute(query_incorrect)
+        result_incorrect = self.execute(query_incorrect)
         self.assertIsNotNone(result_incorrect.errors)
         result_correct = json.loads(json.dumps(result_correct.to_dict()))['data']['all_annotations']
-        matches = [i for i in result_correct if i not in correct_output]
+        nodes = [e['node'] for e in result_correct['edges']]
+        self.assertEqual(len(nodes), len(correct_output))
+        matches = [i for i in nodes if i not in correct_output]
         self.assertEqual(matches, [])
+
+    def test_batched_users(self):
+        """
+        Test the users of every annotation are read with one query.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        query = """
+            query {
+                all_annotations {
+                    edges { node { event user { username } } }
+                }
+            }
+        """
+        with self.assertNumQueries(2):
+            result = self.execute(query)
+        self.assertIsNone(result.errors)
+        usernames = [e['node']['user']['username']
+                     for e in result.data['all_annotations']['edges']]
+        self.assertEqual(usernames, [f'user{i % 3}' for i in range(9)])
+
+    def test_first_limit(self):
+        """
+        Test pages larger than the maximum page size are rejected.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        query = """
+            query ($first: Int) {
+                all_annotations (first: $first) { edges { node { event } } }
+            }
+        """
+        result = self.execute(query, variables={'first': max_limit})
+        self.assertIsNone(result.errors)
+        result = self.execute(query, variables={'first': max_limit + 1})
+        self.assertIsNotNone(result.errors)
+
+    def test_keyset_pages(self):
+        """
+        Test paging through the annotations forwards and backwards with the
+        cursors of each page.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        forward = """
+            query ($after: String) {
+                all_annotations (first: 4, after: $after) {
+                    edges { node { event } }
+                    pageInfo { endCursor hasNextPage }
+                }
+            }
+        """
+        events = []
+        after = None
+        while True:
+            result = self.execute(forward, variables={'after': after})
+            self.assertIsNone(result.errors)
+            page = result.data['all_annotations']
+            events += [e['node']['event'] for e in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(events, [f'100_{i}' for i in range(9)])
+
+        backward = """
+            query ($before: String) {
+                all_annotations (last: 4, before: $before) {
+                    edges { node { event } }
+                    pageInfo { hasPreviousPage }
+                }
+            }
+        """
+        result = self.execute(backward, variables={'before': after})
+        self.assertIsNone(result.errors)
+        page = result.data['all_annotations']
+        self.assertEqual([e['node']['event'] for e in page['edges']],
+                         [f'100_{i}' for i in range(3, 7)])
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+
+    def test_cost_limit(self):
+        """
+        Test the view rejects nested queries which could resolve too many
+        fields, and runs the others.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        nested = """
+            query {
+                all_users (first: 200) { edges { node {
+                    annotation_set (first: 100) { edges { node {
+                        user { username }
+                    } } }
+                } } }
+            }
+        """
+        response = self.client.post(reverse('graphql'),
+                                    json.dumps({'query': nested}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceeds the maximum cost',
+                      response.json()['errors'][0]['message'])
+
+        with mock.patch.object(base, 'GRAPHQL_MAX_DEPTH', 3):
+            response = self.client.post(reverse('graphql'),
+                                        json.dumps({'query': nested}),
+                                        content_type='application/json')
+        self.assertIn('exceeds the maximum depth',
+                      response.json()['errors'][0]['message'])
+
+        simple = '{ all_users (first: 2) { edges { node { username } } } }'
+        response = self.client.post(reverse('graphql'),
+                                    json.dumps({'query': simple}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']['all_users']['edges']),
+                         2)
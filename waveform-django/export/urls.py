@@ -1,9 +1,11 @@
 from django.urls import path
-from graphene_django.views import GraphQLView
 from schema import schema
 
+from export.views import CostLimitedGraphQLView
+
 
 urlpatterns = [
-    path('graphql', GraphQLView.as_view(graphiql=False, schema=schema),
+    path('graphql', CostLimitedGraphQLView.as_view(graphiql=False,
+                                                   schema=schema),
          name='graphql'),
 ]
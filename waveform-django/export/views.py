@@ -0,0 +1,168 @@
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView
+from graphql import parse
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from graphql.language.ast import (Field, FragmentDefinition, FragmentSpread,
+                                  InlineFragment, IntValue,
+                                  OperationDefinition, Variable)
+
+from website.settings import base
+
+
+def get_page_size(field, variables):
+    """
+    Get the number of nodes a field will return for each of its parents:
+    its `first` or `last` argument, the maximum page size for connections
+    without one, or one for any other field.
+
+    Parameters
+    ----------
+    field : Field
+        The field of the query.
+    variables : dict
+        The variables of the query.
+
+    Returns
+    -------
+    N/A : int
+        The number of nodes of the field.
+
+    """
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    for argument in field.arguments or []:
+        if argument.name.value not in ('first', 'last'):
+            continue
+        value = argument.value
+        if isinstance(value, IntValue):
+            return max(int(value.value), 0)
+        if isinstance(value, Variable):
+            size = (variables or {}).get(value.name.value)
+            if isinstance(size, int):
+                return max(size, 0)
+        return max_limit
+    selections = field.selection_set.selections if field.selection_set else []
+    if any(isinstance(s, Field) and (s.name.value == 'edges')
+           for s in selections):
+        return max_limit
+    return 1
+
+
+def get_query_cost(selection_set, fragments, variables, path=()):
+    """
+    Get the depth and the cost of a selection set, where the cost is the
+    number of fields that could be resolved: each field counts once for
+    every node of the connections it is nested in.
+
+    Parameters
+    ----------
+    selection_set : SelectionSet
+        The selections to be measured.
+    fragments : dict
+        The fragment definitions of the query by name.
+    variables : dict
+        The variables of the query.
+    path : tuple, optional
+        The fragments being expanded, to skip cyclic fragments.
+
+    Returns
+    -------
+    depth : int
+        The deepest nesting of fields of the selections.
+    cost : int
+        The number of fields of the selections.
+
+    """
+    depth = 0
+    cost = 0
+    for selection in selection_set.selections if selection_set else []:
+        if isinstance(selection, Field):
+            if selection.name.value.startswith('__'):
+                continue
+            child_depth, child_cost = get_query_cost(
+                selection.selection_set, fragments, variables, path
+            )
+            depth = max(depth, child_depth + 1)
+            cost += 1 + get_page_size(selection, variables) * child_cost
+        elif isinstance(selection, InlineFragment):
+            child_depth, child_cost = get_query_cost(
+                selection.selection_set, fragments, variables, path
+            )
+            depth = max(depth, child_depth)
+            cost += child_cost
+        elif isinstance(selection, FragmentSpread):
+            name = selection.name.value
+            if (name in path) or (name not in fragments):
+                continue
+            child_depth, child_cost = get_query_cost(
+                fragments[name].selection_set, fragments, variables,
+                path + (name,)
+            )
+            depth = max(depth, child_depth)
+            cost += child_cost
+    return depth, cost
+
+
+class CostLimitedGraphQLView(GraphQLView):
+    """
+    A GraphQL view which rejects queries nested deeper than
+    `GRAPHQL_MAX_DEPTH` or which could resolve more than `GRAPHQL_MAX_COST`
+    fields before running them.
+    """
+    def execute_graphql_request(self, request, data, query, variables,
+                                operation_name, show_graphiql=False):
+        if query:
+            try:
+                document = parse(query)
+            except Exception:
+                # Let the parent view report the syntax error
+                document = None
+            if document is not None:
+                error = self.get_cost_error(document, variables,
+                                            operation_name)
+                if error:
+                    return ExecutionResult(errors=[GraphQLError(error)],
+                                           invalid=True)
+        return super().execute_graphql_request(
+            request, data, query, variables, operation_name,
+            show_graphiql=show_graphiql
+        )
+
+    @staticmethod
+    def get_cost_error(document, variables, operation_name):
+        """
+        Check the depth and cost of the operations of a query.
+
+        Parameters
+        ----------
+        document : Document
+            The parsed query.
+        variables : dict
+            The variables of the query.
+        operation_name : str
+            The operation to be run, or None to check every operation.
+
+        Returns
+        -------
+        N/A : str
+            Why the query is rejected, or None if it may be run.
+
+        """
+        fragments = {d.name.value: d for d in document.definitions
+                     if isinstance(d, FragmentDefinition)}
+        for definition in document.definitions:
+            if not isinstance(definition, OperationDefinition):
+                continue
+            if operation_name and (
+                    not definition.name
+                    or definition.name.value != operation_name):
+                continue
+            depth, cost = get_query_cost(definition.selection_set,
+                                         fragments, variables)
+            if depth > base.GRAPHQL_MAX_DEPTH:
+                return (f'Query depth of {depth} exceeds the maximum depth '
+                        f'of {base.GRAPHQL_MAX_DEPTH}.')
+            if cost > base.GRAPHQL_MAX_COST:
+                return (f'Query cost of {cost} exceeds the maximum cost of '
+                        f'{base.GRAPHQL_MAX_COST}.')
+        return None
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+
+import wfdb
+
+from website.settings import base
+
+
+# Specify the record file locations
+PROJECT_PATH = os.path.join(base.HEAD_DIR, 'record-files')
+
+
+class ProjectCatalog:
+    """
+    An in-process index of the records and events of every project, read
+    from the RECORDS files once and reread only when one of them changes,
+    so requests do not reopen every RECORDS file. The alarm type of each
+    event is read from its header the first time it is needed.
+
+    Attributes
+    ----------
+    project_path : str
+        The directory holding the project folders.
+    check_interval : float
+        The minimum time between checks of the RECORDS files for changes
+        (seconds).
+
+    """
+    def __init__(self, project_path, check_interval):
+        """
+        Initialize ProjectCatalog
+
+        Parameters
+        ----------
+        project_path : str
+            The directory holding the project folders.
+        check_interval : float
+            The minimum time between checks of the RECORDS files for changes
+            (seconds).
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.project_path = project_path
+        self.check_interval = check_interval
+        self._projects = {}
+        self._lock = threading.Lock()
+
+    def get_records(self, project):
+        """
+        Get the records of a project.
+
+        Parameters
+        ----------
+        project : str
+            The project whose records will be retrieved.
+
+        Returns
+        -------
+        N/A : list[str]
+            The records in the order of the project's RECORDS file.
+
+        """
+        return list(self._get_project(project)['records'])
+
+    def get_events(self, project, record=None):
+        """
+        Get the events of a project or of one of its records.
+
+        Parameters
+        ----------
+        project : str
+            The project whose events will be retrieved.
+        record : str, optional
+            Only retrieve the events of this record.
+
+        Returns
+        -------
+        N/A : list[str]
+            The events in the order of the RECORDS files.
+
+        """
+        events = self._get_project(project)['events']
+        if record is not None:
+            return list(events.get(record, []))
+        return [e for r in self._get_project(project)['records']
+                for e in events[r]]
+
+    def get_alarm_type(self, project, record, event):
+        """
+        Get the type of the alarm of an event, which is the first comment of
+        its header.
+
+        Parameters
+        ----------
+        project : str
+            The project of the event.
+        record : str
+            The record of the event.
+        event : str
+            The event whose alarm type will be retrieved.
+
+        Returns
+        -------
+        N/A : str
+            The alarm type (e.g. `Ventricular_Tachycardia`).
+
+        """
+        alarm_types = self._get_project(project)['alarm_types']
+        if event not in alarm_types:
+            header = wfdb.rdheader(os.path.join(self.project_path, project,
+                                                record, event))
+            alarm_types[event] = header.comments[0]
+        return alarm_types[event]
+
+    def clear(self):
+        """
+        Forget every project so they are reread on their next use.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with self._lock:
+            self._projects.clear()
+
+    def _get_project(self, project):
+        """
+        Get the index of a project, rereading its RECORDS files if any of
+        them changed since they were last read.
+
+        Parameters
+        ----------
+        project : str
+            The project to be retrieved.
+
+        Returns
+        -------
+        N/A : dict
+            The `records`, `events` by record, and cached `alarm_types` by
+            event of the project.
+
+        """
+        with self._lock:
+            index = self._projects.get(project)
+            now = time.monotonic()
+            if (index is not None) and (now - index['checked'] < self.check_interval):
+                return index
+            if (index is None) or (self._get_mtimes(project, index['records']) != index['mtimes']):
+                index = self._read_project(project)
+            index['checked'] = now
+            self._projects[project] = index
+            return index
+
+    def _get_mtimes(self, project, records):
+        """
+        Get the modification times of the RECORDS files of a project.
+
+        Parameters
+        ----------
+        project : str
+            The project to be checked.
+        records : list[str]
+            The records of the project.
+
+        Returns
+        -------
+        mtimes : list[float]
+            The modification time of the project's RECORDS file followed by
+            those of its records (None if missing).
+
+        """
+        mtimes = []
+        for path in [[]] + [[r] for r in records]:
+            try:
+                mtimes.append(os.path.getmtime(os.path.join(
+                    self.project_path, project, *path, base.RECORDS_FILE
+                )))
+            except FileNotFoundError:
+                mtimes.append(None)
+        return mtimes
+
+    def _read_project(self, project):
+        """
+        Read the RECORDS files of a project.
+
+        Parameters
+        ----------
+        project : str
+            The project to be read.
+
+        Returns
+        -------
+        N/A : dict
+            The `records`, `events` by record, modification times (`mtimes`)
+            and an empty cache of `alarm_types` of the project.
+
+        """
+        records_path = os.path.join(self.project_path, project,
+                                    base.RECORDS_FILE)
+        with open(records_path, 'r') as f:
+            records = f.read().splitlines()
+        # Read the modification times first so a change made while reading
+        # is picked up by the next check
+        mtimes = self._get_mtimes(project, records)
+        events = {}
+        for record in records:
+            events_path = os.path.join(self.project_path, project, record,
+                                       base.RECORDS_FILE)
+            try:
+                with open(events_path, 'r') as f:
+                    events[record] = [e for e in f.read().splitlines()
+                                      if '_' in e]
+            except FileNotFoundError:
+                events[record] = []
+        return {'records': records, 'events': events, 'mtimes': mtimes,
+                'alarm_types': {}}
+
+
+# The records and events of every project in this process
+catalog = ProjectCatalog(PROJECT_PATH, base.CATALOG_CHECK_INTERVAL)
@@ -1,4 +1,3 @@
-import csv
 import datetime
 import os
 
@@ -8,11 +7,14 @@ import dash_html_components as html
 from django_plotly_dash import DjangoDash
 import numpy as np
 import pytz
-import wfdb
 
-from waveforms.dash_apps.finished_apps.waveform_vis_tools import WaveformVizTools
-from waveforms.models import Annotation, User
-from website.middleware import get_current_user
+from waveforms.catalog import catalog
+from waveforms.dash_apps.finished_apps.waveform_vis_prefetch import figure_prefetcher
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import (
+    DECODE_FIGURE_JS, WaveformVizTools
+)
+from waveforms.models import Annotation, Assignment, User
+from website.middleware import get_current_user, get_request_object
 from website.settings import base
 
 
@@ -134,6 +136,8 @@ app.layout = html.Div([
                 config=plot_config,
                 style={'height': '70vh', 'width': '60vw'}
             ),
+            # The figure with its trace values still encoded
+            dcc.Store(id='the_graph_data'),
         ], style={'display': 'inline-block'})
     ], type='default'),
     # Hidden div inside the app that stores the desired project, record, and event
@@ -189,25 +193,13 @@ def get_all_records_events(project_folder):
         List of all events.
 
     """
-    # Get records
-    records_path = os.path.join(PROJECT_PATH, project_folder,
-                                base.RECORDS_FILE)
-    with open(records_path, 'r') as f:
-        record_list = f.read().splitlines()
-    # Get events
-    event_list = []
-    for record in record_list:
-        event_path = os.path.join(PROJECT_PATH, project_folder, record,
-                                  base.RECORDS_FILE)
-        with open(event_path, 'r') as f:
-            event_list += f.read().splitlines()
-    event_list = [e for e in event_list if '_' in e]
-    return record_list, event_list
+    return (catalog.get_records(project_folder),
+            catalog.get_events(project_folder))
 
 
 def get_user_events(user, project_folder):
     """
-    Get the events assigned to a user in the CSV file.
+    Get the events assigned to a user in a project.
 
     Parameters
     ----------
@@ -222,12 +214,6 @@ def get_user_events(user, project_folder):
         List of events assigned to the user.
 
     """
-    # Find the files
-    BASE_DIR = base.BASE_DIR
-    FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-    FILE_LOCAL = os.path.join('record-files')
-    PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
-
     if user.is_admin and user.practice_status == 'ED':
         record_list, event_list = get_all_records_events(project_folder)
     elif user.practice_status != 'ED':
@@ -237,19 +223,9 @@ def get_user_events(user, project_folder):
             events += i
         return events
     else:
-        csv_path = os.path.join(PROJECT_PATH, project_folder,
-                                base.ASSIGNMENT_FILE)
-        event_list = []
-        with open(csv_path, 'r') as csv_file:
-            csvreader = csv.reader(csv_file, delimiter=',')
-            next(csvreader)
-            for row in csvreader:
-                names = []
-                for val in row[1:]:
-                    if val:
-                        names.append(val)
-                if user.username in names:
-                    event_list.append(row[0])
+        event_list = list(Assignment.objects.filter(
+            user=user, project=project_folder
+        ).order_by('id').values_list('event', flat=True))
         user_ann = Annotation.objects.filter(user=user,
                                              project=project_folder,
                                              is_adjudication=False)
@@ -262,7 +238,7 @@ def get_user_events(user, project_folder):
 
 def get_user_records(user):
     """
-    Get the records assigned to a user in the CSV file.
+    Get the records assigned to a user.
 
     Parameters
     ----------
@@ -307,6 +283,36 @@ def get_user_records(user):
     return user_records
 
 
+def get_next_events(all_events, all_indices, current_event, n_events):
+    """
+    Get the events which follow the current event in the user's order,
+    wrapping around to the beginning like the next button does.
+
+    Parameters
+    ----------
+    all_events : list[str]
+        Every event of the user in the project.
+    all_indices : list[int]
+        The order of `all_events` the user goes through them in.
+    current_event : str
+        The event being viewed.
+    n_events : int
+        The maximum number of events to return.
+
+    Returns
+    -------
+    N/A : list[str]
+        The next events, in order.
+
+    """
+    ordered_events = [all_events[i] for i in all_indices]
+    if current_event not in ordered_events:
+        return []
+    event_idx = ordered_events.index(current_event)
+    next_events = ordered_events[event_idx+1:] + ordered_events[:event_idx]
+    return next_events[:n_events]
+
+
 def get_header_info(project, file_path):
     """
     Return all records/events in header from file path.
@@ -325,13 +331,10 @@ def get_header_info(project, file_path):
         of the records to be read.
 
     """
-    current_user = User.objects.get(username=get_current_user())
-    records_path = os.path.join(PROJECT_PATH, project, file_path,
-                                base.RECORDS_FILE)
-    with open(records_path, 'r') as f:
-        file_contents = f.read().splitlines()
+    current_user = get_request_object(User, username=get_current_user())
     all_events = get_user_events(current_user, project)
-    file_contents = [e for e in file_contents if '_' in e and e in all_events]
+    file_contents = [e for e in catalog.get_events(project, file_path)
+                     if e in all_events]
     return file_contents
 
 
@@ -404,7 +407,7 @@ def get_record_event_options(click_submit, click_previous, click_next,
     # Determine what triggered this function
     ctx = dash.callback_context
     # Prepare to return the record and event value for the user
-    current_user = User.objects.get(username=get_current_user())
+    current_user = get_request_object(User, username=get_current_user())
     # One project at a time
     if current_user.practice_status == 'ED':
         project = list(set(base.ALL_PROJECTS) - set(base.BLACKLIST))[0]
@@ -421,6 +424,7 @@ def get_record_event_options(click_submit, click_previous, click_next,
         user_annotations, key=lambda x: 0 if x.decision=='Save for Later' else 1
     )
     all_events = []
+    all_indices = []
     # Handle initial load
     if not project_value:
         # Completed annotations
@@ -438,6 +442,7 @@ def get_record_event_options(click_submit, click_previous, click_next,
                 all_indices = sorted(list(set(np.arange(len(all_events))) - set(ann_indices))) + ann_indices
                 current_event = all_indices[0]
             else:
+                all_indices = list(range(len(all_events)))
                 current_event = 0
             return_project = all_events[current_event][0]
             return_record = all_events[current_event][1].split('_')[0]
@@ -447,6 +452,8 @@ def get_record_event_options(click_submit, click_previous, click_next,
             return_project = 'N/A'
             return_record = 'N/A'
             return_event = 'N/A'
+        # Only the names of the events are needed from here on
+        all_events = [e[1] for e in all_events]
     else:
         completed_events = [a.event for a in user_annotations if a.project==project_value]
         if current_user.is_admin and current_user.practice_status == 'ED':
@@ -492,32 +499,12 @@ def get_record_event_options(click_submit, click_previous, click_next,
             submit_time = set_timezone.localize(submit_time)
             # Save the annotation to the database only if changes
             # were made or a new annotation
-            try:
-                res = Annotation.objects.get(
-                    user=current_user, project=project_value,
-                    record=record_value, event=event_value,
-                    is_adjudication=False
-                )
-                current_annotation = [res.decision, res.comments]
-                proposed_annotation = [decision_value, comments_value]
-                # Only save annotation if something has changed
-                if current_annotation != proposed_annotation:
-                    annotation = Annotation(
-                        user=current_user, project=project_value,
-                        record=record_value, event=event_value,
-                        decision=decision_value, comments=comments_value,
-                        decision_date=submit_time, is_adjudication=False
-                    )
-                    annotation.update()
-            except Annotation.DoesNotExist:
-                # Create new annotation since none already exist
-                annotation = Annotation(
-                    user=current_user, project=project_value,
-                    record=record_value, event=event_value,
-                    decision=decision_value, comments=comments_value,
-                    decision_date=submit_time, is_adjudication=False
-                )
-                annotation.update()
+            Annotation(
+                user=current_user, project=project_value,
+                record=record_value, event=event_value,
+                decision=decision_value, comments=comments_value,
+                decision_date=submit_time, is_adjudication=False
+            ).submit()
     else:
         # See if record and event was requested (never event without record)
         if set_record != '':
@@ -525,6 +512,15 @@ def get_record_event_options(click_submit, click_previous, click_next,
             return_record = set_record
             return_event = set_event
 
+    # Render the next events in the background so moving forward is fast
+    if ((base.PREFETCH_EVENTS > 0) and (return_event in all_events) and
+        (return_project == (project_value or project))):
+        figure_prefetcher.prefetch(
+            WaveformVizTools(current_user.username), return_project,
+            get_next_events(all_events, all_indices, return_event,
+                            base.PREFETCH_EVENTS)
+        )
+
     # Update the event text
     alarm_text = html.Span([''], style={'fontSize': event_fontsize})
     if ((return_record == 'N/A') or (return_event == 'N/A') or
@@ -534,11 +530,9 @@ def get_record_event_options(click_submit, click_previous, click_next,
                       style={'fontSize': event_fontsize})
         ]
     else:
-        # Get the annotation information
-        ann_path = os.path.join(PROJECT_PATH, return_project,
-                                return_record, return_event)
-        ann = wfdb.rdann(ann_path, 'alm')
-        ann_event = ann.aux_note[0]
+        # Get the alarm type
+        ann_event = catalog.get_alarm_type(return_project, return_record,
+                                           return_event)
         # Update the annotation event text
         alarm_text = [
             html.Span(['{}'.format(ann_event), html.Br(), html.Br()],
@@ -565,8 +559,15 @@ def get_record_event_options(click_submit, click_previous, click_next,
             return_project, return_record, return_event)
 
 
+# Decode the trace values in the browser before plotting them
+app.clientside_callback(
+    DECODE_FIGURE_JS,
+    dash.dependencies.Output('the_graph', 'figure'),
+    [dash.dependencies.Input('the_graph_data', 'data')])
+
+
 @app.callback(
-    [dash.dependencies.Output('the_graph', 'figure'),
+    [dash.dependencies.Output('the_graph_data', 'data'),
      dash.dependencies.Output('reviewer_decision', 'value'),
      dash.dependencies.Output('reviewer_comments', 'value')],
     [dash.dependencies.Input('dropdown_event', 'children')],
@@ -590,8 +591,8 @@ def update_graph(dropdown_event, dropdown_record, dropdown_project):
 
     Returns
     -------
-    N/A : plotly.subplots
-        The final figure.
+    N/A : plotly.subplots, dict
+        The final figure, with its trace values encoded unless it is blank.
     N/A : str
         The cleared decision of the user.
     N/A : str
@@ -611,7 +612,7 @@ def update_graph(dropdown_event, dropdown_record, dropdown_project):
         fig = wvt.create_blank_figure()
         return (fig), None, ''
     # Final figure
-    fig = wvt.create_final_figure(
+    fig = wvt.get_final_figure(
         dropdown_project, dropdown_record, dropdown_event
     )
 
@@ -619,7 +620,7 @@ def update_graph(dropdown_event, dropdown_record, dropdown_project):
     # them otherwise when loading a new record and event.
     if (dropdown_event != '') and (dropdown_event is not None) and (current_user != ''):
         # Get the decision
-        user = User.objects.get(username=current_user)
+        user = get_request_object(User, username=current_user)
         try:
             res = Annotation.objects.get(
                 user=user, project=dropdown_project, record=dropdown_record,
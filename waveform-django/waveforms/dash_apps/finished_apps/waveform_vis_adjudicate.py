@@ -1,18 +1,19 @@
-from collections import Counter
 import datetime
 import os
 
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
+from django.db.models import Max, Q
 from django_plotly_dash import DjangoDash
-import numpy as np
 import pytz
-import wfdb
 
-from waveforms.dash_apps.finished_apps.waveform_vis_tools import WaveformVizTools
-from waveforms.models import Annotation, User
-from website.middleware import get_current_user
+from waveforms.catalog import catalog
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import (
+    DECODE_FIGURE_JS, WaveformVizTools
+)
+from waveforms.models import Annotation, ConflictingEvent, User
+from website.middleware import get_current_user, get_request_object
 from website.settings import base
 
 
@@ -169,6 +170,8 @@ app.layout = html.Div([
                 config=plot_config,
                 style={'height': '70vh', 'width': '60vw'}
             ),
+            # The figure with its trace values still encoded
+            dcc.Store(id='the_graph_data'),
         ], style={'display': 'inline-block'})
     ], type='default'),
     # Hidden div inside the app that stores the desired project, record, and event
@@ -202,70 +205,35 @@ def get_current_conflicting_annotation(project='', record='', event=''):
             (project, record, event)
 
     """
-    # Get info of all non-adjudicated annotations assuming non-unique event
-    # names
-    non_adjudicated_anns = Annotation.objects.filter(is_adjudication=False)
-    all_info = [tuple(ann.values()) for ann in non_adjudicated_anns.values('project','record','event')]
-    unique_anns = Counter(all_info).keys()
-    ann_counts = Counter(all_info).values()
-    # Get completed annotations (should be two but I guess could be more if
-    # glitch or old data)
-    completed_anns = [c[0] for c in list(zip(unique_anns,ann_counts)) if c[1]>=2]
+    # The queue is sorted by completion time with older conflicting
+    # annotations appearing first to predictably traverse the remaining
+    # annotations
+    queue = ConflictingEvent.objects.order_by('completed_at', 'id')
+    next_event = None
+    if project and record and event:
+        try:
+            current = ConflictingEvent.objects.get(project=project,
+                                                   record=record, event=event)
+            next_event = queue.filter(
+                Q(completed_at__gt=current.completed_at) |
+                Q(completed_at=current.completed_at, id__gt=current.id)
+            ).first()
+        except ConflictingEvent.DoesNotExist:
+            # Annotation was just adjudicated, continue from its location
+            current_timestamp = Annotation.objects.filter(
+                project=project, record=record, event=event,
+                is_adjudication=False
+            ).aggregate(Max('decision_date'))['decision_date__max']
+            if current_timestamp:
+                next_event = queue.filter(
+                    completed_at__gt=current_timestamp
+                ).first()
+    # Return to the oldest conflicting annotation at the end of the queue
+    if next_event is None:
+        next_event = queue.first()
 
-    # Sort by `decision_date` with older conflicting annotations appearing
-    # first to predictable traverse the remaining annotations.
-    sorted_anns = []
-    for c in completed_anns:
-        # Get all the annotations for this event
-        all_anns = Annotation.objects.filter(
-            project=c[0], record=c[1], event=c[2]
-        )
-        is_adjudicated = True in [a.is_adjudication for a in all_anns]
-        if not is_adjudicated:
-            # Make sure the annotations are complete
-            current_anns = all_anns.filter(is_adjudication=False).values_list('decision', flat=True)
-            is_conflicting = len(set(current_anns)) >= 2
-            # Make sure there are conflicting decisions and no adjudications
-            # already
-            if is_conflicting:
-                current_ann = non_adjudicated_anns.filter(
-                    project=c[0], record=c[1], event=c[2]
-                )
-                # Get the most recent annotation (i.e. time of completion)
-                current_ann = sorted(current_ann, key=lambda x: x.decision_date)[-1]
-                sorted_anns.append(c + (current_ann.decision_date,))
-    sorted_anns = sorted(sorted_anns, key=lambda x: x[-1].timestamp())
-
-    # The oldest conflicting annotation (project, record, event)
-    if sorted_anns:
-        if project and record and event:
-            # Get the index of the current annotation
-            try:
-                current_index = [a[:-1] for a in sorted_anns].index((project,record,event)) + 1
-            except ValueError:
-                # Annotation was just adjudicated, return to previous location
-                current_annotations = Annotation.objects.filter(
-                    project=project, record=record, event=event,
-                    is_adjudication=False
-                )
-                current_timestamp = sorted(
-                    current_annotations, key=lambda x: x.decision_date
-                )[-1].decision_date
-                current_index = np.searchsorted(
-                    [a[-1] for a in sorted_anns[::-1]], current_timestamp,
-                    side='left'
-                ) - 1
-                if (current_index < 0) or (current_index >= len(sorted_anns)):
-                    return sorted_anns[0][:-1]
-                else:
-                    return sorted_anns[current_index][:-1]
-            # Return the next one unless at the end of the list
-            if current_index >= len(sorted_anns):
-                return sorted_anns[0][:-1]
-            else:
-                return sorted_anns[current_index][:-1]
-        else:
-            return sorted_anns[0][:-1]
+    if next_event:
+        return (next_event.project, next_event.record, next_event.event)
     else:
         return ('N/A', 'N/A', 'N/A')
 
@@ -333,7 +301,7 @@ def get_record_event_options(submit_true, submit_false, submit_uncertain,
     # Determine what triggered this function
     ctx = dash.callback_context
     # Prepare to return the record and event value for the user
-    current_user = User.objects.get(username=get_current_user())
+    current_user = get_request_object(User, username=get_current_user())
 
     # Handle initial load
     if not project_value:
@@ -356,35 +324,12 @@ def get_record_event_options(submit_true, submit_false, submit_uncertain,
             decision_value = click_id.split('_')[1].capitalize()
             # Save the annotation to the database only if changes
             # were made or a new annotation
-            try:
-                res = Annotation.objects.get(
-                    user=current_user, project=project_value,
-                    record=record_value, event=event_value,
-                    is_adjudication=True
-                )
-                current_annotation = [res.decision, res.comments]
-                proposed_annotation = [decision_value, comments_value]
-                # Only save annotation if something has changed
-                if current_annotation != proposed_annotation:
-                    # Delete the old one
-                    res.delete()
-                    # Save the new one
-                    annotation = Annotation(
-                        user=current_user, project=project_value,
-                        record=record_value, event=event_value,
-                        decision=decision_value, comments=comments_value,
-                        decision_date=submit_time, is_adjudication=True
-                    )
-                    annotation.save()
-            except Annotation.DoesNotExist:
-                # Create new annotation since none already exist
-                annotation = Annotation(
-                    user=current_user, project=project_value,
-                    record=record_value, event=event_value,
-                    decision=decision_value, comments=comments_value,
-                    decision_date=submit_time, is_adjudication=True
-                )
-                annotation.save()
+            Annotation(
+                user=current_user, project=project_value,
+                record=record_value, event=event_value,
+                decision=decision_value, comments=comments_value,
+                decision_date=submit_time, is_adjudication=True
+            ).submit()
             # We already know the current project, record, and event
             return_project, return_record, return_event = get_current_conflicting_annotation(
                 project=project_value, record=record_value, event=event_value
@@ -427,11 +372,9 @@ def get_record_event_options(submit_true, submit_false, submit_uncertain,
                           style={'fontSize': event_fontsize})
             ]
         else:
-            # Get the annotation information
-            ann_path = os.path.join(PROJECT_PATH, return_project,
-                                    return_record, return_event)
-            ann = wfdb.rdann(ann_path, 'alm')
-            ann_event = ann.aux_note[0]
+            # Get the alarm type
+            ann_event = catalog.get_alarm_type(return_project, return_record,
+                                               return_event)
             # Update the annotation event text
             alarm_text = [
                 html.Span(['{}'.format(ann_event), html.Br(), html.Br()],
@@ -442,8 +385,15 @@ def get_record_event_options(submit_true, submit_false, submit_uncertain,
             return_project, return_record, return_event)
 
 
+# Decode the trace values in the browser before plotting them
+app.clientside_callback(
+    DECODE_FIGURE_JS,
+    dash.dependencies.Output('the_graph', 'figure'),
+    [dash.dependencies.Input('the_graph_data', 'data')])
+
+
 @app.callback(
-    [dash.dependencies.Output('the_graph', 'figure'),
+    [dash.dependencies.Output('the_graph_data', 'data'),
      dash.dependencies.Output('annotation_table', 'children'),
      dash.dependencies.Output('reviewer_comments', 'value')],
     [dash.dependencies.Input('dropdown_project', 'children'),
@@ -467,8 +417,8 @@ def update_graph(dropdown_project, dropdown_record, dropdown_event):
 
     Returns
     -------
-    N/A : plotly.subplots
-        The final figure.
+    N/A : plotly.subplots, dict
+        The final figure, with its trace values encoded unless it is blank.
     N/A : html.Table
         The table of previous annotations for the current adjudication.
 
@@ -506,7 +456,7 @@ def update_graph(dropdown_project, dropdown_record, dropdown_event):
         fig = wvt.create_blank_figure()
         return (fig), return_table, ''
     # Figure
-    fig = wvt.create_final_figure(
+    fig = wvt.get_final_figure(
         dropdown_project, dropdown_record, dropdown_event
     )
 
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import threading
+
+from website.settings import base
+
+
+class EventCache:
+    """
+    A thread-safe, least-recently-used cache of decoded event data which
+    evicts by the total size of its values rather than their count. It is
+    shared by every request handled by the current process.
+
+    Attributes
+    ----------
+    max_bytes : int
+        The maximum total size of the cached values (bytes).
+    hits : int
+        The number of lookups which found a value.
+    misses : int
+        The number of lookups which did not find a value.
+    evictions : int
+        The number of values removed to make room for newer ones.
+
+    """
+    def __init__(self, max_bytes):
+        """
+        Initialize EventCache
+
+        Parameters
+        ----------
+        max_bytes : int
+            The maximum total size of the cached values (bytes).
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._n_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value for `key` and mark it as recently used.
+
+        Parameters
+        ----------
+        key : tuple
+            The key the value was stored with.
+
+        Returns
+        -------
+        N/A : object
+            The cached value, or None if it is not cached.
+
+        """
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, n_bytes):
+        """
+        Store a value, evicting the least recently used values until the
+        cache fits in `max_bytes` again.
+
+        Parameters
+        ----------
+        key : tuple
+            The key to store the value with.
+        value : object
+            The value to be cached.
+        n_bytes : int
+            The size of the value (bytes).
+
+        Returns
+        -------
+        N/A
+
+        """
+        # Never let a single value flush the whole cache
+        if n_bytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._n_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, n_bytes)
+            self._n_bytes += n_bytes
+            while self._n_bytes > self.max_bytes:
+                _, (_, old_bytes) = self._entries.popitem(last=False)
+                self._n_bytes -= old_bytes
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every value and reset the counters.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Return the usage counters of the cache, used to tune its size.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A : dict
+            The hits, misses, evictions, number of entries, current size
+            (bytes) and maximum size (bytes) of the cache.
+
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._n_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# The decoded event headers and signal windows of this process
+event_cache = EventCache(base.EVENT_CACHE_BYTES)
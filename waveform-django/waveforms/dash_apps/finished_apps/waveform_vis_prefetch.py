@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from django.db import connection
+
+from website.settings import base
+
+
+logger = logging.getLogger(__name__)
+
+
+class FigurePrefetcher:
+    """
+    Render the figures of the events a user is likely to view next in
+    background threads, so they are already cached when requested. Each
+    worker process has its own pool of threads.
+
+    Attributes
+    ----------
+    max_workers : int
+        The number of threads rendering figures.
+
+    """
+    def __init__(self, max_workers):
+        """
+        Initialize FigurePrefetcher
+
+        Parameters
+        ----------
+        max_workers : int
+            The number of threads rendering figures.
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def prefetch(self, wvt, project, events):
+        """
+        Queue the figures of the events to be rendered and cached, skipping
+        any which are already queued for the same user.
+
+        Parameters
+        ----------
+        wvt : WaveformVizTools
+            The waveform tools of the user who will view the events.
+        project : str
+            The project of the events.
+        events : list[str]
+            The events to be rendered, in the order they will be viewed.
+
+        Returns
+        -------
+        futures : list[concurrent.futures.Future]
+            The newly queued renders.
+
+        """
+        futures = []
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='figure-prefetch'
+                )
+            for event in events:
+                key = (wvt.CURRENT_USER.username, project, event)
+                if key in self._pending:
+                    continue
+                self._pending.add(key)
+                futures.append(
+                    self._executor.submit(self._render, wvt, key)
+                )
+        return futures
+
+    def _render(self, wvt, key):
+        """
+        Render and cache a single figure.
+
+        Parameters
+        ----------
+        wvt : WaveformVizTools
+            The waveform tools of the user who will view the event.
+        key : tuple
+            The username, project and event of the figure.
+
+        Returns
+        -------
+        N/A
+
+        """
+        _, project, event = key
+        try:
+            wvt.get_final_figure(project, event.split('_')[0], event)
+        except Exception:
+            # The user will see the error when they open the event
+            logger.exception(f'Could not prefetch {project}/{event}')
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            # Threads do not share the database connection of the request
+            connection.close()
+
+
+# The figure prefetcher of this process
+figure_prefetcher = FigurePrefetcher(base.PREFETCH_WORKERS)
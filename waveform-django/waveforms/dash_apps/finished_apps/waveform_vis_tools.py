@@ -1,12 +1,20 @@
+import base64
+from functools import lru_cache
+import hashlib
+import json
 import math
 import os
 
+from django.core.cache import cache
 import numpy as np
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
+from plotly.utils import PlotlyJSONEncoder
 import wfdb
 
+from waveforms.dash_apps.finished_apps.waveform_vis_cache import event_cache
 from waveforms.models import User, UserSettings
+from website.middleware import get_request_object
 from website.settings import base
 
 
@@ -16,6 +24,360 @@ FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
 FILE_LOCAL = os.path.join('record-files')
 PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
 ALL_PROJECTS = base.ALL_PROJECTS
+# The digital values WFDB uses to mark invalid samples, by signal format
+INVALID_SAMPLES = {'80': -128, '16': -32768, '61': -32768, '160': -32768,
+                   '212': -2048, '310': -512, '311': -512}
+# The files which make up each event
+EVENT_FILE_EXTENSIONS = ['.hea', '.mat', '.alm']
+# The user settings which change how the final figure is rendered
+RENDER_SETTINGS = [f.name for f in UserSettings._meta.fields
+                   if f.name not in ['id', 'user']]
+# Increase whenever the rendering changes so stale cached figures are ignored
+FIGURE_CACHE_VERSION = 10
+# The typed array used to send the trace values to the browser
+TRACE_DTYPE = 'f4'
+# Decodes the typed arrays of a figure from `encode_figure` in the browser,
+# used as the clientside callback from the figure store to the graph. This
+# follows Plotly's typed array format, which plotly.js only reads natively
+# from version 2.28.
+DECODE_FIGURE_JS = """
+function(fig) {
+    if (!fig) {
+        return window.dash_clientside.no_update;
+    }
+    var arrayTypes = {
+        'i1': Int8Array, 'u1': Uint8Array, 'i2': Int16Array,
+        'u2': Uint16Array, 'i4': Int32Array, 'u4': Uint32Array,
+        'f4': Float32Array, 'f8': Float64Array
+    };
+    var decode = function(vals) {
+        var bin = window.atob(vals.bdata);
+        var bytes = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) {
+            bytes[i] = bin.charCodeAt(i);
+        }
+        return new arrayTypes[vals.dtype](bytes.buffer);
+    };
+    var data = fig.data.map(function(trace) {
+        var decoded = Object.assign({}, trace);
+        ['x', 'y'].forEach(function(axis) {
+            if (trace[axis] && (trace[axis].bdata !== undefined)) {
+                decoded[axis] = decode(trace[axis]);
+            }
+        });
+        return decoded;
+    });
+    return Object.assign({}, fig, {data: data});
+}
+"""
+# Buckets smaller than this gain nothing from keeping their min and max
+MIN_BUCKET_SIZE = 3
+# The names of the EKG, BP and Resp signals in the order they are preferred
+# for display, in upper case since they are matched case-insensitively
+EKG_SIGS = ['II', 'V', 'V5', 'V1', 'V2', 'V3', 'V4', 'V6', 'I', 'III', 'AVR',
+            'AVF', 'AVL', 'MCL']
+BP_SIGS = ['ABP', 'AR1', 'AR2', 'AR3', 'IBP1', 'IBP2', 'IBP3', 'IBP4', 'IBP5',
+           'IBP6', 'IBP7', 'IBP8']
+RESP_SIGS = ['PLETH']
+# Signals whose values are all within this of zero are considered empty
+FLAT_TOLERANCE = 1e-2
+# The common `signal_std` settings whose y-axis ranges are computed once per
+# event and signal, other settings are computed whenever a figure is created
+SIGNAL_STD_VALUES = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+# The time range (seconds before and after the alarm) of the default user
+# settings, whose signal statistics are written by `build_signal_store`
+STATS_TIME_RANGE = (UserSettings._meta.get_field('time_range_min').default,
+                    UserSettings._meta.get_field('time_range_max').default)
+# Increase whenever the signal statistics change so stale stored ones are
+# ignored by the viewer and rewritten by `build_signal_store`
+SIGNAL_STATS_VERSION = 2
+
+
+
+def get_event_mtime(event_path):
+    """
+    Return the latest modification time of any of the files of the event.
+
+    Parameters
+    ----------
+    event_path : str
+        The path of the WFDB record for the event (without extension).
+
+    Returns
+    -------
+    mtime : float
+        The latest modification time (seconds since epoch), or 0 if none of
+        the files exist.
+
+    """
+    mtime = 0
+    for ext in EVENT_FILE_EXTENSIONS:
+        try:
+            mtime = max(mtime, os.path.getmtime(event_path + ext))
+        except FileNotFoundError:
+            pass
+    return mtime
+
+
+def get_store_path(event_path):
+    """
+    Return the location of the event in the signal store created by the
+    `build_signal_store` command.
+
+    Parameters
+    ----------
+    event_path : str
+        The path of the WFDB record for the event (without extension).
+
+    Returns
+    -------
+    N/A : str
+        The path of the event in the signal store (without extension). The
+        signals are in the `.npy` file and the header in the `.json` file.
+
+    """
+    return os.path.join(base.SIGNAL_STORE_DIR,
+                        os.path.relpath(event_path, PROJECT_PATH))
+
+
+def encode_array(vals, dtype=TRACE_DTYPE):
+    """
+    Encode an array as a base64 typed array, which is several times smaller
+    than writing each value as decimal text.
+
+    Parameters
+    ----------
+    vals : ndarray
+        The values to be encoded.
+    dtype : str, optional
+        The typed array to encode the values as (`f4`, `i2`, etc.).
+
+    Returns
+    -------
+    N/A : dict
+        The `dtype` and base64 encoded little-endian bytes (`bdata`) of the
+        values.
+
+    """
+    bdata = np.asarray(vals, dtype='<' + dtype).tobytes()
+    return {'dtype': dtype, 'bdata': base64.b64encode(bdata).decode('ascii')}
+
+
+def decode_array(typed_array):
+    """
+    Decode a typed array from `encode_array`.
+
+    Parameters
+    ----------
+    typed_array : dict
+        The `dtype` and base64 encoded bytes (`bdata`) of the values.
+
+    Returns
+    -------
+    N/A : ndarray
+        The decoded values.
+
+    """
+    return np.frombuffer(base64.b64decode(typed_array['bdata']),
+                         dtype='<' + typed_array['dtype'])
+
+
+def encode_figure(fig):
+    """
+    Encode the x- and y-values of every trace of a figure as typed arrays.
+    The figure must be decoded with `DECODE_FIGURE_JS` before plotting.
+
+    Parameters
+    ----------
+    fig : plotly.graph_objects, dict
+        The figure to be encoded.
+
+    Returns
+    -------
+    fig_dict : dict
+        The figure with its trace values encoded.
+
+    """
+    fig_dict = fig if isinstance(fig, dict) else fig.to_plotly_json()
+    for trace in fig_dict['data']:
+        for axis in ['x', 'y']:
+            if (axis in trace) and not isinstance(trace[axis], dict):
+                trace[axis] = encode_array(trace[axis])
+    return fig_dict
+
+
+def envelope_downsample(y_vals, bucket_size):
+    """
+    Downsample a signal by keeping the minimum and maximum of each bucket of
+    samples, in the order they occur. Unlike a fixed stride this keeps QRS
+    peaks and pacing spikes visible. The output is evenly spaced with two
+    points per bucket, half a bucket apart.
+
+    Parameters
+    ----------
+    y_vals : ndarray
+        The y-values of the signal.
+    bucket_size : int
+        The number of samples in each bucket. The trailing partial bucket is
+        padded with the last sample.
+
+    Returns
+    -------
+    N/A : ndarray
+        The downsampled y-values, or `y_vals` itself if the buckets are too
+        small to reduce the number of points.
+
+    """
+    if bucket_size < MIN_BUCKET_SIZE:
+        return y_vals
+    n_buckets = math.ceil(len(y_vals) / bucket_size)
+    buckets = np.pad(y_vals, (0, n_buckets*bucket_size - len(y_vals)),
+                     mode='edge').reshape(n_buckets, bucket_size)
+    i_min = np.argmin(buckets, axis=1)
+    i_max = np.argmax(buckets, axis=1)
+    rows = np.arange(n_buckets)
+    min_first = i_min <= i_max
+    envelope = np.empty((n_buckets, 2), dtype=y_vals.dtype)
+    envelope[:,0] = np.where(min_first, buckets[rows,i_min],
+                             buckets[rows,i_max])
+    envelope[:,1] = np.where(min_first, buckets[rows,i_max],
+                             buckets[rows,i_min])
+    return envelope.ravel()
+
+
+@lru_cache(maxsize=1024)
+def classify_sigs(sig_name):
+    """
+    Find the EKG, BP and Resp signals of a record header, each in the order
+    they are preferred for display. Records share a few header layouts, so
+    this is only done once per layout.
+
+    Parameters
+    ----------
+    sig_name : tuple[str]
+        The signal names in the order from the WFDB record.
+
+    Returns
+    -------
+    N/A : tuple[tuple[int]]
+        The indices of the EKG, BP and Resp signals, ordered by their
+        position in `EKG_SIGS`, `BP_SIGS` and `RESP_SIGS`, then by index.
+
+    """
+    classes = []
+    for names in [EKG_SIGS, BP_SIGS, RESP_SIGS]:
+        priority = {n: i for i,n in enumerate(names)}
+        matches = [(priority[n.upper()], i) for i,n in enumerate(sig_name)
+                   if n.upper() in priority]
+        classes.append(tuple(i for _,i in sorted(matches)))
+    return tuple(classes)
+
+
+def get_flat_sigs(signals):
+    """
+    Find the signals which are empty for the displayed window, meaning all
+    of their values are within `FLAT_TOLERANCE` of zero or are the same,
+    with one pass over all of the signals together.
+
+    Parameters
+    ----------
+    signals : dict
+        The windowed physical values of each signal keyed by its index,
+        from `read_signals`. All must have the same length.
+
+    Returns
+    -------
+    N/A : list[int]
+        The indices of the empty signals.
+
+    """
+    channels = sorted(signals)
+    if not channels:
+        return []
+    y_vals = np.nan_to_num(np.stack([signals[c] for c in channels]))
+    is_flat = (np.all(np.abs(y_vals) <= FLAT_TOLERANCE, axis=1)
+               | np.all(y_vals == y_vals[:,:1], axis=1))
+    return [c for c,f in zip(channels, is_flat) if f]
+
+
+def to_physical(d_signal, baseline, adc_gain, fmt):
+    """
+    Convert the digital values of a signal to physical units, with its
+    invalid samples as NaN.
+
+    Parameters
+    ----------
+    d_signal : ndarray
+        The digital values of the signal.
+    baseline : int
+        The baseline of the signal from the header.
+    adc_gain : float
+        The ADC gain of the signal from the header.
+    fmt : str
+        The WFDB format of the signal.
+
+    Returns
+    -------
+    p_signal : ndarray
+        The physical values of the signal.
+
+    """
+    # Subtracting in the digital type would wrap around near full scale
+    p_signal = (d_signal.astype(np.float64) - baseline) / adc_gain
+    invalid = INVALID_SAMPLES.get(fmt)
+    p_signal[d_signal == invalid] = np.nan
+    return p_signal
+
+
+def get_signal_stats(y_vals):
+    """
+    Get the summary statistics of a signal used to set its y-axis range:
+    its mean and standard deviation, and the range `window_signal` gives
+    for each of `SIGNAL_STD_VALUES`. The values are sorted by their distance
+    from the mean once, so every range is read from running minimums and
+    maximums instead of masking the signal again.
+
+    Parameters
+    ----------
+    y_vals : ndarray
+        The y-values of the signal, from `format_y_vals`.
+
+    Returns
+    -------
+    N/A : dict
+        The `mean` and `std` of the signal, and the `min` and `max` of the
+        y-axis range for each of `SIGNAL_STD_VALUES`.
+
+    """
+    n_std = len(SIGNAL_STD_VALUES)
+    if np.all(np.isnan(y_vals)) or np.all(y_vals == 0):
+        # Set default min and max values if all NaN or 0
+        return {'mean': 0.0, 'std': 0.0, 'min': [-1] * n_std,
+                'max': [1] * n_std}
+
+    temp_std = np.nanstd(y_vals)
+    temp_mean = np.mean(y_vals[np.isfinite(y_vals)])
+    dev = np.abs(y_vals - temp_mean)
+    order = np.argsort(dev)
+    sorted_y = y_vals[order]
+    run_min = np.minimum.accumulate(sorted_y)
+    run_max = np.maximum.accumulate(sorted_y)
+    # How many values are within each number of standard deviations
+    n_kept = np.searchsorted(dev[order],
+                             np.array(SIGNAL_STD_VALUES) * temp_std,
+                             side='left')
+    min_y_vals = []
+    max_y_vals = []
+    for n in n_kept:
+        if (n == 0) or (n == len(y_vals)):
+            min_y_vals.append(float(np.nanmin(y_vals) - temp_std))
+            max_y_vals.append(float(np.nanmax(y_vals) + temp_std))
+        else:
+            min_y_vals.append(float(run_min[n-1]))
+            max_y_vals.append(float(run_max[n-1]))
+    return {'mean': float(temp_mean), 'std': float(temp_std),
+            'min': min_y_vals, 'max': max_y_vals}
+
 
 # Load in the default variables
 class WaveformVizTools:
@@ -37,8 +399,9 @@ class WaveformVizTools:
         N/A
 
         """
-        self.CURRENT_USER = User.objects.get(username=current_user)
-        self.USER_SETTINGS = UserSettings.objects.get(user=self.CURRENT_USER)
+        self.CURRENT_USER = get_request_object(User, username=current_user)
+        self.USER_SETTINGS = get_request_object(UserSettings,
+                                                user=self.CURRENT_USER)
         self.FIG_HEIGHT = self.USER_SETTINGS.fig_height
         self.FIG_WIDTH = self.USER_SETTINGS.fig_width
         # The figure margins / padding around the graph div
@@ -56,7 +419,7 @@ class WaveformVizTools:
         self.MAX_Y_LABELS = self.USER_SETTINGS.max_y_labels
         self.N_EKG_SIGS = self.USER_SETTINGS.n_ekg_sigs
         # Down-sample signal to increase performance: make higher if non-EKG
-        # Average starting frequency = 250 Hz
+        # Divides the number of points drawn per pixel of the figure
         self.DOWN_SAMPLE_EKG = self.USER_SETTINGS.down_sample_ekg
         self.DOWN_SAMPLE = self.USER_SETTINGS.down_sample
         # How much signal should be displayed before and after the event
@@ -144,18 +507,22 @@ class WaveformVizTools:
             }
         }
 
-    def get_trace(self, x_vals, y_vals, x_string, y_string, sig_name):
+    def get_trace(self, x_start, x_step, y_vals, x_string, y_string,
+                  sig_name):
         """
         Generate a dictionary that is used to generate and format the signal
-        trace of the figure. For more info:
+        trace of the figure. The x-values are evenly spaced so they are sent
+        as a start and step rather than one value per sample. For more info:
         https://plotly.com/python/reference/scatter/#scatter
 
         Parameters
         ----------
-        x_vals : list[float/int]
-            The x-values to place the annotation.
-        y_vals : list[float/int]
-            The y-values to place the annotation.
+        x_start : float
+            The x-value of the first sample.
+        x_step : float
+            The x-distance between consecutive samples.
+        y_vals : ndarray
+            The y-values of the signal.
         x_string : str
             Indicates which x-axis the signal belongs with.
         y_string : str
@@ -170,8 +537,10 @@ class WaveformVizTools:
 
         """
         return go.Scatter({
-            'x': x_vals,
-            'y': y_vals.astype('float16'),
+            'x0': x_start,
+            'dx': x_step,
+            # Kept at the precision of the typed array sent to the browser
+            'y': y_vals.astype(TRACE_DTYPE),
             'xaxis': x_string,
             'yaxis': y_string,
             'hoverinfo': 'none',
@@ -218,7 +587,7 @@ class WaveformVizTools:
             }
         }
 
-    def get_xaxis(self, vals, show_ticks, title):
+    def get_xaxis(self, x_range, show_ticks, title):
         """
         Generate a dictionary that is used to generate and format the x-axis
         for the figure. For more info:
@@ -226,8 +595,8 @@ class WaveformVizTools:
 
         Parameters
         ----------
-        vals : list[float/int]
-            The tick values.
+        x_range : tuple[float]
+            The first and last x-values of the signal, used for the ticks.
         show_ticks : bool
             Show the axis ticks and labels (True) or not (False).
         title : str
@@ -240,8 +609,17 @@ class WaveformVizTools:
 
         """
         if show_ticks:
-            tick_vals = [round(n,1) for n in np.arange(min(vals), max(vals), self.GRID_DELTA_MAJOR).tolist()]
-            tick_text = [str(round(n)) if n%1 == 0 else '' for n in tick_vals]
+            # Start the ticks on the grid even if the signal does not
+            first_tick = self.GRID_DELTA_MAJOR * math.ceil(
+                round(x_range[0] / self.GRID_DELTA_MAJOR, 6)
+            )
+            tick_vals = np.round(np.arange(first_tick, x_range[1],
+                                           self.GRID_DELTA_MAJOR), 1)
+            # Only label the whole seconds
+            tick_text = np.where(tick_vals % 1 == 0,
+                                 np.round(tick_vals).astype(int).astype(str),
+                                 '').tolist()
+            tick_vals = tick_vals.tolist()
         else:
             tick_vals = None
             tick_text = None
@@ -350,67 +728,188 @@ class WaveformVizTools:
 
         Returns
         -------
-        sig_order : list[str]
-            The ordered list of signal names. Should only be 4 elements long.
+        sig_order : list[int]
+            The ordered list of signal indices. Should only be 4 elements
+            long.
         n_ekgs : int
             The total number of actual EKG signals.
 
         """
-        sig_order = []
-        # TODO: make case-insensitive
-        ekg_sigs = ['II', 'V', 'V5', 'V1', 'V2', 'V3', 'V4', 'V6', 'I', 'III',
-                    'aVR', 'AVR', 'aVF', 'AVF', 'aVL', 'AVL', 'MCL']
-        bp_sigs = ['ABP', 'AR1', 'AR2', 'AR3', 'IBP1', 'IBP2', 'IBP3', 'IBP4',
-                   'IBP5', 'IBP6', 'IBP7', 'IBP8']
-        resp_sigs = ['PLETH', 'pleth']
-
-        # Exclude signals which have all 0s
-        itter_sig_name = [j for i,j in enumerate(sig_name) if i not in exclude_sigs]
-        # Add a max of `N_EKG_SIGS` EKG signals, the any number of BP and Resp
-        # If not possible, try again twice by adding in order
-        # If still not filled, just return the non-full `sig_order`
-        n_ekgs = 0
-        for _ in range(3):
-            for ekgs in ekg_sigs:
-                if n_ekgs == self.N_EKG_SIGS:
-                    break
-                elif ekgs in itter_sig_name:
-                    sig_order.append(sig_name.index(ekgs))
-                    n_ekgs += 1
-            if len(sig_order) < min(len(sig_name), 4):
-                for bps in bp_sigs:
-                    if (bps in itter_sig_name) and (sig_name.index(bps) not in sig_order):
-                        sig_order.append(sig_name.index(bps))
-                        break
-                for resps in resp_sigs:
-                    if (resps in itter_sig_name) and (sig_name.index(resps) not in sig_order):
-                        sig_order.append(sig_name.index(resps))
-                        break
-                break
+        ekg_sigs, bp_sigs, resp_sigs = classify_sigs(tuple(sig_name))
+        exclude_sigs = set(exclude_sigs)
+        # Add a max of `N_EKG_SIGS` EKG signals, then one BP and one Resp if
+        # there is room
+        sig_order = [i for i in ekg_sigs
+                     if i not in exclude_sigs][:max(self.N_EKG_SIGS, 0)]
+        n_ekgs = len(sig_order)
+        if len(sig_order) < min(len(sig_name), 4):
+            for sigs in [bp_sigs, resp_sigs]:
+                sig_order += [i for i in sigs if i not in exclude_sigs][:1]
 
         return sig_order, n_ekgs
 
-    def format_y_vals(self, sig_order, sig_name, n_ekgs, record, index_start,
-                      index_stop):
+    def get_event_info(self, event_path):
         """
-        Format the y-values and separate the EKG signals to window them
-        together.
+        Read the header and the time of the alarm of the event, without any
+        of its signals. The signal store is used if it is up to date with
+        the event's files, else the WFDB files themselves. The result is
+        cached until any of the event's files are modified.
 
         Parameters
         ----------
-        sig_order : list[int]
-            The ordered list of signal names from `order_sigs`.
-        sig_name : list[int]
-            The list of signal names in the order from the WFDB record.
-        n_ekgs : int
-            The total number of expected EKG signals.
-        record : wfdb.io.record.Record object
-            The WFDB record for the signal.
+        event_path : str
+            The path of the WFDB record for the event (without extension).
+
+        Returns
+        -------
+        event_info : dict
+            The `fs`, `sig_len`, `sig_name`, `units`, `fmt`, `adc_gain` and
+            `baseline` of the header, the `event_time` of the alarm (seconds),
+            the latest `mtime` of the event's files and the `store_path` of
+            the event's signals (None if not in the signal store).
+
+        """
+        mtime = get_event_mtime(event_path)
+        cache_key = ('info', event_path, mtime)
+        event_info = event_cache.get(cache_key)
+        if event_info is None:
+            store_path = get_store_path(event_path)
+            try:
+                with open(store_path + '.json', 'r') as f:
+                    event_info = json.load(f)
+            except FileNotFoundError:
+                event_info = None
+            if (event_info is not None) and (event_info['mtime'] == mtime):
+                event_info['store_path'] = store_path + '.npy'
+            else:
+                header = wfdb.rdheader(event_path)
+                ann = wfdb.rdann(event_path, 'alm')
+                event_info = {
+                    'fs': header.fs,
+                    'sig_len': header.sig_len,
+                    'sig_name': header.sig_name,
+                    'units': header.units,
+                    'fmt': header.fmt,
+                    'adc_gain': header.adc_gain,
+                    'baseline': header.baseline,
+                    'alarm_sample': int(ann.sample[0]),
+                    'alarm_fs': ann.fs,
+                    'mtime': mtime,
+                    'store_path': None
+                }
+            event_info['event_time'] = (event_info['alarm_sample']
+                                        / event_info['alarm_fs'])
+            # Headers are tiny compared to the signals, a rough size is fine
+            event_cache.set(cache_key, event_info, 1024)
+        return event_info
+
+    def read_digital_signals(self, event_path, event_info, channels,
+                             index_start, index_stop):
+        """
+        Read only the requested samples of the requested signals, as their
+        digital values. The samples of each signal are cached so other views
+        of the same event do not decode them again.
+
+        Parameters
+        ----------
+        event_path : str
+            The path of the WFDB record for the event (without extension).
+        event_info : dict
+            The header information of the event, from `get_event_info`.
+        channels : list[int]
+            The indices of the signals to be read.
         index_start : int
             Where to start reading the signal.
         index_stop : int
             Where to stop reading the signal.
 
+        Returns
+        -------
+        d_signals : dict
+            The digital values of each signal keyed by its index in
+            `sig_name`. Samples outside of the record are left out.
+
+        """
+        # Never read outside of the record
+        sampfrom = min(max(index_start, 0), event_info['sig_len'])
+        sampto = min(max(index_stop, sampfrom), event_info['sig_len'])
+
+        # The signal store is memory-mapped so slicing it is nearly free
+        if event_info['store_path']:
+            all_signals = np.load(event_info['store_path'], mmap_mode='r')
+            d_signals = {c: all_signals[c,sampfrom:sampto]
+                         for c in set(channels)}
+            channels = []
+        else:
+            d_signals = {}
+        for c in set(channels):
+            cache_key = ('signal', event_path, event_info['mtime'], sampfrom,
+                         sampto, c)
+            d_signal = event_cache.get(cache_key)
+            if d_signal is not None:
+                d_signals[c] = d_signal
+        missing = sorted(set(channels) - set(d_signals))
+        if missing:
+            record = wfdb.rdrecord(event_path, sampfrom=sampfrom,
+                                   sampto=sampto, channels=missing,
+                                   physical=False, return_res=16)
+            for i,c in enumerate(missing):
+                # Copy so the cache does not hold on to the whole block
+                d_signal = np.ascontiguousarray(record.d_signal[:,i])
+                d_signals[c] = d_signal
+                cache_key = ('signal', event_path, event_info['mtime'],
+                             sampfrom, sampto, c)
+                event_cache.set(cache_key, d_signal, d_signal.nbytes)
+        return d_signals
+
+    def read_signals(self, event_path, event_info, channels, index_start,
+                     index_stop):
+        """
+        Read only the requested samples of the requested signals and convert
+        them to physical units.
+
+        Parameters
+        ----------
+        event_path : str
+            The path of the WFDB record for the event (without extension).
+        event_info : dict
+            The header information of the event, from `get_event_info`.
+        channels : list[int]
+            The indices of the signals to be read.
+        index_start : int
+            Where to start reading the signal.
+        index_stop : int
+            Where to stop reading the signal.
+
+        Returns
+        -------
+        signals : dict
+            The physical values of each signal keyed by its index in
+            `sig_name`.
+
+        """
+        d_signals = self.read_digital_signals(event_path, event_info,
+                                              channels, index_start,
+                                              index_stop)
+        signals = {}
+        for c,d_signal in d_signals.items():
+            signals[c] = to_physical(d_signal, event_info['baseline'][c],
+                                     event_info['adc_gain'][c],
+                                     event_info['fmt'][c])
+        return signals
+
+    def format_y_vals(self, sig_order, signals):
+        """
+        Format the y-values of the signals in the order they are displayed.
+
+        Parameters
+        ----------
+        sig_order : list[int]
+            The ordered list of signal names from `order_sigs`.
+        signals : dict
+            The windowed physical values of each signal keyed by its index,
+            from `read_signals`.
+
         Returns
         -------
         all_y_vals : ndarray
@@ -418,17 +917,40 @@ class WaveformVizTools:
 
         """
         all_y_vals = []
-        for i,r in enumerate(sig_order):
-            sig_name_index = sig_name.index(sig_name[r])
-            if i < n_ekgs:
-                current_y_vals = record[0][:,sig_name_index][index_start:index_stop:self.DOWN_SAMPLE_EKG]
-            else:
-                current_y_vals = record[0][:,sig_name_index][index_start:index_stop:self.DOWN_SAMPLE]
-            current_y_vals = np.nan_to_num(current_y_vals).astype('float64')
+        for r in sig_order:
+            current_y_vals = np.nan_to_num(signals[r]).astype('float64')
             all_y_vals.append(current_y_vals)
 
         return all_y_vals
 
+    def get_bucket_size(self, n_samples, down_sample):
+        """
+        Get the number of samples to reduce to a single min/max pair so that
+        at least one pair is drawn per pixel of the initially displayed
+        window, keeping every peak visible before zooming in.
+
+        Parameters
+        ----------
+        n_samples : int
+            The number of samples in the signal.
+        down_sample : int
+            The user's downsampling setting, which divides the number of
+            pairs per pixel.
+
+        Returns
+        -------
+        N/A : int
+            The number of samples in each bucket.
+
+        """
+        window_size = self.WINDOW_SIZE_MIN + self.WINDOW_SIZE_MAX
+        time_range = self.TIME_RANGE_MIN + self.TIME_RANGE_MAX
+        # The pixels the whole time range spans at the initial zoom, rounding
+        # the bucket size down so there are never fewer pairs than pixels
+        n_buckets = (self.FIG_WIDTH * time_range / window_size
+                     / max(down_sample, 1))
+        return max(int(n_samples / max(n_buckets, 1)), 1)
+
     def window_signal(self, y_vals):
         """
         Filter out extreme values from being shown on graph range. This uses
@@ -477,6 +999,60 @@ class WaveformVizTools:
             max_y_vals = 1
         return min_y_vals, max_y_vals
 
+    def get_y_range(self, event_path, event_info, channel, index_start,
+                    index_stop, y_vals):
+        """
+        Get the y-axis range of a signal for the user's `signal_std`. The
+        ranges of `SIGNAL_STD_VALUES` are read from the statistics written
+        to the signal store for the default time range, else computed once
+        per event, window and signal and cached. Any other `signal_std` is
+        computed by `window_signal` every time.
+
+        Parameters
+        ----------
+        event_path : str
+            The path of the WFDB record for the event (without extension).
+        event_info : dict
+            The header information of the event, from `get_event_info`.
+        channel : int
+            The index of the signal in `sig_name`.
+        index_start : int
+            Where the signal was read from.
+        index_stop : int
+            Where the signal was read to.
+        y_vals : ndarray
+            The y-values of the signal, from `format_y_vals`.
+
+        Returns
+        -------
+        min_y_vals : float, int
+            The minimum y-value of the windowed signal.
+        max_y_vals : float, int
+            The maximum y-value of the windowed signal.
+
+        """
+        std_range = self.USER_SETTINGS.signal_std
+        if std_range not in SIGNAL_STD_VALUES:
+            return self.window_signal(y_vals)
+
+        stored = event_info.get('signal_stats')
+        if ((stored is not None)
+                and (stored.get('version') == SIGNAL_STATS_VERSION)
+                and (stored['index_start'] == index_start)
+                and (stored['index_stop'] == index_stop)
+                and (stored['signal_std'] == SIGNAL_STD_VALUES)):
+            stats = stored['channels'][channel]
+        else:
+            cache_key = ('stats', event_path, event_info['mtime'],
+                         index_start, index_stop, channel)
+            stats = event_cache.get(cache_key)
+            if stats is None:
+                stats = get_signal_stats(y_vals)
+                # Only a few numbers, a rough size is fine
+                event_cache.set(cache_key, stats, 1024)
+        i = SIGNAL_STD_VALUES.index(std_range)
+        return stats['min'][i], stats['max'][i]
+
     def create_blank_figure(self, n_rows=4):
         """
         Create a blank figure.
@@ -495,26 +1071,27 @@ class WaveformVizTools:
         """
         fig = self.get_subplot(n_rows)
         fig.update_layout(self.get_layout(n_rows))
+        n_vals = 100
+        x_range = (-self.WINDOW_SIZE_MIN, self.WINDOW_SIZE_MAX)
+        x_step = (x_range[1] - x_range[0]) / (n_vals - 1)
+        y_vals = np.zeros(n_vals)
         for idx in range(n_rows):
-            n_vals = 100
             x_string = 'x' + str(idx+1)
-            x_vals = np.linspace(-self.WINDOW_SIZE_MIN, self.WINDOW_SIZE_MAX,
-                                 n_vals)
             y_string = 'y' + str(idx+1)
-            y_vals = np.zeros(n_vals)
             fig.add_trace(
-                self.get_trace(x_vals, y_vals, x_string, y_string, 'N/A'),
+                self.get_trace(x_range[0], x_step, y_vals, x_string,
+                               y_string, 'N/A'),
                 row = idx+1, col = 1)
 
             fig.add_shape(self.get_annotation(x_string))
 
             if idx != (n_rows - 1):
                 fig.update_xaxes(
-                    self.get_xaxis(x_vals, False, None),
+                    self.get_xaxis(x_range, False, None),
                     row = idx+1, col = 1)
             else:
                 fig.update_xaxes(
-                    self.get_xaxis(x_vals, True, 'Time Since Event (s)'),
+                    self.get_xaxis(x_range, True, 'Time Since Event (s)'),
                     row = idx+1, col = 1)
 
             fig.update_yaxes(
@@ -526,7 +1103,8 @@ class WaveformVizTools:
 
         return fig
 
-    def get_graph_info(self, idx, index_stop, index_start, y_vals, fs):
+    def get_graph_info(self, idx, index_stop, index_start, y_vals, fs,
+                       y_range=None):
         """
         Get all the information required for the graph.
 
@@ -542,13 +1120,17 @@ class WaveformVizTools:
             The y-values of the current signal.
         fs : float / int
             The sampling rate of the waveform (1/s).
+        y_range : tuple[float], optional
+            The minimum and maximum y-values to display, from `get_y_range`,
+            else they are computed by `window_signal`.
 
         Returns
         -------
-        x_vals : list[float/int]
-            The x-values to place the annotation.
-        y_vals : list[float/int]
-            The y-values to place the annotation.
+        x_step : float
+            The x-distance between the samples of the downsampled signal,
+            which starts at the first sample read.
+        y_vals : ndarray
+            The downsampled y-values of the signal.
         x_string : str
             Indicates which x-axis the signal belongs with.
         y_string : str
@@ -566,36 +1148,45 @@ class WaveformVizTools:
         # Name the axes and create the subplots
         x_string = 'x' + str(idx+1)
         y_string = 'y' + str(idx+1)
-        x_vals = [-self.TIME_RANGE_MIN + (i / fs) for i in range(index_stop-index_start)]
         # Remove outliers to prevent weird axes scaling if possible
-        min_y_vals, max_y_vals = self.window_signal(y_vals)
+        if y_range is None:
+            y_range = self.window_signal(y_vals)
+        min_y_vals, max_y_vals = y_range
+        # Keep the peaks while sending about as many points as can be drawn
+        if idx < self.N_EKG_SIGS:
+            bucket_size = self.get_bucket_size(len(y_vals),
+                                               self.DOWN_SAMPLE_EKG)
+        else:
+            bucket_size = self.get_bucket_size(len(y_vals), self.DOWN_SAMPLE)
+        n_vals = len(y_vals)
+        y_vals = envelope_downsample(y_vals, bucket_size)
+        # Each min/max pair spans a whole bucket
+        x_step = (bucket_size / 2 if len(y_vals) != n_vals else 1) / fs
         # Process the EKG signals first
         if idx < self.N_EKG_SIGS:
-            x_vals = x_vals[::self.DOWN_SAMPLE_EKG]
-            # Create the ticks
-            min_val = round(self.GRID_DELTA_MAJOR * round(min_y_vals/self.GRID_DELTA_MAJOR), 1)
-            max_val = round(self.GRID_DELTA_MAJOR * round(max_y_vals/self.GRID_DELTA_MAJOR), 1)
-            y_tick_vals = [round(n,1) for n in np.arange(min_val, max_val, self.GRID_DELTA_MAJOR).tolist()]
-            # Prevent too many from rendering
-            n_repeats = 2
-            while len(y_tick_vals) > 20:
+            # Create the ticks, widening the grid to prevent too many from
+            # rendering, only counting them until the grid is wide enough
+            n_repeats = 1
+            while True:
                 new_grid_delta = n_repeats * self.GRID_DELTA_MAJOR
                 min_val = round(new_grid_delta * round(min_y_vals/new_grid_delta), 1)
                 max_val = round(new_grid_delta * round(max_y_vals/new_grid_delta), 1)
-                y_tick_vals = [round(n,1) for n in np.arange(min_val, max_val, new_grid_delta).tolist()]
+                # The number of values `np.arange` gives
+                if math.ceil((max_val - min_val) / new_grid_delta) <= 20:
+                    break
                 n_repeats += 1
+            y_tick_vals = [round(n,1) for n in np.arange(min_val, max_val, new_grid_delta).tolist()]
             # Max text length to fit should be `MAX_Y_LABELS`, also prevent over-crowding
             y_text_vals = y_tick_vals[::math.ceil(len(y_tick_vals)/self.MAX_Y_LABELS)]
             # Create the labels
             y_tick_text = [str(n) if n in y_text_vals else ' ' for n in y_tick_vals]
         else:
-            x_vals = x_vals[::self.DOWN_SAMPLE]
             # Max text length to fit should be `MAX_Y_LABELS`, also prevent over-crowding
             y_tick_vals = [round(n,1) for n in np.linspace(min_y_vals, max_y_vals, self.MAX_Y_LABELS).tolist()]
             # Create the labels
             y_tick_text = [str(n) for n in y_tick_vals]
 
-        return (x_vals, y_vals, x_string, y_string, y_tick_vals, y_tick_text,
+        return (x_step, y_vals, x_string, y_string, y_tick_vals, y_tick_text,
                 min_y_vals, max_y_vals)
 
     def prepare_graph(self, dropdown_project, dropdown_record,
@@ -634,50 +1225,30 @@ class WaveformVizTools:
             The sampling rate of the waveform (1/s).
 
         """
-        # Determine the time of the event (seconds)
-        ann_path = os.path.join(PROJECT_PATH, dropdown_project,
-                                dropdown_record, dropdown_event)
-        ann = wfdb.rdann(ann_path, 'alm')
-        event_time = (ann.sample / ann.fs)[0]
-
-        # Determine the signal information
-        record_path = os.path.join(PROJECT_PATH, dropdown_project,
-                                   dropdown_record, dropdown_event)
-        record = wfdb.rdsamp(record_path, return_res=16)
-        fs = record[1]['fs']
-        sig_name = record[1]['sig_name']
-        units = record[1]['units']
+        # Read the header and the time of the event (seconds) first so that
+        # only the displayed window of the displayable signals is decoded
+        event_path = os.path.join(PROJECT_PATH, dropdown_project,
+                                  dropdown_record, dropdown_event)
+        event_info = self.get_event_info(event_path)
+        event_time = event_info['event_time']
+        fs = event_info['fs']
+        sig_name = event_info['sig_name']
+        units = event_info['units']
 
         # Set the initial display range of y-values based on values in
         # initial range of x-values
         index_start = int(fs * (event_time - self.TIME_RANGE_MIN))
         index_stop = int(fs * (event_time + self.TIME_RANGE_MAX))
 
-        # Collect all of the signals and format their graph attributes
-        sig_order, n_ekgs = self.order_sigs(sig_name)
-        all_y_vals = self.format_y_vals(
-            sig_order, sig_name, n_ekgs, record, index_start, index_stop
+        # Read every signal which could be displayed at once, and leave out
+        # the empty ones before choosing which to display
+        candidates = sorted(set().union(*classify_sigs(tuple(sig_name))))
+        signals = self.read_signals(event_path, event_info, candidates,
+                                    index_start, index_stop)
+        sig_order, n_ekgs = self.order_sigs(
+            sig_name, exclude_sigs=get_flat_sigs(signals)
         )
-        # Try to account for empty channels
-        exclude_list = []
-        while (len(sig_name) - len(exclude_list)) > 0:
-            count_zero = 0
-            for i,yv in enumerate(all_y_vals):
-                # Discards a signal if all its values are <0.01 or the same
-                if ((np.isclose(yv, np.zeros(len(yv)), atol=1e-2).all()) or
-                (len(set(yv)) == 1)):
-                    exclude_list.append(sig_order[i])
-                    count_zero += 1
-            if count_zero == 0:
-                break
-            else:
-                sig_order, n_ekgs = self.order_sigs(
-                    n_ekgs, sig_name, exclude_sigs=exclude_list
-                )
-                all_y_vals = self.format_y_vals(
-                    sig_order, sig_name, n_ekgs, record, index_start,
-                    index_stop
-                )
+        all_y_vals = self.format_y_vals(sig_order, signals)
 
         return (fs, sig_name, units, index_start, index_stop, sig_order,
                 all_y_vals)
@@ -712,6 +1283,10 @@ class WaveformVizTools:
         fs, sig_name, units, index_start, index_stop, sig_order, all_y_vals = self.prepare_graph(
             dropdown_project, dropdown_record, dropdown_event
         )
+        # Already cached by `prepare_graph`, for the signal statistics
+        event_path = os.path.join(PROJECT_PATH, dropdown_project,
+                                  dropdown_record, dropdown_event)
+        event_info = self.get_event_info(event_path)
 
         # Sometimes there may not be 4 signals available to display
         n_sig = len(sig_order)
@@ -721,22 +1296,32 @@ class WaveformVizTools:
 
         # Name the axes and create the subplots
         for idx,r in enumerate(sig_order):
-            x_vals, y_vals, x_string, y_string, y_tick_vals, y_tick_text, min_y_vals, max_y_vals = self.get_graph_info(
-                idx, index_stop, index_start, all_y_vals[idx], fs
+            y_range = self.get_y_range(event_path, event_info, r,
+                                       index_start, index_stop,
+                                       all_y_vals[idx])
+            x_step, y_vals, x_string, y_string, y_tick_vals, y_tick_text, min_y_vals, max_y_vals = self.get_graph_info(
+                idx, index_stop, index_start, all_y_vals[idx], fs,
+                y_range=y_range
             )
+            # The samples are evenly spaced from the first one read, which is
+            # after the start of the time range if the record starts later
+            x_start = (min(max(index_start, 0), event_info['sig_len']) / fs
+                       - event_info['event_time'])
+            x_range = (x_start, x_start + x_step*(len(y_vals)-1))
 
             fig.add_trace(
-                self.get_trace(x_vals, y_vals, x_string, y_string, sig_name[r]),
+                self.get_trace(x_range[0], x_step, y_vals, x_string, y_string,
+                               sig_name[r]),
                 row = idx+1, col = 1)
 
             if idx != (n_sig - 1):
                 fig.update_xaxes(
-                    self.get_xaxis(x_vals, False, None),
+                    self.get_xaxis(x_range, False, None),
                     row = idx+1, col = 1)
             else:
                 fig.add_shape(self.get_annotation(x_string))
                 fig.update_xaxes(
-                    self.get_xaxis(x_vals, True, 'Time Since Event (s)'),
+                    self.get_xaxis(x_range, True, 'Time Since Event (s)'),
                     row = idx+1, col = 1)
 
             fig.update_yaxes(
@@ -747,3 +1332,72 @@ class WaveformVizTools:
             fig.update_traces(xaxis = x_string)
 
         return fig
+
+    def get_figure_key(self, dropdown_project, dropdown_record,
+                       dropdown_event):
+        """
+        Create the key of the final figure in the shared cache. It changes
+        whenever the event's files or any of the user's rendering settings
+        change.
+
+        Parameters
+        ----------
+        dropdown_project : str
+            The current project.
+        dropdown_record : str
+            The current record.
+        dropdown_event : str
+            The current event.
+
+        Returns
+        -------
+        N/A : str
+            The cache key of the figure.
+
+        """
+        event_path = os.path.join(PROJECT_PATH, dropdown_project,
+                                  dropdown_record, dropdown_event)
+        mtime = self.get_event_info(event_path)['mtime']
+        render_settings = [getattr(self.USER_SETTINGS, f)
+                           for f in RENDER_SETTINGS]
+        settings_hash = hashlib.sha1(
+            json.dumps(render_settings).encode()
+        ).hexdigest()
+        return (f'figure:{dropdown_project}:{dropdown_record}:'
+                f'{dropdown_event}:{mtime}:{settings_hash}')
+
+    def get_final_figure(self, dropdown_project, dropdown_record,
+                         dropdown_event):
+        """
+        Return the final figure from the shared cache, so a figure created
+        by one worker is reused by all others, else create and cache it. The
+        trace values are encoded with `encode_figure`.
+
+        Parameters
+        ----------
+        dropdown_project : str
+            The current project.
+        dropdown_record : str
+            The current record.
+        dropdown_event : str
+            The current event.
+
+        Returns
+        -------
+        fig : dict
+            The encoded figure.
+
+        """
+        fig_key = self.get_figure_key(dropdown_project, dropdown_record,
+                                      dropdown_event)
+        fig_json = cache.get(fig_key, version=FIGURE_CACHE_VERSION)
+        if fig_json is not None:
+            return json.loads(fig_json)
+
+        fig = encode_figure(self.create_final_figure(
+            dropdown_project, dropdown_record, dropdown_event
+        ))
+        fig_json = json.dumps(fig, cls=PlotlyJSONEncoder)
+        cache.set(fig_key, fig_json, base.FIGURE_CACHE_TIMEOUT,
+                  version=FIGURE_CACHE_VERSION)
+        return fig
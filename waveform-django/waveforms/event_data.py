@@ -0,0 +1,239 @@
+import os
+import zipfile
+
+import numpy as np
+
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import (
+    INVALID_SAMPLES, PROJECT_PATH
+)
+from waveforms.exports import get_event_consensus
+
+
+# The value invalid samples are given in the exported signals, whatever
+# their format
+INVALID_SAMPLE = -32768
+# How many bytes of the archive are collected before they are sent
+EVENT_DATA_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamBuffer:
+    """
+    A write-only file-like object which collects what is written to it
+    until it is taken, so a zip archive can be sent while it is made.
+    """
+    def __init__(self):
+        """
+        Initialize StreamBuffer
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.chunks = []
+        self.n_bytes = 0
+
+    def write(self, value):
+        """
+        Collect the written bytes.
+
+        Parameters
+        ----------
+        value : bytes
+            The bytes written.
+
+        Returns
+        -------
+        N/A : int
+            The number of bytes written.
+
+        """
+        self.chunks.append(bytes(value))
+        self.n_bytes += len(value)
+        return len(value)
+
+    def flush(self):
+        """
+        Nothing to flush, the bytes are kept until they are taken.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        pass
+
+    def take(self):
+        """
+        Take the bytes written since the last call.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A : bytes
+            The bytes written.
+
+        """
+        value = b''.join(self.chunks)
+        self.chunks = []
+        self.n_bytes = 0
+        return value
+
+
+def get_data_events(projects=None, records=None, events=None,
+                    outcomes=None):
+    """
+    Get the events to be exported and their labels.
+
+    Parameters
+    ----------
+    projects : list[str], optional
+        Only use the events of these projects.
+    records : list[str], optional
+        Only use the events of these records.
+    events : list[str], optional
+        Only use these events.
+    outcomes : list[str], optional
+        Only use the events with these outcomes (see `get_event_consensus`).
+
+    Returns
+    -------
+    N/A : list[tuple]
+        The project, record, event, number of annotations, outcome and
+        adjudication of each event, in the order of the RECORDS files.
+
+    """
+    return [c for c in get_event_consensus()
+            if ((not projects) or (c[0] in projects))
+            and ((not records) or (c[1] in records))
+            and ((not events) or (c[2] in events))
+            and ((not outcomes) or (c[4] in outcomes))]
+
+
+def get_event_data(tools, project, record, event):
+    """
+    Get the window of signals of an event shown to the annotators, as the
+    digital samples and the gains to convert them to physical units
+    (`(signals - baseline) / adc_gain`). The signals are chosen by
+    `prepare_graph` so they match the viewer.
+
+    Parameters
+    ----------
+    tools : WaveformVizTools
+        The viewer settings used to choose the window and the signals.
+    project : str
+        The project of the event.
+    record : str
+        The record of the event.
+    event : str
+        The event to be read.
+
+    Returns
+    -------
+    N/A : dict
+        The `signals` (channel-major, invalid samples are
+        `INVALID_SAMPLE`), `sig_name`, `units`, `adc_gain`, `baseline`,
+        `fs`, the `start` of the window in the record and the `alarm`
+        sample in the window.
+
+    """
+    event_path = os.path.join(PROJECT_PATH, project, record, event)
+    event_info = tools.get_event_info(event_path)
+    (fs, sig_name, units, index_start, index_stop, sig_order,
+     _) = tools.prepare_graph(project, record, event)
+    d_signals = tools.read_digital_signals(event_path, event_info, sig_order,
+                                           index_start, index_stop)
+
+    # The window is cut short at the edges of the record
+    start = min(max(index_start, 0), event_info['sig_len'])
+    stop = min(max(index_stop, start), event_info['sig_len'])
+    signals = np.empty((len(sig_order), stop - start),
+                       dtype=np.result_type(np.int16,
+                                            *d_signals.values()))
+    for i,c in enumerate(sig_order):
+        signals[i] = d_signals[c]
+        invalid = INVALID_SAMPLES.get(event_info['fmt'][c])
+        if invalid is not None:
+            signals[i][d_signals[c] == invalid] = INVALID_SAMPLE
+
+    return {
+        'signals': signals,
+        'sig_name': np.array([sig_name[c] for c in sig_order], dtype=str),
+        'units': np.array([units[c] for c in sig_order], dtype=str),
+        'adc_gain': np.array([event_info['adc_gain'][c] for c in sig_order],
+                             dtype='f8'),
+        'baseline': np.array([event_info['baseline'][c] for c in sig_order],
+                             dtype='i4'),
+        'fs': np.float64(fs),
+        'start': np.int64(start),
+        'alarm': np.int64(round(event_info['event_time'] * fs) - start)
+    }
+
+
+def iter_event_data_npz(tools, data_events, counts=None):
+    """
+    Write the signals and labels of events as a NumPy `.npz` archive, one
+    event at a time, so the archive is sent while it is made and memory
+    use does not grow with the number of events. The arrays of each event
+    are named `<project>/<record>/<event>/<name>` (see `get_event_data`,
+    plus `n_annotations`, `outcome` and `adjudication`), and `events`
+    lists the `<project>/<record>/<event>` of every event written.
+
+    Parameters
+    ----------
+    tools : WaveformVizTools
+        The viewer settings used to choose the window and the signals.
+    data_events : list[tuple]
+        The events and their labels, from `get_data_events`.
+    counts : dict, optional
+        Set to the number of events `written` and `skipped` since their
+        files are missing, as the archive is written.
+
+    Returns
+    -------
+    N/A : generator[bytes]
+        The bytes of the archive.
+
+    """
+    buffer = StreamBuffer()
+    written = []
+    if counts is None:
+        counts = {}
+    counts.update(written=0, skipped=0)
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED,
+                         allowZip64=True) as archive:
+        for project, record, event, n_anns, outcome, adj in data_events:
+            try:
+                arrays = get_event_data(tools, project, record, event)
+            except FileNotFoundError:
+                # The event is listed but its files are missing
+                counts['skipped'] += 1
+                continue
+            arrays['n_annotations'] = np.int64(n_anns)
+            arrays['outcome'] = np.array(outcome or '', dtype=str)
+            arrays['adjudication'] = np.array(adj or '', dtype=str)
+            prefix = f'{project}/{record}/{event}'
+            for name,value in arrays.items():
+                with archive.open(f'{prefix}/{name}.npy', mode='w',
+                                  force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(value),
+                                              allow_pickle=False)
+            written.append(prefix)
+            counts['written'] += 1
+            if buffer.n_bytes >= EVENT_DATA_CHUNK_SIZE:
+                yield buffer.take()
+        with archive.open('events.npy', mode='w', force_zip64=True) as f:
+            np.lib.format.write_array(f, np.array(written, dtype=str),
+                                      allow_pickle=False)
+    yield buffer.take()
@@ -0,0 +1,301 @@
+from collections import defaultdict
+import csv
+
+from django.db.models import Count, Min, Q
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet exports are only available if pyarrow is installed
+    pa = None
+    pq = None
+
+from waveforms.catalog import catalog
+from waveforms.models import Annotation
+from website.settings import base
+
+
+# The annotation fields exported and their CSV column names
+ANNOTATION_FIELDS = ['user__username', 'project', 'record', 'event',
+                     'decision', 'comments', 'decision_date',
+                     'is_adjudication']
+ANNOTATION_COLUMNS = ['username', 'project', 'record', 'event', 'decision',
+                      'comments', 'date', 'is_adjudication']
+# The columns of the per-event consensus table
+CONSENSUS_COLUMNS = ['project', 'record', 'event', 'n_annotations',
+                     'outcome', 'adjudication']
+# How many annotations are read from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    A file-like object which returns what is written to it, so the rows of
+    a CSV writer can be yielded as they are made.
+    """
+    def write(self, value):
+        """
+        Return the written value.
+
+        Parameters
+        ----------
+        value : str
+            The value written.
+
+        Returns
+        -------
+        N/A : str
+            The value written.
+
+        """
+        return value
+
+
+def get_export_annotations():
+    """
+    Get the annotations to be exported, leaving out those of the practice
+    set.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    N/A : QuerySet
+        The values of `ANNOTATION_FIELDS` of each annotation.
+
+    """
+    practice_anns = Q(pk__in=[])
+    for project, events in base.PRACTICE_SET.items():
+        practice_anns |= Q(project=project,
+                           event__in=[e for e,v in events.items() if v])
+    return Annotation.objects.exclude(practice_anns).order_by(
+        'id'
+    ).values_list(*ANNOTATION_FIELDS)
+
+
+def iter_annotations_csv(annotations, columns=ANNOTATION_COLUMNS):
+    """
+    Write the annotations as CSV one row at a time, reading them from the
+    database in chunks so memory use does not grow with the number of
+    annotations.
+
+    Parameters
+    ----------
+    annotations : QuerySet
+        The values of `ANNOTATION_FIELDS` of each annotation.
+    columns : list[str], optional
+        The names of the CSV columns.
+
+    Returns
+    -------
+    N/A : generator[str]
+        The CSV header followed by one line per annotation.
+
+    """
+    writer = csv.writer(Echo(), lineterminator='\n')
+    yield writer.writerow(columns)
+    for ann in annotations.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow(ann)
+
+
+def get_event_consensus():
+    """
+    Get the outcome of the annotations of every event of the projects
+    which are not blacklisted, using a single grouped query.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    consensus : list[tuple]
+        The values of `CONSENSUS_COLUMNS` of each event, in the order of the
+        RECORDS files. The outcome is one of `no_anns`, `one_ann`,
+        `unan_true`, `unan_false`, `unan_uncertain`, `unan_reject`,
+        `conflict`, `true_adj`, `false_adj`, `uncertain_adj`, `reject_adj`,
+        or None if there are more than two annotations and no adjudication.
+
+    """
+    # Get the decisions of each event
+    event_decisions = Annotation.objects.values_list(
+        'project', 'record', 'event', 'decision', 'is_adjudication'
+    ).annotate(
+        n_anns=Count('id'), first_id=Min('id')
+    ).order_by('first_id')
+    event_anns = defaultdict(list)
+    event_adjs = {}
+    for project, record, event, decision, is_adj, n_anns, _ in event_decisions:
+        if is_adj:
+            # Use the first adjudication of the event
+            event_adjs.setdefault((project, record, event), decision)
+        else:
+            event_anns[(project, record, event)] += [decision] * n_anns
+
+    adj_outcomes = {'True': 'true_adj', 'False': 'false_adj',
+                    'Uncertain': 'uncertain_adj', 'Reject': 'reject_adj'}
+    consensus = []
+    project_list = [p for p in base.ALL_PROJECTS if p not in base.BLACKLIST]
+    for project in project_list:
+        for record in catalog.get_records(project):
+            for event in catalog.get_events(project, record):
+                anns = event_anns.get((project, record, event), [])
+                adj = event_adjs.get((project, record, event))
+
+                outcome = None
+                if adj:
+                    outcome = adj_outcomes.get(adj)
+                elif len(anns) == 0:
+                    outcome = 'no_anns'
+                elif len(anns) == 1:
+                    outcome = 'one_ann'
+                elif len(anns) == 2:
+                    if anns == ['True', 'True']:
+                        outcome = 'unan_true'
+                    elif anns == ['False', 'False']:
+                        outcome = 'unan_false'
+                    elif anns == ['Uncertain', 'Uncertain']:
+                        outcome = 'unan_uncertain'
+                    elif 'Reject' in anns:
+                        # Annotation is rejected if only one person thinks it
+                        # should be
+                        outcome = 'unan_reject'
+                    else:
+                        outcome = 'conflict'
+                consensus.append((project, record, event, len(anns),
+                                  outcome, adj))
+    return consensus
+
+
+def get_annotations_schema():
+    """
+    Get the Arrow schema of the annotations table, with the repeated text
+    columns dictionary-encoded.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    N/A : pyarrow.Schema
+        The schema with the `ANNOTATION_COLUMNS`.
+
+    """
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('username', text),
+        ('project', text),
+        ('record', text),
+        ('event', text),
+        ('decision', text),
+        ('comments', pa.string()),
+        ('date', pa.timestamp('us', tz='UTC')),
+        ('is_adjudication', pa.bool_())
+    ])
+
+
+def get_consensus_schema():
+    """
+    Get the Arrow schema of the per-event consensus table, with the
+    repeated text columns dictionary-encoded.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    N/A : pyarrow.Schema
+        The schema with the `CONSENSUS_COLUMNS`.
+
+    """
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('project', text),
+        ('record', text),
+        ('event', text),
+        ('n_annotations', pa.int32()),
+        ('outcome', text),
+        ('adjudication', text)
+    ])
+
+
+def rows_to_table(rows, schema):
+    """
+    Convert rows of values to an Arrow table.
+
+    Parameters
+    ----------
+    rows : list[tuple]
+        The values of each row, in the order of the schema's columns.
+    schema : pyarrow.Schema
+        The schema of the table.
+
+    Returns
+    -------
+    N/A : pyarrow.Table
+        The table of the rows.
+
+    """
+    arrays = []
+    for i,field in enumerate(schema):
+        values = [r[i] for r in rows]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type)
+                          .dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_annotations_parquet(where, annotations):
+    """
+    Write the annotations as a Parquet file, reading them from the
+    database in chunks so memory use does not grow with the number of
+    annotations.
+
+    Parameters
+    ----------
+    where : str, file-like
+        The path or file the table is written to.
+    annotations : QuerySet
+        The values of `ANNOTATION_FIELDS` of each annotation.
+
+    Returns
+    -------
+    N/A
+
+    """
+    schema = get_annotations_schema()
+    writer = pq.ParquetWriter(where, schema)
+    try:
+        rows = []
+        for ann in annotations.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            rows.append(ann)
+            if len(rows) == EXPORT_CHUNK_SIZE:
+                writer.write_table(rows_to_table(rows, schema))
+                rows = []
+        writer.write_table(rows_to_table(rows, schema))
+    finally:
+        writer.close()
+
+
+def write_consensus_parquet(where):
+    """
+    Write the per-event consensus table as a Parquet file.
+
+    Parameters
+    ----------
+    where : str, file-like
+        The path or file the table is written to.
+
+    Returns
+    -------
+    N/A
+
+    """
+    pq.write_table(rows_to_table(get_event_consensus(),
+                                 get_consensus_schema()), where)
@@ -48,7 +48,8 @@ class GraphSettings(forms.ModelForm):
             'n_ekg_sigs': """Set the maximum number of EKG signals to
                 display.""",
             'down_sample_ekg': """Downsample EKG signal to increase
-                performance (average starting frequency = 250 Hz)""",
+                performance (1 draws about one minimum and maximum per pixel,
+                so peaks are always kept)""",
             'down_sample': """Downsample non-EKG signals to increase
                 performance (usually higher than EKG downsampling rate since
                 it consists of lower frequency signals)""",
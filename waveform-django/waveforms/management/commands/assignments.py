@@ -0,0 +1,122 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from waveforms.catalog import PROJECT_PATH
+from waveforms.models import Assignment, User, UserProgress
+from website.settings import base
+
+
+class Command(BaseCommand):
+    help = ('Import or export the event assignments of each project in the '
+            'user assignment CSV format (Events,Users Assigned).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['import', 'export'])
+        parser.add_argument('--project', action='append',
+                            help=('Only use this project (may be repeated), '
+                                  'default is every project in ALL_PROJECTS.'))
+        parser.add_argument('--replace', action='store_true',
+                            help=('When importing, remove the assignments '
+                                  'which are not in the CSV file.'))
+
+    def handle(self, *args, **options):
+        projects = options['project'] or base.ALL_PROJECTS
+        for project in projects:
+            if project not in base.ALL_PROJECTS:
+                raise CommandError(f'Unknown project: {project}')
+
+        for project in projects:
+            csv_path = os.path.join(PROJECT_PATH, project,
+                                    base.ASSIGNMENT_FILE)
+            if options['action'] == 'import':
+                n_assignments = self.import_csv(project, csv_path,
+                                                options['replace'])
+                self.stdout.write(f'Imported {n_assignments} assignments '
+                                  f'from {csv_path}')
+            else:
+                n_assignments = self.export_csv(project, csv_path)
+                self.stdout.write(f'Exported {n_assignments} assignments '
+                                  f'to {csv_path}')
+
+    def import_csv(self, project, csv_path, replace):
+        """
+        Create the assignments of a project listed in its CSV file.
+
+        Parameters
+        ----------
+        project : str
+            The project of the assignments.
+        csv_path : str
+            The CSV file to be imported.
+        replace : bool
+            Whether to remove the assignments which are not in the file.
+
+        Returns
+        -------
+        N/A : int
+            The number of assignments in the file.
+
+        """
+        with open(csv_path, 'r') as csv_file:
+            csvreader = csv.reader(csv_file, delimiter=',')
+            next(csvreader, None)
+            rows = [row for row in csvreader if row]
+
+        users = {u.username: u for u in User.objects.filter(
+            username__in={name for row in rows for name in row[1:] if name}
+        )}
+        assignments = []
+        for row in rows:
+            for name in row[1:]:
+                if not name:
+                    continue
+                if name not in users:
+                    self.stderr.write(f'Skipping {row[0]}: unknown user '
+                                      f'{name}')
+                    continue
+                assignments.append(Assignment(
+                    user=users[name], project=project,
+                    record=row[0].split('_')[0], event=row[0]
+                ))
+
+        with transaction.atomic():
+            if replace:
+                Assignment.objects.filter(project=project).delete()
+            Assignment.objects.bulk_create(assignments,
+                                           ignore_conflicts=True)
+            UserProgress.rebuild()
+        return len(assignments)
+
+    def export_csv(self, project, csv_path):
+        """
+        Write the assignments of a project to its CSV file.
+
+        Parameters
+        ----------
+        project : str
+            The project of the assignments.
+        csv_path : str
+            The CSV file to be written.
+
+        Returns
+        -------
+        N/A : int
+            The number of assignments written.
+
+        """
+        csv_data = {}
+        assignments = Assignment.objects.filter(project=project).order_by(
+            'id'
+        ).values_list('event', 'user__username')
+        for event, username in assignments:
+            csv_data.setdefault(event, []).append(username)
+
+        with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+            csvwriter = csv.writer(csv_file)
+            csvwriter.writerow(['Events', 'Users Assigned'])
+            for event, usernames in csv_data.items():
+                csvwriter.writerow([event] + usernames)
+        return len(assignments)
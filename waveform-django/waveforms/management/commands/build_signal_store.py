@@ -0,0 +1,175 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+import numpy as np
+import wfdb
+
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import (
+    PROJECT_PATH, SIGNAL_STATS_VERSION, SIGNAL_STD_VALUES, STATS_TIME_RANGE,
+    get_event_mtime, get_signal_stats, get_store_path, to_physical
+)
+from website.settings import base
+
+
+# Signal formats whose digital values do not fit in 16 bits
+WIDE_FORMATS = ['24', '32']
+
+
+class Command(BaseCommand):
+    help = ('Convert the WFDB files of every event into memory-mapped numpy '
+            'arrays which the waveform viewer can slice without decoding, '
+            'with the statistics used to scale their y-axes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', action='append',
+                            help=('Only convert this project (may be '
+                                  'repeated), default is every project in '
+                                  'ALL_PROJECTS.'))
+        parser.add_argument('--force', action='store_true',
+                            help='Convert events which are already up to date.')
+
+    def handle(self, *args, **options):
+        projects = options['project'] or base.ALL_PROJECTS
+        for project in projects:
+            if project not in base.ALL_PROJECTS:
+                raise CommandError(f'Unknown project: {project}')
+
+        n_written = 0
+        n_skipped = 0
+        for project in projects:
+            records_path = os.path.join(PROJECT_PATH, project,
+                                        base.RECORDS_FILE)
+            with open(records_path, 'r') as f:
+                records = f.read().splitlines()
+            for record in records:
+                events_path = os.path.join(PROJECT_PATH, project, record,
+                                           base.RECORDS_FILE)
+                try:
+                    with open(events_path, 'r') as f:
+                        events = f.read().splitlines()
+                except FileNotFoundError:
+                    continue
+                for event in [e for e in events if '_' in e]:
+                    event_path = os.path.join(PROJECT_PATH, project, record,
+                                              event)
+                    if self.write_event(event_path, options['force']):
+                        n_written += 1
+                    else:
+                        n_skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {n_written} events to {base.SIGNAL_STORE_DIR} '
+            f'({n_skipped} already up to date)'
+        ))
+
+    def write_event(self, event_path, force):
+        """
+        Write the signals of one event as a channel-major `.npy` file, with
+        its header, alarm and signal statistics in a `.json` sidecar.
+
+        Parameters
+        ----------
+        event_path : str
+            The path of the WFDB record for the event (without extension).
+        force : bool
+            Whether to write the event even if the store is up to date.
+
+        Returns
+        -------
+        N/A : bool
+            Whether the event was written.
+
+        """
+        mtime = get_event_mtime(event_path)
+        store_path = get_store_path(event_path)
+        if not force:
+            try:
+                with open(store_path + '.json', 'r') as f:
+                    stored = json.load(f)
+                # Events stored with older statistics, or none, are stale
+                stats_version = stored.get('signal_stats', {}).get('version')
+                if ((stored['mtime'] == mtime)
+                        and (stats_version == SIGNAL_STATS_VERSION)):
+                    return False
+            except FileNotFoundError:
+                pass
+
+        header = wfdb.rdheader(event_path)
+        ann = wfdb.rdann(event_path, 'alm')
+        return_res = 32 if set(header.fmt) & set(WIDE_FORMATS) else 16
+        record = wfdb.rdrecord(event_path, physical=False,
+                               return_res=return_res)
+        event_info = {
+            'fs': header.fs,
+            'sig_len': header.sig_len,
+            'sig_name': header.sig_name,
+            'units': header.units,
+            'fmt': header.fmt,
+            'adc_gain': [float(g) for g in header.adc_gain],
+            'baseline': [int(b) for b in header.baseline],
+            'alarm_sample': int(ann.sample[0]),
+            'alarm_fs': ann.fs,
+            'mtime': mtime
+        }
+        event_info['signal_stats'] = self.get_signal_stats(record.d_signal.T,
+                                                           event_info)
+
+        # Write to temporary files first so the viewer never sees a partial
+        # event, the sidecar goes last since it marks the event as usable
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        with open(store_path + '.npy.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(record.d_signal.T))
+        os.replace(store_path + '.npy.tmp', store_path + '.npy')
+        with open(store_path + '.json.tmp', 'w') as f:
+            json.dump(event_info, f)
+        os.replace(store_path + '.json.tmp', store_path + '.json')
+        return True
+
+    def get_signal_stats(self, d_signal, event_info):
+        """
+        Get the statistics of every signal for the window the viewer reads
+        with the default time range, so the viewer does not compute them
+        for the common `signal_std` settings. The signals are converted
+        exactly as the viewer does so the y-axes are the same either way.
+
+        Parameters
+        ----------
+        d_signal : ndarray
+            The channel-major digital values of the whole event.
+        event_info : dict
+            The header information of the event.
+
+        Returns
+        -------
+        N/A : dict
+            The `version` of the statistics, the `index_start` and
+            `index_stop` of the window, the `signal_std` values and the
+            statistics of each of the `channels`, from `get_signal_stats`.
+
+        """
+        # The same window as `prepare_graph`
+        event_time = event_info['alarm_sample'] / event_info['alarm_fs']
+        index_start = int(event_info['fs'] * (event_time
+                                              - STATS_TIME_RANGE[0]))
+        index_stop = int(event_info['fs'] * (event_time
+                                             + STATS_TIME_RANGE[1]))
+        sampfrom = min(max(index_start, 0), event_info['sig_len'])
+        sampto = min(max(index_stop, sampfrom), event_info['sig_len'])
+
+        channels = []
+        for c in range(len(event_info['sig_name'])):
+            p_signal = to_physical(d_signal[c,sampfrom:sampto],
+                                   event_info['baseline'][c],
+                                   event_info['adc_gain'][c],
+                                   event_info['fmt'][c])
+            # As `format_y_vals` does
+            y_vals = np.nan_to_num(p_signal).astype('float64')
+            channels.append(get_signal_stats(y_vals))
+        return {
+            'version': SIGNAL_STATS_VERSION,
+            'index_start': index_start,
+            'index_stop': index_stop,
+            'signal_std': SIGNAL_STD_VALUES,
+            'channels': channels
+        }
@@ -0,0 +1,82 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+
+from waveforms.models import Annotation, Assignment, User, UserProgress
+
+
+class Command(BaseCommand):
+    help = ('Check the progress counters of every user against their '
+            'assignments and annotations.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Recount every progress counter if any differ.')
+
+    def handle(self, *args, **options):
+        expected = self.count_progress()
+        stored = {
+            (p.user_id, p.project): (p.assigned, p.completed, p.saved)
+            for p in UserProgress.objects.all()
+        }
+        usernames = dict(User.objects.values_list('id', 'username'))
+
+        n_wrong = 0
+        for key in sorted(set(expected) | set(stored)):
+            counts = expected.get(key, (0, 0, 0))
+            if stored.get(key, (0, 0, 0)) != counts:
+                n_wrong += 1
+                self.stdout.write(
+                    f'{usernames.get(key[0], key[0])} ({key[1]}): stored '
+                    f'{stored.get(key)}, expected (assigned, completed, '
+                    f'saved) {counts}'
+                )
+
+        if not n_wrong:
+            self.stdout.write(self.style.SUCCESS('All progress counters are '
+                                                 'up to date'))
+        elif options['fix']:
+            UserProgress.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Recounted the progress counters ({n_wrong} were wrong)'
+            ))
+        else:
+            raise CommandError(f'{n_wrong} progress counters are wrong, '
+                               f'run with --fix to recount them')
+
+    def count_progress(self):
+        """
+        Count the assigned, completed and saved events of each user in each
+        project from their assignments and annotations, independently of
+        `UserProgress`.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A : dict
+            The number of assigned, completed and saved events keyed by the
+            user ID and project.
+
+        """
+        user_anns = Annotation.objects.filter(
+            user=OuterRef('user'), project=OuterRef('project'),
+            event=OuterRef('event'), is_adjudication=False
+        )
+        assignments = Assignment.objects.annotate(
+            is_complete=Exists(user_anns.exclude(decision='Save for Later')),
+            is_saved=Exists(user_anns.filter(decision='Save for Later'))
+        ).values_list('user_id', 'project', 'is_complete', 'is_saved')
+
+        assigned = Counter()
+        completed = Counter()
+        saved = Counter()
+        for user_id, project, is_complete, is_saved in assignments:
+            assigned[(user_id, project)] += 1
+            completed[(user_id, project)] += is_complete
+            saved[(user_id, project)] += is_saved
+        return {key: (assigned[key], completed[key], saved[key])
+                for key in assigned}
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import WaveformVizTools
+from waveforms.event_data import get_data_events, iter_event_data_npz
+from waveforms.models import User, UserSettings
+
+
+class Command(BaseCommand):
+    help = ('Write the signals shown to the annotators and the labels of a '
+            'set of events as a NumPy .npz archive, for training models '
+            'offline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='The .npz file to be written.')
+        parser.add_argument('--user', required=True,
+                            help=('The user whose viewer settings choose the '
+                                  'window and the signals of each event.'))
+        parser.add_argument('--project', action='append',
+                            help='Only use this project (may be repeated).')
+        parser.add_argument('--record', action='append',
+                            help='Only use this record (may be repeated).')
+        parser.add_argument('--event', action='append',
+                            help='Only use this event (may be repeated).')
+        parser.add_argument('--outcome', action='append',
+                            help=('Only use the events with this outcome, '
+                                  'such as unan_true or conflict (may be '
+                                  'repeated).'))
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+            UserSettings.objects.get(user=user)
+        except (User.DoesNotExist, UserSettings.DoesNotExist):
+            raise CommandError(f'Unknown user or user without settings: '
+                               f'{options["user"]}')
+
+        data_events = get_data_events(projects=options['project'],
+                                      records=options['record'],
+                                      events=options['event'],
+                                      outcomes=options['outcome'])
+        counts = {}
+        with open(options['output'], 'wb') as f:
+            for chunk in iter_event_data_npz(WaveformVizTools(user.username),
+                                             data_events, counts=counts):
+                f.write(chunk)
+        self.stdout.write(f'Wrote {counts["written"]} events to '
+                          f'{options["output"]} ({counts["skipped"]} skipped '
+                          f'since their files are missing)')
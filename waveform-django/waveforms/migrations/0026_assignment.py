@@ -0,0 +1,38 @@
+# Generated by Django 2.2.13 on 2026-10-17 21:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0025_annotation_is_adjudication'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=50)),
+                ('record', models.CharField(max_length=50)),
+                ('event', models.CharField(max_length=50)),
+                ('assigned_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment', to='waveforms.User')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['user', 'project'], name='waveforms_a_user_id_d97751_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['project', 'event'], name='waveforms_a_project_7c119a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assignment',
+            constraint=models.UniqueConstraint(fields=('user', 'project', 'event'), name='unique_assignment'),
+        ),
+    ]
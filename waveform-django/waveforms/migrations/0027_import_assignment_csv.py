@@ -0,0 +1,45 @@
+import csv
+import os
+
+from django.db import migrations
+
+from website.settings import base
+
+
+def import_assignment_csv(apps, schema_editor):
+    """
+    Copy the assignments of every project from its assignment CSV file, if
+    it has one, into the Assignment table.
+    """
+    Assignment = apps.get_model('waveforms', 'Assignment')
+    User = apps.get_model('waveforms', 'User')
+    users = {u.username: u for u in User.objects.all()}
+    for project in base.ALL_PROJECTS:
+        csv_path = os.path.join(base.HEAD_DIR, 'record-files', project,
+                                base.ASSIGNMENT_FILE)
+        if not os.path.exists(csv_path):
+            continue
+        assignments = []
+        with open(csv_path, 'r') as csv_file:
+            csvreader = csv.reader(csv_file, delimiter=',')
+            next(csvreader, None)
+            for row in csvreader:
+                for name in row[1:]:
+                    if name in users:
+                        assignments.append(Assignment(
+                            user=users[name], project=project,
+                            record=row[0].split('_')[0], event=row[0]
+                        ))
+        Assignment.objects.bulk_create(assignments, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0026_assignment'),
+    ]
+
+    operations = [
+        migrations.RunPython(import_assignment_csv,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.13 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0027_import_assignment_csv'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConflictingEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=50)),
+                ('record', models.CharField(max_length=50)),
+                ('event', models.CharField(max_length=50)),
+                ('completed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='conflictingevent',
+            index=models.Index(fields=['completed_at', 'id'], name='waveforms_c_complet_2cdad5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conflictingevent',
+            constraint=models.UniqueConstraint(fields=('project', 'record', 'event'), name='unique_conflicting_event'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def populate_conflicting_events(apps, schema_editor):
+    """
+    Add every conflicting event which has not been adjudicated to the
+    adjudication queue.
+    """
+    Annotation = apps.get_model('waveforms', 'Annotation')
+    ConflictingEvent = apps.get_model('waveforms', 'ConflictingEvent')
+    event_anns = defaultdict(list)
+    for ann in Annotation.objects.values_list(
+            'project', 'record', 'event', 'decision', 'decision_date',
+            'is_adjudication').order_by('id').iterator():
+        event_anns[ann[:3]].append(ann[3:])
+
+    conflicting_events = []
+    for (project, record, event), anns in event_anns.items():
+        if any(a[2] for a in anns) or (len(set(a[0] for a in anns)) < 2):
+            continue
+        conflicting_events.append(ConflictingEvent(
+            project=project, record=record, event=event,
+            completed_at=max([a[1] for a in anns if a[1]],
+                             default=timezone.now())
+        ))
+    ConflictingEvent.objects.bulk_create(conflicting_events,
+                                         ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0028_conflictingevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_conflicting_events,
+                             migrations.RunPython.noop),
+    ]
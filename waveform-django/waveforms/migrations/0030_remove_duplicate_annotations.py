@@ -0,0 +1,80 @@
+import csv
+import os
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+# Where the deleted annotations are kept, in the backups directory
+DELETED_FILE = 'deleted-annotations_0030.csv'
+# The values kept of each deleted annotation, enough to restore it
+DELETED_FIELDS = ['id', 'user__username', 'project', 'record', 'event',
+                  'is_adjudication', 'decision', 'comments', 'decision_date']
+
+
+def back_up_deleted(annotations):
+    """
+    Append the annotations about to be deleted to `DELETED_FILE` in the
+    backups directory, since deleting them cannot be reversed.
+
+    Parameters
+    ----------
+    annotations : QuerySet
+        The annotations to be deleted.
+
+    Returns
+    -------
+    N/A : int
+        The number of annotations written.
+
+    """
+    rows = list(annotations.values_list(*DELETED_FIELDS))
+    if rows:
+        os.makedirs(settings.BACKUP_DIR, exist_ok=True)
+        path = os.path.join(settings.BACKUP_DIR, DELETED_FILE)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(DELETED_FIELDS)
+            writer.writerows(rows)
+    return len(rows)
+
+
+def remove_duplicate_annotations(apps, schema_editor):
+    """
+    Keep only the most recent of any annotations a user made of the same
+    event, so each can be made unique. This cannot be reversed, so every
+    deleted annotation is first written to `DELETED_FILE`.
+    """
+    Annotation = apps.get_model('waveforms', 'Annotation')
+    duplicates = Annotation.objects.values(
+        'user', 'project', 'record', 'event', 'is_adjudication'
+    ).annotate(
+        n_anns=Count('id'), last_id=Max('id')
+    ).filter(n_anns__gt=1)
+    n_deleted = 0
+    for dup in duplicates:
+        old_anns = Annotation.objects.filter(
+            user=dup['user'], project=dup['project'], record=dup['record'],
+            event=dup['event'], is_adjudication=dup['is_adjudication']
+        ).exclude(id=dup['last_id'])
+        n_deleted += back_up_deleted(old_anns)
+        old_anns.delete()
+    if n_deleted:
+        print(f'\n  Deleted {n_deleted} duplicate annotations, kept in '
+              f'{os.path.join(settings.BACKUP_DIR, DELETED_FILE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0029_populate_conflictingevent'),
+    ]
+
+    # The deleted annotations are not restored when migrating backwards
+    operations = [
+        migrations.RunPython(remove_duplicate_annotations,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.13 on 2026-10-17 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0030_remove_duplicate_annotations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(fields=['project', 'record', 'event'], name='annotation_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(fields=['decision_date'], name='annotation_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='annotation',
+            constraint=models.UniqueConstraint(fields=('user', 'project', 'record', 'event', 'is_adjudication'), name='unique_annotation'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.13 on 2026-10-17 21:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0031_annotation_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(max_length=50)),
+                ('assigned', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('saved', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='waveforms.User')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'project'), name='unique_user_progress'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+
+
+def populate_user_progress(apps, schema_editor):
+    """
+    Count the assigned, completed and saved events of every user in every
+    project.
+    """
+    Annotation = apps.get_model('waveforms', 'Annotation')
+    Assignment = apps.get_model('waveforms', 'Assignment')
+    UserProgress = apps.get_model('waveforms', 'UserProgress')
+    decisions = Annotation.objects.filter(
+        user=OuterRef('user'), project=OuterRef('project'),
+        event=OuterRef('event'), is_adjudication=False
+    ).values('decision')[:1]
+    counts = Assignment.objects.annotate(
+        decision=Subquery(decisions)
+    ).values('user_id', 'project').annotate(
+        assigned=Count('id'),
+        completed=Count('id', filter=Q(decision__isnull=False)
+                                     & ~Q(decision='Save for Later')),
+        saved=Count('id', filter=Q(decision='Save for Later'))
+    ).order_by()
+    UserProgress.objects.bulk_create([UserProgress(**c) for c in counts],
+                                     ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0032_userprogress'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_user_progress,
+                             migrations.RunPython.noop),
+    ]
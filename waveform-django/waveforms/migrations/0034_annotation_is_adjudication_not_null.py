@@ -0,0 +1,88 @@
+import csv
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Q
+
+
+# Where the deleted annotations are kept, in the backups directory
+DELETED_FILE = 'deleted-annotations_0034.csv'
+# The values kept of each deleted annotation, enough to restore it
+DELETED_FIELDS = ['id', 'user__username', 'project', 'record', 'event',
+                  'is_adjudication', 'decision', 'comments', 'decision_date']
+
+
+def back_up_deleted(annotations):
+    """
+    Append the annotations about to be deleted to `DELETED_FILE` in the
+    backups directory, since deleting them cannot be reversed.
+
+    Parameters
+    ----------
+    annotations : QuerySet
+        The annotations to be deleted.
+
+    Returns
+    -------
+    N/A : int
+        The number of annotations written.
+
+    """
+    rows = list(annotations.values_list(*DELETED_FIELDS))
+    if rows:
+        os.makedirs(settings.BACKUP_DIR, exist_ok=True)
+        path = os.path.join(settings.BACKUP_DIR, DELETED_FILE)
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(DELETED_FIELDS)
+            writer.writerows(rows)
+    return len(rows)
+
+
+def backfill_is_adjudication(apps, schema_editor):
+    """
+    Mark the annotations without `is_adjudication` as not adjudications,
+    keeping only the most recent where the user already annotated the event,
+    since NULL is not unique. This cannot be reversed, so every deleted
+    annotation is first written to `DELETED_FILE`.
+    """
+    Annotation = apps.get_model('waveforms', 'Annotation')
+    keys = list(Annotation.objects.filter(
+        is_adjudication__isnull=True
+    ).values('user', 'project', 'record', 'event').distinct().order_by())
+    n_deleted = 0
+    for key in keys:
+        anns = Annotation.objects.filter(
+            Q(is_adjudication=False) | Q(is_adjudication__isnull=True), **key
+        )
+        last_id = anns.aggregate(Max('id'))['id__max']
+        old_anns = anns.exclude(id=last_id)
+        n_deleted += back_up_deleted(old_anns)
+        old_anns.delete()
+    Annotation.objects.filter(is_adjudication__isnull=True).update(
+        is_adjudication=False
+    )
+    if n_deleted:
+        print(f'\n  Deleted {n_deleted} duplicate annotations, kept in '
+              f'{os.path.join(settings.BACKUP_DIR, DELETED_FILE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0033_populate_userprogress'),
+    ]
+
+    # The deleted annotations are not restored when migrating backwards
+    operations = [
+        migrations.RunPython(backfill_is_adjudication,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='annotation',
+            name='is_adjudication',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# The migrations which first filled the tables, before 0030 and 0034 removed
+# duplicate annotations
+populate_conflictingevent = import_module(
+    'waveforms.migrations.0029_populate_conflictingevent'
+)
+populate_userprogress = import_module(
+    'waveforms.migrations.0033_populate_userprogress'
+)
+
+
+def refresh_derived_tables(apps, schema_editor):
+    """
+    Recompute the adjudication queue and the progress of every user from
+    the annotations left after the duplicates were removed.
+    """
+    ConflictingEvent = apps.get_model('waveforms', 'ConflictingEvent')
+    UserProgress = apps.get_model('waveforms', 'UserProgress')
+    ConflictingEvent.objects.all().delete()
+    populate_conflictingevent.populate_conflicting_events(apps,
+                                                          schema_editor)
+    UserProgress.objects.all().delete()
+    populate_userprogress.populate_user_progress(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0034_annotation_is_adjudication_not_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(refresh_derived_tables,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.13 on 2026-10-17 23:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('waveforms', '0035_refresh_derived_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='annotation',
+            index=models.Index(fields=['modified_at'], name='annotation_modified_idx'),
+        ),
+    ]
@@ -1,13 +1,17 @@
-import csv
-import os
-
+from django.core.cache import cache
 from django.core.validators import EmailValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from website.settings import base
 
 
+# The cache key of the leaderboard stats, cleared when annotations change
+LEADERBOARD_CACHE_KEY = 'leaderboard'
+
+
 class User(models.Model):
     """
     The model for each user on the platform.
@@ -95,31 +99,15 @@ class User(models.Model):
 
         Returns
         -------
-        count : int
+        N/A : int
             The total number of events remaining from the user's assignment.
 
         """
-        BASE_DIR = base.BASE_DIR
-        FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-        FILE_LOCAL = os.path.join('record-files')
-        PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
-
-        count = 0
-        for project in base.ALL_PROJECTS:
-            event_list = []
-            csv_path = os.path.join(PROJECT_PATH, project, base.ASSIGNMENT_FILE)
-            with open(csv_path, 'r') as csv_file:
-                csvreader = csv.reader(csv_file, delimiter=',')
-                next(csvreader)
-                for row in csvreader:
-                    if self.username in row[1:]:
-                        event_list.append(row[0])
-            complete_events = Annotation.objects.filter(
-                user=self, project=project, is_adjudication=False).exclude(
-                decision='Save for Later').values_list('event', flat=True)
-            event_list = [e for e in event_list if e not in complete_events]
-            count += len(event_list)
-        return count
+        return self.progress.filter(
+            project__in=base.ALL_PROJECTS
+        ).aggregate(
+            remaining=Coalesce(Sum(F('assigned') - F('completed')), 0)
+        )['remaining']
 
 
 class InvitedEmails(models.Model):
@@ -145,11 +133,33 @@ class Annotation(models.Model):
     decision = models.CharField(max_length=9, blank=False)
     comments = models.TextField(default='')
     decision_date = models.DateTimeField(null=True, blank=False)
-    is_adjudication = models.BooleanField(default=False, null=True)
+    is_adjudication = models.BooleanField(default=False)
+    # When the row was last changed, by the server's clock
+    modified_at = models.DateTimeField(auto_now=True)
 
-    def update(self):
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'record', 'event'],
+                         name='annotation_event_idx'),
+            models.Index(fields=['decision_date'],
+                         name='annotation_date_idx'),
+            models.Index(fields=['modified_at'],
+                         name='annotation_modified_idx')
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'project', 'record', 'event',
+                        'is_adjudication'],
+                name='unique_annotation'
+            )
+        ]
+
+    def submit(self):
         """
-        Update the user's annotation if it exists, else create a new one.
+        Save the user's decision and comments on the event, changing their
+        existing annotation (or adjudication) in place if it differs. Safe to
+        call concurrently for the same user and event since each annotation
+        is unique.
 
         Parameters
         ----------
@@ -157,22 +167,294 @@ class Annotation(models.Model):
 
         Returns
         -------
-        N/A
+        N/A : bool
+            True if the annotation was created or changed.
 
         """
-        all_annotations = Annotation.objects.filter(
+        existing_annotation = Annotation.objects.filter(
             user=self.user, project=self.project, record=self.record,
-            event=self.event, is_adjudication=False
+            event=self.event, is_adjudication=self.is_adjudication
         )
-        if all_annotations:
-            for a in all_annotations:
-                a.decision = self.decision
-                a.comments = self.comments
-                a.decision_date = self.decision_date
-                a.save(update_fields=['decision', 'comments',
-                                      'decision_date'])
-        else:
+        try:
             self.save()
+            return True
+        except IntegrityError:
+            # Only a conflict with the user's existing annotation of the
+            # event is expected, any other failure is passed on
+            if not existing_annotation.exists():
+                raise
+        changed_annotation = existing_annotation.exclude(
+            decision=self.decision, comments=self.comments
+        )
+        with transaction.atomic():
+            # `update` does not set `auto_now` fields
+            if changed_annotation.update(decision=self.decision,
+                                         comments=self.comments,
+                                         decision_date=self.decision_date,
+                                         modified_at=timezone.now()):
+                self.refresh_related()
+                return True
+        return False
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.refresh_related()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.refresh_related()
+        return result
+
+    def refresh_related(self):
+        """
+        Update the adjudication queue, the annotator's progress and the
+        leaderboard after the annotations of this event change.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        ConflictingEvent.refresh(self.project, self.record, self.event)
+        if not self.is_adjudication:
+            UserProgress.refresh(self.user_id, self.project)
+        cache.delete(LEADERBOARD_CACHE_KEY)
+
+
+class ConflictingEvent(models.Model):
+    """
+    The queue of events whose annotations conflict and which have not been
+    adjudicated, ordered by the time their last annotation was made. It is
+    kept up to date whenever an annotation is saved or deleted.
+    """
+    project = models.CharField(max_length=50, blank=False)
+    record = models.CharField(max_length=50, blank=False)
+    event = models.CharField(max_length=50, blank=False)
+    completed_at = models.DateTimeField(blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['completed_at', 'id'])
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'record', 'event'],
+                                    name='unique_conflicting_event')
+        ]
+
+    @staticmethod
+    def is_conflicting(annotations):
+        """
+        Determine whether the annotations of an event need to be adjudicated.
+
+        Parameters
+        ----------
+        annotations : list[tuple]
+            The decision, decision date and whether it is an adjudication of
+            every annotation of the event.
+
+        Returns
+        -------
+        N/A : bool
+            True if the event has no adjudication and its annotations have
+            at least two different decisions.
+
+        """
+        if any(a[2] for a in annotations):
+            return False
+        return len(set(a[0] for a in annotations)) >= 2
+
+    @staticmethod
+    def get_completed_at(annotations):
+        """
+        Get the time the annotations of an event were completed.
+
+        Parameters
+        ----------
+        annotations : list[tuple]
+            The decision, decision date and whether it is an adjudication of
+            every annotation of the event.
+
+        Returns
+        -------
+        N/A : datetime.datetime
+            The date of the most recent annotation.
+
+        """
+        return max([a[1] for a in annotations if a[1]],
+                   default=timezone.now())
+
+    @classmethod
+    def refresh(cls, project, record, event):
+        """
+        Add or remove an event from the queue after its annotations change.
+
+        Parameters
+        ----------
+        project : str
+            The project of the event.
+        record : str
+            The record of the event.
+        event : str
+            The event whose annotations changed.
+
+        Returns
+        -------
+        N/A
+
+        """
+        annotations = list(Annotation.objects.filter(
+            project=project, record=record, event=event
+        ).values_list('decision', 'decision_date', 'is_adjudication'))
+        if cls.is_conflicting(annotations):
+            cls.objects.update_or_create(
+                project=project, record=record, event=event,
+                defaults={'completed_at': cls.get_completed_at(annotations)}
+            )
+        else:
+            cls.objects.filter(project=project, record=record,
+                               event=event).delete()
+
+
+class Assignment(models.Model):
+    """
+    The events assigned to each user to annotate.
+    """
+    user = models.ForeignKey('User', related_name='assignment',
+        on_delete=models.CASCADE)
+    project = models.CharField(max_length=50, blank=False)
+    record = models.CharField(max_length=50, blank=False)
+    event = models.CharField(max_length=50, blank=False)
+    assigned_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'project']),
+            models.Index(fields=['project', 'event'])
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project', 'event'],
+                                    name='unique_assignment')
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            UserProgress.refresh(self.user_id, self.project)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            UserProgress.refresh(self.user_id, self.project)
+        return result
+
+
+class UserProgress(models.Model):
+    """
+    The number of events assigned to each user in each project, and how many
+    of them they have completed or saved for later. It is kept up to date
+    whenever an annotation or assignment is saved or deleted, and must be
+    refreshed after assignments are created or deleted in bulk.
+    """
+    user = models.ForeignKey('User', related_name='progress',
+        on_delete=models.CASCADE)
+    project = models.CharField(max_length=50, blank=False)
+    assigned = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    saved = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project'],
+                                    name='unique_user_progress')
+        ]
+
+    @staticmethod
+    def get_counts(assignments):
+        """
+        Count the assigned, completed and saved events of each user and
+        project with a single grouped query.
+
+        Parameters
+        ----------
+        assignments : QuerySet
+            The assignments to be counted.
+
+        Returns
+        -------
+        N/A : QuerySet
+            The `user_id`, `project`, `assigned`, `completed` and `saved`
+            of each user and project.
+
+        """
+        decisions = Annotation.objects.filter(
+            user=OuterRef('user'), project=OuterRef('project'),
+            event=OuterRef('event'), is_adjudication=False
+        ).values('decision')[:1]
+        return assignments.annotate(
+            decision=Subquery(decisions)
+        ).values('user_id', 'project').annotate(
+            assigned=Count('id'),
+            completed=Count('id', filter=Q(decision__isnull=False)
+                                         & ~Q(decision='Save for Later')),
+            saved=Count('id', filter=Q(decision='Save for Later'))
+        ).order_by()
+
+    @classmethod
+    def refresh(cls, user_id, project):
+        """
+        Recount the progress of a user in a project after their annotations
+        or assignments change.
+
+        Parameters
+        ----------
+        user_id : int
+            The ID of the user.
+        project : str
+            The project whose annotations or assignments changed.
+
+        Returns
+        -------
+        N/A
+
+        """
+        counts = next(iter(cls.get_counts(Assignment.objects.filter(
+            user_id=user_id, project=project
+        ))), {})
+        counts = {f: counts.get(f, 0)
+                  for f in ['assigned', 'completed', 'saved']}
+        if not cls.objects.filter(user_id=user_id,
+                                  project=project).update(**counts):
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, project=project, **counts)],
+                ignore_conflicts=True
+            )
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recount the progress of every user in every project.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(**counts)
+                for counts in cls.get_counts(Assignment.objects.all())
+            ])
 
 
 class UserSettings(models.Model):
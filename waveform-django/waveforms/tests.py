@@ -0,0 +1,1989 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib import auth
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.test import RequestFactory
+from django.test.testcases import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import flask
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+import wfdb
+
+import cron
+from waveforms import exports
+from waveforms.catalog import ProjectCatalog
+from waveforms.dash_apps.finished_apps import waveform_vis
+from waveforms.dash_apps.finished_apps import waveform_vis_adjudicate
+from waveforms.dash_apps.finished_apps import waveform_vis_tools
+from waveforms.dash_apps.finished_apps.waveform_vis import get_next_events
+from waveforms.dash_apps.finished_apps.waveform_vis_cache import (
+    EventCache, event_cache
+)
+from waveforms.dash_apps.finished_apps.waveform_vis_prefetch import figure_prefetcher
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import (
+    FIGURE_CACHE_VERSION, PROJECT_PATH, SIGNAL_STD_VALUES, WaveformVizTools,
+    decode_array, encode_array, encode_figure, envelope_downsample,
+    get_flat_sigs, get_signal_stats, to_physical
+)
+from waveforms.event_data import get_data_events, iter_event_data_npz
+from waveforms.management.commands import assignments
+from waveforms.models import (Annotation, Assignment, ConflictingEvent, User,
+                              UserProgress, UserSettings)
+from waveforms.views import (get_all_assignments, get_leaderboard_stats,
+                             get_user_events)
+from website import middleware
+from website.settings import base
+
+
+class TestFigureCache(TestCase):
+    """
+    Test the cache of rendered figures shared by all workers.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+        UserSettings.objects.create(user=self.user)
+
+    def test_cached_figure(self):
+        """
+        Test that a figure created once is served from the cache.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        fig = WaveformVizTools('annotator').get_final_figure(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        cached_fig = WaveformVizTools('annotator').get_final_figure(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        self.assertIsInstance(cached_fig, dict)
+        self.assertEqual(json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)),
+                         cached_fig)
+
+    def test_settings_change_key(self):
+        """
+        Test that changing a rendering setting changes the cached figure.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        fig_key = WaveformVizTools('annotator').get_figure_key(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        user_settings = UserSettings.objects.get(user=self.user)
+        user_settings.sig_color = '#00ff00'
+        user_settings.save()
+        new_fig_key = WaveformVizTools('annotator').get_figure_key(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        self.assertNotEqual(fig_key, new_fig_key)
+
+
+class TestPrefetch(TestCase):
+    """
+    Test rendering the next events of an annotator in the background.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+        UserSettings.objects.create(user=self.user)
+
+    def test_next_events(self):
+        """
+        Test that the next events follow the user's order and wrap around.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        all_events = ['a_1m', 'b_1m', 'c_1m', 'd_1m']
+        all_indices = [2, 0, 3, 1]
+        self.assertEqual(get_next_events(all_events, all_indices, 'd_1m', 2),
+                         ['b_1m', 'c_1m'])
+        self.assertEqual(get_next_events(all_events, all_indices, 'a_1m', 5),
+                         ['d_1m', 'b_1m', 'c_1m'])
+        self.assertEqual(get_next_events(all_events, all_indices, 'e_1m', 2),
+                         [])
+
+    def test_prefetch_caches_figure(self):
+        """
+        Test that a prefetched figure is served from the cache.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        wvt = WaveformVizTools('annotator')
+        fig_key = wvt.get_figure_key('sample_data', 'v111l', 'v111l_1m')
+        self.assertIsNone(cache.get(fig_key, version=FIGURE_CACHE_VERSION))
+        for future in figure_prefetcher.prefetch(wvt, 'sample_data',
+                                                 ['v111l_1m']):
+            future.result()
+        self.assertIsNotNone(cache.get(fig_key, version=FIGURE_CACHE_VERSION))
+
+
+class TestFigureEncoding(TestCase):
+    """
+    Test the typed array encoding of the trace values sent to the browser.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+        UserSettings.objects.create(user=self.user)
+
+    def test_round_trip(self):
+        """
+        Test that the encoded trace values decode to exactly the plotted
+        values.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        fig = WaveformVizTools('annotator').create_final_figure(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        y_vals = [trace.y for trace in fig.data]
+        fig_dict = json.loads(json.dumps(encode_figure(fig),
+                                         cls=PlotlyJSONEncoder))
+        for trace, trace_y_vals in zip(fig_dict['data'], y_vals):
+            self.assertEqual(trace['y']['dtype'], 'f4')
+            np.testing.assert_array_equal(decode_array(trace['y']),
+                                          trace_y_vals)
+
+    def test_precision(self):
+        """
+        Test that the trace values are sent at single precision, not rounded
+        to fewer digits first.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        y_vals = np.array([0.1234567, 1000.123, -2048.5, 31.0625])
+        trace = WaveformVizTools('annotator').get_trace(
+            0, 0.004, y_vals, 'x1', 'y1', 'II'
+        )
+        encoded = encode_figure({'data': [trace.to_plotly_json()]})
+        np.testing.assert_array_equal(
+            decode_array(encoded['data'][0]['y']), y_vals.astype(np.float32)
+        )
+
+    def test_dtypes(self):
+        """
+        Test that other typed arrays round-trip exactly.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        vals = np.array([-32768, -1, 0, 1, 32767])
+        np.testing.assert_array_equal(decode_array(encode_array(vals, 'i2')),
+                                      vals)
+        vals = np.linspace(-40, 10, 101)
+        np.testing.assert_array_equal(decode_array(encode_array(vals, 'f8')),
+                                      vals)
+
+
+class TestProjectCatalog(TestCase):
+    """
+    Test the index of the records and events of each project.
+    """
+    def setUp(self):
+        self.project_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.project_dir.cleanup)
+        self.write_records('', ['r1', 'r2'])
+        self.write_records('r1', ['r1', 'r1_1m', 'r1_2m'])
+        self.write_records('r2', ['r2', 'r2_1m'])
+        self.catalog = ProjectCatalog(self.project_dir.name, 0)
+
+    def write_records(self, record, lines):
+        """
+        Write a RECORDS file of the test project.
+
+        Parameters
+        ----------
+        record : str
+            The record of the RECORDS file, empty for the project's.
+        lines : list[str]
+            The lines of the RECORDS file.
+
+        Returns
+        -------
+        N/A
+
+        """
+        records_dir = os.path.join(self.project_dir.name, 'project', record)
+        os.makedirs(records_dir, exist_ok=True)
+        records_path = os.path.join(records_dir, base.RECORDS_FILE)
+        with open(records_path, 'w') as f:
+            f.write('\n'.join(lines))
+        # Make sure the change is seen on file systems with coarse times
+        mtime = os.path.getmtime(records_path) + len(lines)
+        os.utime(records_path, (mtime, mtime))
+
+    def test_records_events(self):
+        """
+        Test that the records and events match the RECORDS files.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.assertEqual(self.catalog.get_records('project'), ['r1', 'r2'])
+        self.assertEqual(self.catalog.get_events('project'),
+                         ['r1_1m', 'r1_2m', 'r2_1m'])
+        self.assertEqual(self.catalog.get_events('project', 'r2'), ['r2_1m'])
+
+    def test_refresh(self):
+        """
+        Test that a changed RECORDS file is reread.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.assertEqual(self.catalog.get_events('project', 'r2'), ['r2_1m'])
+        self.write_records('r2', ['r2', 'r2_1m', 'r2_2m', 'r2_3m'])
+        self.assertEqual(self.catalog.get_events('project', 'r2'),
+                         ['r2_1m', 'r2_2m', 'r2_3m'])
+
+    def test_alarm_type(self):
+        """
+        Test that the alarm type is read from the header.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        catalog = ProjectCatalog(PROJECT_PATH, 0)
+        self.assertEqual(
+            catalog.get_alarm_type('sample_data', 'v101l', 'v101l_1m'),
+            'Ventricular_Tachycardia'
+        )
+
+
+class TestEnvelopeDownsample(TestCase):
+    """
+    Test the min/max envelope used to downsample the displayed signals.
+    """
+    def test_keeps_spikes(self):
+        """
+        Test that narrow spikes survive downsampling in the right order.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        y_vals = np.zeros(1000)
+        y_vals[101] = 5
+        y_vals[505] = -3
+        y_vals[999] = 2
+        down_y_vals = envelope_downsample(y_vals, 10)
+        self.assertEqual(len(down_y_vals), 200)
+        self.assertEqual(down_y_vals.max(), 5)
+        self.assertEqual(down_y_vals.min(), -3)
+        self.assertEqual(list(down_y_vals[20:22]), [0, 5])
+        self.assertEqual(list(down_y_vals[100:102]), [0, -3])
+        self.assertEqual(down_y_vals[-1], 2)
+
+    def test_small_buckets(self):
+        """
+        Test that buckets too small to save points leave the signal as is.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        y_vals = np.arange(10.0)
+        self.assertIs(envelope_downsample(y_vals, 2), y_vals)
+
+    def test_pairs_per_pixel(self):
+        """
+        Test that with the default settings at least one min/max pair is
+        sent per pixel of the initially displayed window, and fewer points
+        than the signals have samples.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user)
+        tools = WaveformVizTools('annotator')
+        _, _, _, index_start, index_stop, sig_order, _ = tools.prepare_graph(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        fig = tools.create_final_figure('sample_data', 'v101l', 'v101l_1m')
+        window_size = tools.WINDOW_SIZE_MIN + tools.WINDOW_SIZE_MAX
+        for trace in fig.data:
+            # Each pair spans two steps
+            self.assertLessEqual(2 * trace.dx, window_size / tools.FIG_WIDTH)
+            self.assertLess(len(trace.y), index_stop - index_start)
+
+
+
+class TestTimeAxis(TestCase):
+    """
+    Test the time of the samples drawn in the figure.
+    """
+    def test_window_before_record(self):
+        """
+        Test that a window which starts before the record is drawn from the
+        first sample, so the alarm stays at zero seconds.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user, time_range_min=310.0)
+        tools = WaveformVizTools('annotator')
+        # The alarm of the event is 300 s into the record, sampled at 250 Hz
+        fig = tools.create_final_figure('sample_data', 'v101l', 'v101l_1m')
+        for trace in fig.data:
+            self.assertEqual(trace.x0, -300.0)
+            # The last sample read is just before the end of the time range
+            self.assertAlmostEqual(trace.x0 + trace.dx * (len(trace.y) - 1),
+                                   tools.TIME_RANGE_MAX, delta=trace.dx * 2)
+        tick_vals = fig.layout[f'xaxis{len(fig.data)}'].tickvals
+        self.assertEqual(tick_vals[0], -300.0)
+        self.assertIn(0.0, tick_vals)
+
+
+class TestChannelSelection(TestCase):
+    """
+    Test choosing which signals of an event are displayed.
+    """
+    def setUp(self):
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user, n_ekg_sigs=2)
+        self.tools = WaveformVizTools('annotator')
+
+    def test_order_sigs(self):
+        """
+        Test the EKG signals come first, matched case-insensitively, then
+        one BP and one Resp signal, leaving out the excluded signals.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        sig_name = ['PLETH', 'avr', 'II', 'ABP', 'RESP', 'IBP1']
+        self.assertEqual(self.tools.order_sigs(sig_name), ([2, 1, 3, 0], 2))
+        self.assertEqual(self.tools.order_sigs(sig_name, exclude_sigs=[2]),
+                         ([1, 3, 0], 1))
+        self.assertEqual(
+            self.tools.order_sigs(sig_name, exclude_sigs=[1, 2, 3]),
+            ([5, 0], 0)
+        )
+
+    def test_flat_sigs(self):
+        """
+        Test the signals which are near zero or constant are found.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        signals = {
+            0: np.array([0.0, 0.005, -0.01, np.nan]),
+            1: np.array([3.0, 3.0, 3.0, 3.0]),
+            2: np.array([0.0, 0.5, 0.0, 0.0]),
+            3: np.array([np.nan, np.nan, np.nan, np.nan])
+        }
+        self.assertEqual(get_flat_sigs(signals), [0, 1, 3])
+        self.assertEqual(get_flat_sigs({}), [])
+
+
+class TestSignalStore(TestCase):
+    """
+    Test reading the signals of events from the memory-mapped signal store.
+    """
+    def setUp(self):
+        event_cache.clear()
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+        self.event_path = os.path.join(PROJECT_PATH, 'sample_data', 'v101l',
+                                       'v101l_1m')
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user)
+        self.tools = WaveformVizTools('annotator')
+
+    def test_store_matches_wfdb(self):
+        """
+        Test that the signal store gives the same signals as the WFDB files.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with mock.patch.object(base, 'SIGNAL_STORE_DIR', self.store_dir.name):
+            wfdb_info = self.tools.get_event_info(self.event_path)
+            channels = list(range(len(wfdb_info['sig_name'])))
+            wfdb_signals = self.tools.read_signals(self.event_path, wfdb_info,
+                                                   channels, 72500, 77500)
+            call_command('build_signal_store', project=['sample_data'],
+                         stdout=open(os.devnull, 'w'))
+            event_cache.clear()
+            store_info = self.tools.get_event_info(self.event_path)
+            store_signals = self.tools.read_signals(self.event_path,
+                                                    store_info, channels,
+                                                    72500, 77500)
+        self.assertIsNone(wfdb_info['store_path'])
+        self.assertIsNotNone(store_info['store_path'])
+        self.assertEqual(wfdb_info['event_time'], store_info['event_time'])
+        for c in channels:
+            np.testing.assert_array_equal(wfdb_signals[c], store_signals[c])
+
+
+    def test_window_matches_rdsamp(self):
+        """
+        Test that reading only a window of the signals gives the same
+        physical values as reading the whole record with WFDB, including a
+        window at the start of the record.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with mock.patch.object(base, 'SIGNAL_STORE_DIR', self.store_dir.name):
+            event_info = self.tools.get_event_info(self.event_path)
+            channels = [2, 0]
+            p_signal = wfdb.rdsamp(self.event_path)[0]
+            for index_start,index_stop in [(0, 2500), (72500, 77500)]:
+                signals = self.tools.read_signals(self.event_path, event_info,
+                                                  channels, index_start,
+                                                  index_stop)
+                self.assertEqual(sorted(signals), sorted(channels))
+                for c in channels:
+                    np.testing.assert_array_equal(
+                        signals[c], p_signal[index_start:index_stop, c]
+                    )
+
+
+class TestEventCache(TestCase):
+    """
+    Test the in-process cache of decoded event data.
+    """
+    def test_byte_budget(self):
+        """
+        Test values are evicted least recently used first once their total
+        size exceeds the budget, however many there are.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        small_cache = EventCache(100)
+        for i in range(10):
+            small_cache.set(('small', i), i, 10)
+        self.assertEqual(small_cache.stats()['entries'], 10)
+        self.assertEqual(small_cache.evictions, 0)
+
+        small_cache.clear()
+        small_cache.set('a', 'a', 60)
+        small_cache.set('b', 'b', 30)
+        small_cache.get('a')
+        small_cache.set('c', 'c', 20)
+        self.assertIsNone(small_cache.get('b'))
+        self.assertEqual(small_cache.get('a'), 'a')
+        self.assertEqual(small_cache.get('c'), 'c')
+        self.assertEqual(small_cache.stats()['bytes'], 80)
+
+        # Values larger than the whole budget are not cached
+        small_cache.set('d', 'd', 101)
+        self.assertIsNone(small_cache.get('d'))
+        self.assertEqual(small_cache.stats()['entries'], 2)
+
+    def test_stats(self):
+        """
+        Test the hits, misses and evictions are counted.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        small_cache = EventCache(20)
+        small_cache.get('a')
+        small_cache.set('a', 'a', 10)
+        small_cache.get('a')
+        small_cache.get('a')
+        small_cache.set('b', 'b', 10)
+        small_cache.set('c', 'c', 10)
+        self.assertEqual(small_cache.stats(), {
+            'hits': 2, 'misses': 1, 'evictions': 1, 'entries': 2,
+            'bytes': 20, 'max_bytes': 20
+        })
+        small_cache.clear()
+        self.assertEqual(small_cache.stats(), {
+            'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0,
+            'bytes': 0, 'max_bytes': 20
+        })
+
+    def test_mtime_invalidation(self):
+        """
+        Test the cached header and signals of an event are not used once any
+        of its files is modified.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        event_cache.clear()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        for ext in ['.hea', '.mat', '.alm']:
+            shutil.copy(os.path.join(PROJECT_PATH, 'sample_data', 'v101l',
+                                     'v101l_1m' + ext), temp_dir.name)
+        event_path = os.path.join(temp_dir.name, 'v101l_1m')
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user)
+        tools = WaveformVizTools('annotator')
+
+        with mock.patch.object(base, 'SIGNAL_STORE_DIR', temp_dir.name):
+            event_info = tools.get_event_info(event_path)
+            tools.read_signals(event_path, event_info, [0, 1], 0, 1000)
+            self.assertIs(tools.get_event_info(event_path), event_info)
+            misses = event_cache.misses
+            tools.read_signals(event_path, event_info, [0, 1], 0, 1000)
+            self.assertEqual(event_cache.misses, misses)
+
+            mtime = os.path.getmtime(event_path + '.hea') + 10
+            os.utime(event_path + '.hea', (mtime, mtime))
+            new_info = tools.get_event_info(event_path)
+            self.assertIsNot(new_info, event_info)
+            self.assertEqual(new_info['mtime'], mtime)
+            misses = event_cache.misses
+            tools.read_signals(event_path, new_info, [0, 1], 0, 1000)
+            self.assertEqual(event_cache.misses, misses + 2)
+
+
+class TestSignalStats(TestCase):
+    """
+    Test the y-axis ranges read from the statistics of each signal.
+    """
+    def setUp(self):
+        event_cache.clear()
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+        user = User.objects.create(username='annotator',
+                                   email='annotator@example.com')
+        UserSettings.objects.create(user=user)
+        self.tools = WaveformVizTools('annotator')
+
+    def test_stats_match_window_signal(self):
+        """
+        Test the stored ranges are the ones `window_signal` computes, for
+        real and edge case signals.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        _, _, _, _, _, _, all_y_vals = self.tools.prepare_graph(
+            'sample_data', 'v101l', 'v101l_1m'
+        )
+        all_y_vals += [np.zeros(10), np.full(10, 3.0),
+                       np.array([0.0, 0.1, -0.1, 0.2, 50.0])]
+        for y_vals in all_y_vals:
+            stats = get_signal_stats(y_vals)
+            for i,std_range in enumerate(SIGNAL_STD_VALUES):
+                self.tools.USER_SETTINGS.signal_std = std_range
+                self.assertEqual((stats['min'][i], stats['max'][i]),
+                                 self.tools.window_signal(y_vals))
+
+    def test_physical_near_full_scale(self):
+        """
+        Test digital values near full scale with a nonzero baseline are
+        converted without wrapping around, as are their statistics.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        d_signal = np.array([32000, -32000, -32768], dtype=np.int16)
+        p_signal = to_physical(d_signal, -1000, 200.0, '16')
+        np.testing.assert_array_equal(p_signal, [165.0, -155.0, np.nan])
+        stats = get_signal_stats(np.nan_to_num(p_signal[:2]))
+        self.assertEqual(stats['mean'], 5.0)
+        self.assertEqual(stats['std'], 160.0)
+
+    def test_stored_stats(self):
+        """
+        Test the signal store holds the statistics of the default window so
+        figures are created without computing them, unless the user's
+        `signal_std` is not one of the stored values.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with mock.patch.object(base, 'SIGNAL_STORE_DIR', self.store_dir.name):
+            wfdb_fig = encode_figure(self.tools.create_final_figure(
+                'sample_data', 'v101l', 'v101l_1m'
+            ))
+            call_command('build_signal_store', project=['sample_data'],
+                         stdout=open(os.devnull, 'w'))
+            event_cache.clear()
+            with mock.patch.object(waveform_vis_tools, 'get_signal_stats',
+                                   side_effect=AssertionError):
+                with mock.patch.object(WaveformVizTools, 'window_signal',
+                                       side_effect=AssertionError):
+                    store_fig = encode_figure(self.tools.create_final_figure(
+                        'sample_data', 'v101l', 'v101l_1m'
+                    ))
+                self.tools.USER_SETTINGS.signal_std = 2.5
+                with mock.patch.object(WaveformVizTools, 'window_signal',
+                                       wraps=self.tools.window_signal) as w:
+                    self.tools.create_final_figure('sample_data', 'v101l',
+                                                   'v101l_1m')
+        self.assertEqual(json.dumps(wfdb_fig, cls=PlotlyJSONEncoder),
+                         json.dumps(store_fig, cls=PlotlyJSONEncoder))
+        self.assertTrue(w.called)
+
+
+class TestEventData(TestCase):
+    """
+    Test downloading the signals and labels of events for training models.
+    """
+    def setUp(self):
+        event_cache.clear()
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com',
+                                        is_admin=True)
+        UserSettings.objects.create(user=self.user)
+        Annotation.objects.create(user=self.user, project='sample_data',
+                                  record='v101l', event='v101l_1m',
+                                  decision='True', comments='')
+        self.client.force_login(auth.get_user_model().objects.create(
+            username='annotator'
+        ))
+
+    def test_download(self):
+        """
+        Test the downloaded signals are those shown in the viewer, with the
+        labels of the event.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        response = self.client.get(reverse('event_data'),
+                                   {'project': 'sample_data',
+                                    'event': 'v101l_1m'})
+        self.assertEqual(response.status_code, 200)
+        data = np.load(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(data['events'].tolist(),
+                         ['sample_data/v101l/v101l_1m'])
+        prefix = 'sample_data/v101l/v101l_1m/'
+        self.assertEqual(int(data[prefix + 'n_annotations']), 1)
+        self.assertEqual(str(data[prefix + 'outcome']), 'one_ann')
+
+        tools = WaveformVizTools('annotator')
+        (fs, sig_name, _, _, _, sig_order,
+         all_y_vals) = tools.prepare_graph('sample_data', 'v101l', 'v101l_1m')
+        self.assertEqual(data[prefix + 'sig_name'].tolist(),
+                         [sig_name[c] for c in sig_order])
+        self.assertEqual(float(data[prefix + 'fs']), fs)
+        signals = data[prefix + 'signals']
+        self.assertEqual(signals.dtype, np.int16)
+        p_signals = ((signals - data[prefix + 'baseline'][:,None])
+                     / data[prefix + 'adc_gain'][:,None])
+        p_signals[signals == -32768] = 0
+        for i,y_vals in enumerate(all_y_vals):
+            np.testing.assert_allclose(p_signals[i], y_vals)
+
+    def test_command(self):
+        """
+        Test the command writes the same archive as the download.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        stdout = io.StringIO()
+        with tempfile.TemporaryDirectory() as out_dir:
+            out_file = os.path.join(out_dir, 'event_data.npz')
+            call_command('event_data', out_file, user='annotator',
+                         outcome=['one_ann'], stdout=stdout)
+            with open(out_file, 'rb') as f:
+                command_data = f.read()
+        self.assertIn('Wrote 1 events', stdout.getvalue())
+        self.assertIn('(0 skipped', stdout.getvalue())
+        response = self.client.get(reverse('event_data'),
+                                   {'outcome': 'one_ann'})
+        self.assertEqual(b''.join(response.streaming_content), command_data)
+
+    def test_missing_files(self):
+        """
+        Test events whose files are missing are left out and counted.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        data_events = [('sample_data', 'v101l', 'v101l_missing', 0, None,
+                        None)] + get_data_events(events=['v101l_1m'])
+        counts = {}
+        archive = b''.join(iter_event_data_npz(
+            WaveformVizTools('annotator'), data_events, counts=counts
+        ))
+        self.assertEqual(counts, {'written': 1, 'skipped': 1})
+        data = np.load(io.BytesIO(archive))
+        self.assertEqual(data['events'].tolist(),
+                         ['sample_data/v101l/v101l_1m'])
+
+    def test_admin_only(self):
+        """
+        Test annotators who are not admins cannot download the events.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.user.is_admin = False
+        self.user.save()
+        response = self.client.get(reverse('event_data'))
+        self.assertEqual(response.status_code, 403)
+
+
+class TestAssignments(TestCase):
+    """
+    Test the assignments and their import and export as CSV files.
+    """
+    def setUp(self):
+        self.project_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.project_dir.cleanup)
+        os.mkdir(os.path.join(self.project_dir.name, 'sample_data'))
+        self.csv_path = os.path.join(self.project_dir.name, 'sample_data',
+                                     base.ASSIGNMENT_FILE)
+        self.csv_text = ('Events,Users Assigned\r\n'
+                         'v101l_1m,annotator,reviewer\r\n'
+                         'v131l_1m,annotator\r\n')
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com',
+                                        practice_status='ED')
+        User.objects.create(username='reviewer',
+                            email='reviewer@example.com',
+                            practice_status='ED')
+
+    def call_command(self, action):
+        """
+        Run the assignments command on the sample data project.
+
+        Parameters
+        ----------
+        action : str
+            Either `import` or `export`.
+
+        Returns
+        -------
+        N/A
+
+        """
+        with mock.patch.object(assignments, 'PROJECT_PATH',
+                               self.project_dir.name):
+            call_command('assignments', action, project=['sample_data'],
+                         stdout=open(os.devnull, 'w'))
+
+    def test_import_export(self):
+        """
+        Test that importing and exporting a CSV file keeps its assignments.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with open(self.csv_path, 'w', newline='') as f:
+            f.write(self.csv_text)
+        self.call_command('import')
+        # Importing twice does not duplicate the assignments
+        self.call_command('import')
+        self.assertEqual(Assignment.objects.count(), 3)
+        self.assertEqual(get_all_assignments('sample_data'),
+                         {'v101l_1m': ['annotator', 'reviewer'],
+                          'v131l_1m': ['annotator']})
+        os.remove(self.csv_path)
+        self.call_command('export')
+        with open(self.csv_path, 'r', newline='') as f:
+            self.assertEqual(f.read(), self.csv_text)
+
+    def test_user_events(self):
+        """
+        Test the events and remaining events of an annotator.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        for event in ['v131l_1m', 'v101l_1m']:
+            Assignment.objects.create(user=self.user, project='sample_data',
+                                      record=event.split('_')[0],
+                                      event=event)
+        Annotation.objects.create(user=self.user, project='sample_data',
+                                  record='v101l', event='v101l_1m',
+                                  decision='True')
+        self.assertEqual(get_user_events(self.user, 'sample_data'),
+                         ['v131l_1m', 'v101l_1m'])
+        self.assertEqual(self.user.events_remaining(), 1)
+
+
+class TestConflictingEvents(TestCase):
+    """
+    Test the queue of conflicting events waiting to be adjudicated.
+    """
+    def annotate(self, username, event, decision, minutes,
+                 is_adjudication=False):
+        """
+        Annotate an event of the sample data project.
+
+        Parameters
+        ----------
+        username : str
+            The user making the annotation.
+        event : str
+            The event to be annotated.
+        decision : str
+            The decision of the annotation.
+        minutes : int
+            When the annotation was made (minutes after midnight).
+        is_adjudication : bool, optional
+            Whether the annotation is an adjudication.
+
+        Returns
+        -------
+        annotation : Annotation
+            The new annotation.
+
+        """
+        user, _ = User.objects.get_or_create(
+            username=username, email=f'{username}@example.com'
+        )
+        annotation = Annotation(
+            user=user, project='sample_data', record=event.split('_')[0],
+            event=event, decision=decision,
+            decision_date=datetime.datetime(2021, 1, 1, 0, minutes,
+                                            tzinfo=datetime.timezone.utc),
+            is_adjudication=is_adjudication
+        )
+        annotation.submit()
+        return annotation
+
+    def test_queue(self):
+        """
+        Test that saving and deleting annotations keeps the queue in order
+        of completion.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        get_next = waveform_vis_adjudicate.get_current_conflicting_annotation
+        self.assertEqual(get_next(), ('N/A', 'N/A', 'N/A'))
+        self.annotate('annotator0', 'v131l_1m', 'True', 1)
+        self.annotate('annotator1', 'v131l_1m', 'False', 5)
+        self.annotate('annotator0', 'v101l_1m', 'True', 2)
+        self.annotate('annotator1', 'v101l_1m', 'True', 3)
+        self.annotate('annotator0', 'v111l_1m', 'True', 2)
+        self.annotate('annotator1', 'v111l_1m', 'Uncertain', 4)
+        # Changing a decision makes v101l_1m conflict
+        self.annotate('annotator1', 'v101l_1m', 'False', 3)
+        self.assertEqual(
+            list(ConflictingEvent.objects.order_by(
+                'completed_at', 'id'
+            ).values_list('event', flat=True)),
+            ['v101l_1m', 'v111l_1m', 'v131l_1m']
+        )
+        self.assertEqual(get_next(), ('sample_data', 'v101l', 'v101l_1m'))
+        self.assertEqual(get_next('sample_data', 'v111l', 'v111l_1m'),
+                         ('sample_data', 'v131l', 'v131l_1m'))
+        self.assertEqual(get_next('sample_data', 'v131l', 'v131l_1m'),
+                         ('sample_data', 'v101l', 'v101l_1m'))
+
+        # Adjudicating an event continues from where it was
+        adjudication = self.annotate('adjudicator', 'v111l_1m', 'True', 6,
+                                     is_adjudication=True)
+        self.assertEqual(get_next('sample_data', 'v111l', 'v111l_1m'),
+                         ('sample_data', 'v131l', 'v131l_1m'))
+        self.assertEqual(ConflictingEvent.objects.count(), 2)
+        adjudication.delete()
+        self.assertEqual(ConflictingEvent.objects.count(), 3)
+
+
+class TestUserProgress(TestCase):
+    """
+    Test the progress counters of each annotator.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+        for event in ['v101l_1m', 'v111l_1m', 'v131l_1m']:
+            Assignment.objects.create(user=self.user, project='sample_data',
+                                      record=event.split('_')[0],
+                                      event=event)
+
+    def get_progress(self):
+        """
+        Get the stored progress of the annotator.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A : tuple[int]
+            The number of assigned, completed and saved events.
+
+        """
+        progress = UserProgress.objects.get(user=self.user,
+                                            project='sample_data')
+        return progress.assigned, progress.completed, progress.saved
+
+    def test_counters(self):
+        """
+        Test the counters follow the annotations and assignments.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.assertEqual(self.get_progress(), (3, 0, 0))
+        Annotation(user=self.user, project='sample_data', record='v101l',
+                   event='v101l_1m', decision='Save for Later').submit()
+        self.assertEqual(self.get_progress(), (3, 0, 1))
+        Annotation(user=self.user, project='sample_data', record='v101l',
+                   event='v101l_1m', decision='True').submit()
+        self.assertEqual(self.get_progress(), (3, 1, 0))
+        self.assertEqual(self.user.events_remaining(), 2)
+        # Adjudications are not part of the annotator's progress
+        Annotation(user=self.user, project='sample_data', record='v111l',
+                   event='v111l_1m', decision='False',
+                   is_adjudication=True).submit()
+        self.assertEqual(self.get_progress(), (3, 1, 0))
+        Annotation.objects.get(event='v101l_1m').delete()
+        self.assertEqual(self.get_progress(), (3, 0, 0))
+        Assignment.objects.get(event='v131l_1m').delete()
+        self.assertEqual(self.get_progress(), (2, 0, 0))
+
+    def test_check_command(self):
+        """
+        Test the consistency check finds and fixes wrong counters.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        Annotation.objects.create(user=self.user, project='sample_data',
+                                  record='v101l', event='v101l_1m',
+                                  decision='True')
+        call_command('check_progress', stdout=io.StringIO())
+        UserProgress.objects.update(completed=0)
+        with self.assertRaises(CommandError):
+            call_command('check_progress', stdout=io.StringIO())
+        call_command('check_progress', fix=True, stdout=io.StringIO())
+        self.assertEqual(self.get_progress(), (3, 1, 0))
+
+
+class TestExports(TestCase):
+    """
+    Test the per-event consensus and the Parquet exports.
+    """
+    def setUp(self):
+        users = [User.objects.create(username=f'annotator{i}',
+                                     email=f'annotator{i}@example.com')
+                 for i in range(3)]
+        anns = [(0, 'v101l_1m', 'True', False), (1, 'v101l_1m', 'True', False),
+                (0, 'v111l_1m', 'True', False),
+                (1, 'v111l_1m', 'Reject', False),
+                (0, 'v131l_1m', 'True', False), (1, 'v131l_1m', 'False', False),
+                (2, 'v131l_1m', 'False', True)]
+        for i, event, decision, is_adjudication in anns:
+            Annotation.objects.create(
+                user=users[i], project='sample_data',
+                record=event.split('_')[0], event=event, decision=decision,
+                decision_date=timezone.now(), is_adjudication=is_adjudication
+            )
+
+    def test_consensus(self):
+        """
+        Test the outcome of each event.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        consensus = {c[2]: c for c in exports.get_event_consensus()}
+        self.assertEqual(consensus['v101l_1m'][3:],
+                         (2, 'unan_true', None))
+        self.assertEqual(consensus['v111l_1m'][3:],
+                         (2, 'unan_reject', None))
+        self.assertEqual(consensus['v131l_1m'][3:],
+                         (2, 'false_adj', 'False'))
+        self.assertEqual(consensus['v135l_1m'][3:], (0, 'no_anns', None))
+
+    def test_parquet(self):
+        """
+        Test that the annotations are written to Parquet with dictionary
+        encoded text columns.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with tempfile.TemporaryDirectory() as parquet_dir:
+            path = os.path.join(parquet_dir, 'all_anns.parquet')
+            exports.write_annotations_parquet(
+                path, exports.get_export_annotations()
+            )
+            table = exports.pq.read_table(path, memory_map=True)
+        self.assertEqual(table.column_names, exports.ANNOTATION_COLUMNS)
+        self.assertTrue(exports.pa.types.is_dictionary(
+            table.schema.field('event').type
+        ))
+        self.assertEqual(table.num_rows, Annotation.objects.count())
+        self.assertEqual(table.column('decision').to_pylist()[:2],
+                         ['True', 'True'])
+
+
+class TestBackups(TestCase):
+    """
+    Test the nightly annotation backups.
+    """
+    def setUp(self):
+        self.backup_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.backup_dir.cleanup)
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+
+    def annotate(self, event, days):
+        """
+        Annotate an event of the sample data project.
+
+        Parameters
+        ----------
+        event : str
+            The event to be annotated.
+        days : int
+            How many days ago the annotation was made, or None to leave the
+            decision date unset.
+
+        Returns
+        -------
+        N/A
+
+        """
+        if days is None:
+            decision_date = None
+        else:
+            decision_date = timezone.now() - datetime.timedelta(days=days)
+        Annotation.objects.create(
+            user=self.user, project='sample_data', record=event.split('_')[0],
+            event=event, decision='True', decision_date=decision_date
+        )
+
+    def read_backup(self, backup_file):
+        """
+        Read the events of a backup.
+
+        Parameters
+        ----------
+        backup_file : str
+            The backup to be read.
+
+        Returns
+        -------
+        N/A : list[str]
+            The event of each annotation in the backup.
+
+        """
+        with gzip.open(backup_file, 'rt', newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][0], 'username')
+        return [r[3] for r in rows[1:]]
+
+    def test_incremental(self):
+        """
+        Test that only the changed annotations are backed up between full
+        backups.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', 2)
+        self.annotate('v111l_1m', 1)
+        full_backup = cron.update_annotations(self.backup_dir.name)
+        self.assertIn('_full_', full_backup)
+        self.assertEqual(self.read_backup(full_backup),
+                         ['v101l_1m', 'v111l_1m'])
+
+        self.annotate('v131l_1m', 0)
+        backup = cron.update_annotations(self.backup_dir.name)
+        self.assertIn('_changes_', backup)
+        self.assertEqual(self.read_backup(backup), ['v131l_1m'])
+        # Nothing is written if nothing changed
+        n_files = len(os.listdir(self.backup_dir.name))
+        self.assertIsNone(cron.update_annotations(self.backup_dir.name))
+        self.assertEqual(len(os.listdir(self.backup_dir.name)), n_files)
+
+        # Write a full backup once the last one is too old
+        watermark = cron.read_watermark(self.backup_dir.name)
+        watermark['last_full'] -= datetime.timedelta(
+            days=base.BACKUP_FULL_INTERVAL
+        )
+        cron.write_watermark(self.backup_dir.name, watermark)
+        backup = cron.update_annotations(self.backup_dir.name)
+        self.assertIn('_full_', backup)
+        self.assertEqual(self.read_backup(backup),
+                         ['v101l_1m', 'v111l_1m', 'v131l_1m'])
+
+    def test_deletions(self):
+        """
+        Test that the annotations deleted since the last backup are marked
+        in the changes backup, so restoring from the full backup and the
+        changes gives the current annotations.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', 2)
+        self.annotate('v111l_1m', 1)
+        cron.update_annotations(self.backup_dir.name)
+
+        Annotation.objects.filter(event='v101l_1m').delete()
+        backup = cron.update_annotations(self.backup_dir.name)
+        self.assertIn('_changes_', backup)
+        with gzip.open(backup, 'rt', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(
+            [(r['username'], r['event'], r['is_adjudication'], r['deleted'])
+             for r in rows],
+            [('annotator', 'v101l_1m', 'False', 'True')]
+        )
+        self.assertIsNone(cron.update_annotations(self.backup_dir.name))
+
+    def test_client_dates(self):
+        """
+        Test that the changes are found by when the server saved them, so a
+        decision date set in the future or left unset does not make later
+        changes be missed.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', -30)
+        cron.update_annotations(self.backup_dir.name)
+
+        self.annotate('v111l_1m', 1)
+        self.annotate('v131l_1m', None)
+        backup = cron.update_annotations(self.backup_dir.name)
+        self.assertIn('_changes_', backup)
+        self.assertEqual(self.read_backup(backup), ['v111l_1m', 'v131l_1m'])
+
+        # Changes made through `submit` are also found
+        annotation = Annotation(
+            user=self.user, project='sample_data', record='v111l',
+            event='v111l_1m', decision='False', comments='',
+            decision_date=timezone.now() - datetime.timedelta(days=60)
+        )
+        annotation.submit()
+        backup = cron.update_annotations(self.backup_dir.name)
+        self.assertEqual(self.read_backup(backup), ['v111l_1m'])
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class TestAdminConsole(TestCase):
+    """
+    Test the annotation tables of the admin console.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='admin',
+                                        email='admin@example.com',
+                                        is_admin=True)
+        UserSettings.objects.create(user=self.user)
+        self.client.force_login(
+            auth.get_user_model().objects.create(username='admin')
+        )
+
+    def annotate(self, event, decisions):
+        """
+        Annotate an event of the sample data project.
+
+        Parameters
+        ----------
+        event : str
+            The event to be annotated.
+        decisions : list[str]
+            The decision of each annotator of the event.
+
+        Returns
+        -------
+        N/A
+
+        """
+        for i,decision in enumerate(decisions):
+            user, _ = User.objects.get_or_create(
+                username=f'annotator{i}', email=f'annotator{i}@example.com'
+            )
+            Annotation.objects.create(user=user, project='sample_data',
+                                      record=event.split('_')[0],
+                                      event=event, decision=decision)
+
+    def test_csv_export(self):
+        """
+        Test that the annotations are streamed as CSV without the practice
+        events.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', ['True', 'False'])
+        self.annotate('v131l_1m', ['Reject'])
+        Annotation.objects.filter(event='v101l_1m').update(
+            comments='Noise, then "VT"\nmaybe'
+        )
+        practice_set = {'sample_data': {'v101l_1m': False, 'v131l_1m': True}}
+        with mock.patch.object(base, 'PRACTICE_SET', practice_set):
+            response = self.client.post(reverse('admin_console'),
+                                        {'ann_to_csv': ''})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(
+            b''.join(response.streaming_content).decode()
+        )))
+        self.assertEqual(rows[0], ['username', 'project', 'record', 'event',
+                                   'decision', 'comments', 'date',
+                                   'is_adjudication'])
+        self.assertEqual(
+            [r[:6] + r[7:] for r in rows[1:]],
+            [['annotator0', 'sample_data', 'v101l', 'v101l_1m', 'True',
+              'Noise, then "VT"\nmaybe', 'False'],
+             ['annotator1', 'sample_data', 'v101l', 'v101l_1m', 'False',
+              'Noise, then "VT"\nmaybe', 'False']]
+        )
+
+    def test_tables(self):
+        """
+        Test that the events are classified by their annotations using the
+        same queries for any number of annotated events.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', ['True', 'False'])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin_console'))
+        n_queries = len(queries)
+        self.annotate('v111l_1m', ['True', 'True'])
+        self.annotate('v131l_1m', ['True', 'Uncertain'])
+        with self.assertNumQueries(n_queries):
+            response = self.client.get(reverse('admin_console'))
+
+        conflicts = dict(response.context['conflict_anns']['sample_data'])
+        unanimous = dict(response.context['unanimous_anns']['sample_data'])
+        self.assertEqual(sorted(conflicts), ['v101l', 'v131l'])
+        self.assertEqual(list(conflicts['v101l']), ['v101l_1m'])
+        self.assertEqual([a[:2] for a in conflicts['v101l']['v101l_1m']],
+                         [['annotator0', 'True'], ['annotator1', 'False']])
+        self.assertEqual(list(unanimous), ['v111l'])
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class TestAdjudications(TestCase):
+    """
+    Test the adjudication tables.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='adjudicator',
+                                        email='adjudicator@example.com',
+                                        is_adjudicator=True)
+        UserSettings.objects.create(user=self.user)
+        self.client.force_login(
+            auth.get_user_model().objects.create(username='adjudicator')
+        )
+
+    def annotate(self, event, decisions, adjudication=None):
+        """
+        Annotate and optionally adjudicate an event of the sample data
+        project.
+
+        Parameters
+        ----------
+        event : str
+            The event to be annotated.
+        decisions : list[str]
+            The decision of each annotator of the event.
+        adjudication : str, optional
+            The decision of the adjudicator.
+
+        Returns
+        -------
+        N/A
+
+        """
+        for i,decision in enumerate(decisions):
+            user, _ = User.objects.get_or_create(
+                username=f'annotator{i}', email=f'annotator{i}@example.com'
+            )
+            Annotation.objects.create(user=user, project='sample_data',
+                                      record=event.split('_')[0],
+                                      event=event, decision=decision,
+                                      decision_date=timezone.now())
+        if adjudication:
+            Annotation.objects.create(user=self.user, project='sample_data',
+                                      record=event.split('_')[0],
+                                      event=event, decision=adjudication,
+                                      decision_date=timezone.now(),
+                                      is_adjudication=True)
+
+    def test_tables(self):
+        """
+        Test that the adjudication tables use the same queries for any number
+        of events.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('v101l_1m', ['True', 'False'])
+        self.annotate('v111l_1m', ['True', 'False'], adjudication='True')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('render_adjudications'))
+        n_queries = len(queries)
+        self.annotate('v131l_1m', ['False', 'True'])
+        self.annotate('v135l_1m', ['True', 'True'])
+        self.annotate('v143l_1m', ['Reject', 'True'])
+        self.annotate('v119l_1m', ['False', 'True'], adjudication='False')
+        with self.assertNumQueries(n_queries):
+            response = self.client.get(reverse('render_adjudications'))
+
+        self.assertEqual(response.context['all_anns_frac'], '2/4')
+        self.assertEqual(
+            [batch[0][2] for batch in response.context['incomplete_page']],
+            ['v131l_1m', 'v101l_1m']
+        )
+        self.assertEqual(
+            [[a[3:5] for a in batch]
+             for batch in response.context['complete_page']],
+            [[['annotator0', 'False'], ['annotator1', 'True'],
+              ['adjudicator', 'False']],
+             [['annotator0', 'True'], ['annotator1', 'False'],
+              ['adjudicator', 'True']]]
+        )
+
+        response = self.client.get(reverse('render_adjudications'),
+                                   {'record': 'v131l'})
+        self.assertEqual(list(response.context['search']), ['inc'])
+        self.assertEqual(len(response.context['search']['inc']), 1)
+
+
+class TestLeaderboard(TestCase):
+    """
+    Test the leaderboard stats.
+    """
+    def setUp(self):
+        cache.clear()
+
+    def annotate(self, username, event, decision, days=0,
+                 is_adjudication=False):
+        """
+        Annotate an event of the sample data project.
+
+        Parameters
+        ----------
+        username : str
+            The user making the annotation.
+        event : str
+            The event to be annotated.
+        decision : str
+            The decision of the annotation.
+        days : int, optional
+            How many days ago the annotation was made.
+        is_adjudication : bool, optional
+            Whether the annotation is an adjudication.
+
+        Returns
+        -------
+        N/A
+
+        """
+        user, _ = User.objects.get_or_create(
+            username=username, email=f'{username}@example.com'
+        )
+        Annotation.objects.create(
+            user=user, project='sample_data', record=event.split('_')[0],
+            event=event, decision=decision,
+            decision_date=timezone.now() - datetime.timedelta(days=days),
+            is_adjudication=is_adjudication
+        )
+
+    def test_stats(self):
+        """
+        Test the counts of each user and event, and that they are cached
+        until an annotation changes.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.annotate('annotator0', 'v101l_1m', 'True')
+        self.annotate('annotator1', 'v101l_1m', 'True', days=3)
+        self.annotate('annotator0', 'v111l_1m', 'False', days=10)
+        self.annotate('annotator1', 'v111l_1m', 'Reject', days=40)
+        self.annotate('annotator0', 'v131l_1m', 'True')
+        self.annotate('annotator1', 'v131l_1m', 'False')
+        self.annotate('adjudicator', 'v131l_1m', 'False',
+                      is_adjudication=True)
+        self.annotate('annotator0', 'v135l_1m', 'Save for Later')
+        # One query for the users and one for the events
+        with self.assertNumQueries(2):
+            stats = get_leaderboard_stats()
+        self.assertEqual(stats['glob_all'], [['annotator0', 3],
+                                             ['annotator1', 3],
+                                             ['adjudicator', 0]])
+        self.assertEqual(stats['glob_today'][0], ['annotator0', 2])
+        self.assertEqual(stats['glob_week'][:2], [['annotator0', 2],
+                                                  ['annotator1', 2]])
+        self.assertEqual(stats['glob_month'][:2], [['annotator0', 3],
+                                                   ['annotator1', 2]])
+        self.assertEqual(stats['glob_true'][:2], [['annotator0', 2],
+                                                  ['annotator1', 1]])
+        self.assertEqual(stats['glob_false'][:2], [['annotator1', 2],
+                                                   ['annotator0', 1]])
+        self.assertEqual(
+            [stats[k] for k in ['unan_true', 'unan_reject', 'false_adj',
+                                'one_ann', 'conflict']],
+            [1, 1, 1, 1, 0]
+        )
+        self.assertEqual(stats['no_anns'], stats['num_events'] - 4)
+
+        with self.assertNumQueries(0):
+            get_leaderboard_stats()
+        self.annotate('annotator1', 'v135l_1m', 'False')
+        self.assertEqual(get_leaderboard_stats()['conflict'], 1)
+
+
+class TestAnnotationIndexes(TestCase):
+    """
+    Test that annotations are unique and looked up with indexes.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com')
+
+    def assertUsesIndex(self, queryset, index=''):
+        """
+        Assert that the query plan of a queryset searches an index instead
+        of scanning the annotations.
+
+        Parameters
+        ----------
+        queryset : QuerySet
+            The query to be checked.
+        index : str, optional
+            The name of the index which should be used.
+
+        Returns
+        -------
+        N/A
+
+        """
+        plan = queryset.explain()
+        self.assertNotIn('SCAN', plan)
+        self.assertRegex(plan, f'USING (COVERING )?INDEX {index}')
+
+    def test_submit(self):
+        """
+        Test that submitting an annotation again changes it in place only if
+        the decision or comments changed.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        first_date = timezone.now()
+        submissions = [('True', first_date), ('True', timezone.now()),
+                       ('False', timezone.now())]
+        changed = []
+        for decision, decision_date in submissions:
+            changed.append(Annotation(
+                user=self.user, project='sample_data', record='v101l',
+                event='v101l_1m', decision=decision,
+                decision_date=decision_date
+            ).submit())
+        self.assertEqual(changed, [True, False, True])
+        self.assertEqual(
+            list(Annotation.objects.values_list('decision', 'decision_date')),
+            [('False', submissions[-1][1])]
+        )
+        # An adjudication of the same event is a separate annotation
+        self.assertTrue(Annotation(
+            user=self.user, project='sample_data', record='v101l',
+            event='v101l_1m', decision='True', decision_date=first_date,
+            is_adjudication=True
+        ).submit())
+        self.assertEqual(Annotation.objects.count(), 2)
+        with self.assertRaises(IntegrityError):
+            Annotation.objects.create(user=self.user, project='sample_data',
+                                      record='v101l', event='v101l_1m',
+                                      decision='True', is_adjudication=False)
+
+    def test_submit_errors(self):
+        """
+        Test that submitting an annotation which fails for any reason other
+        than already existing raises the error instead of being ignored.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with self.assertRaises(IntegrityError):
+            Annotation(
+                user=self.user, project='sample_data', record='v101l',
+                event='v101l_1m', decision='True',
+                decision_date=timezone.now(), is_adjudication=None
+            ).submit()
+        self.assertFalse(Annotation.objects.exists())
+
+    def test_adjudication_not_null(self):
+        """
+        Test that annotations must be marked as adjudications or not, since
+        a NULL would not be checked by the unique constraint.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        with self.assertRaises(IntegrityError):
+            Annotation.objects.create(user=self.user, project='sample_data',
+                                      record='v101l', event='v101l_1m',
+                                      decision='True', is_adjudication=None)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks SQLite query plans')
+    def test_query_plans(self):
+        """
+        Test that the annotations of a user, an event and a date range are
+        found using indexes.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        self.assertUsesIndex(Annotation.objects.filter(
+            user=self.user, project='sample_data', record='v101l',
+            event='v101l_1m', is_adjudication=False
+        ))
+        self.assertUsesIndex(Annotation.objects.filter(
+            project='sample_data', record='v101l', event='v101l_1m'
+        ), index='annotation_event_idx')
+        self.assertUsesIndex(Annotation.objects.filter(
+            decision_date__gte=timezone.now()
+        ), index='annotation_date_idx')
+
+
+class TestCallbackQueries(TestCase):
+    """
+    Test that each Dash callback fetches every row at most once per request.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='annotator',
+                                        email='annotator@example.com',
+                                        is_admin=True)
+        UserSettings.objects.create(user=self.user)
+        self.flask_app = flask.Flask(__name__)
+
+    def tearDown(self):
+        del middleware._thread_locals.request
+
+    def call_callback(self, callback, triggered, *args):
+        """
+        Call a callback the way a new Dash update request would.
+
+        Parameters
+        ----------
+        callback : function
+            The callback to be called.
+        triggered : list[dict]
+            The inputs which triggered the callback.
+        *args
+            The inputs and states of the callback.
+
+        Returns
+        -------
+        N/A : tuple
+            The outputs of the callback.
+
+        """
+        request = RequestFactory().post('/')
+        request.user = self.user
+        middleware._thread_locals.request = request
+        with self.flask_app.test_request_context(json={}):
+            flask.g.triggered_inputs = triggered
+            return callback(*args)
+
+    def test_next_annotation(self):
+        """
+        Test the queries of moving to the next event.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        triggered = [{'prop_id': 'next_annotation.n_clicks_timestamp',
+                      'value': 1}]
+        # User, annotations and user settings for the prefetcher
+        with self.assertNumQueries(3):
+            outputs = self.call_callback(
+                waveform_vis.get_record_event_options, triggered, None, None,
+                1, '', '', '', 'sample_data', 'v101l', 'v101l_1m', None, ''
+            )
+        self.assertEqual(outputs[4:], ('sample_data', 'v111l', 'v111l_1m'))
+
+    def test_submit_annotation(self):
+        """
+        Test the queries of submitting a new and a changed annotation.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        triggered = [{'prop_id': 'submit_annotation.n_clicks_timestamp',
+                      'value': 1}]
+        # User, annotations, insert, queue refresh (select and delete) and
+        # progress refresh (count, update and insert) within a savepoint, and
+        # user settings for the prefetcher
+        with self.assertNumQueries(11):
+            self.call_callback(
+                waveform_vis.get_record_event_options, triggered,
+                1600000000000, None, None, '', '', '', 'sample_data', 'v101l',
+                'v101l_1m', 'True', ''
+            )
+        # The failed insert is rolled back to a savepoint before updating
+        self.call_callback(
+            waveform_vis.get_record_event_options, triggered, 1600000060000,
+            None, None, '', '', '', 'sample_data', 'v101l', 'v101l_1m',
+            'False', 'Noise'
+        )
+        self.assertEqual(
+            list(Annotation.objects.values_list('decision', 'comments')),
+            [('False', 'Noise')]
+        )
+
+    def test_update_graph(self):
+        """
+        Test the queries of showing an event to an annotator.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        # User, user settings and the previous annotation
+        with self.assertNumQueries(3):
+            self.call_callback(
+                waveform_vis.update_graph, [],
+                [{'props': {'children': ['v101l_1m']}}],
+                [{'props': {'children': ['v101l']}}],
+                [{'props': {'children': ['sample_data']}}]
+            )
+
+    def test_update_graph_adjudicate(self):
+        """
+        Test the queries of showing an event to an adjudicator.
+
+        Parameters
+        ----------
+        N/A
+
+        Returns
+        -------
+        N/A
+
+        """
+        # User, user settings and the conflicting annotations
+        with self.assertNumQueries(3):
+            self.call_callback(
+                waveform_vis_adjudicate.update_graph, [],
+                [{'props': {'children': ['sample_data']}}],
+                [{'props': {'children': ['v101l']}}],
+                [{'props': {'children': ['v101l_1m']}}]
+            )
@@ -18,6 +18,7 @@ urlpatterns = [
     path('annotations/', views.render_annotations, name='render_annotations'),
     path('annotations/delete/<set_project>/<set_record>/<set_event>/', views.delete_annotation, name='delete_annotation'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('event_data/', views.event_data, name='event_data'),
     path('tutorial/', views.viewer_tutorial, name='viewer_tutorial'),
     path('practice/', views.practice_test, name='practice_test'),
     path('settings/', views.viewer_settings, name='viewer_settings'),
@@ -1,22 +1,33 @@
-from collections import Counter, defaultdict
-import csv
-from datetime import timedelta
+from collections import defaultdict
+from datetime import datetime, time, timedelta
 from operator import itemgetter
-import os
 import random as rd
+import tempfile
 
 from django import forms
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import (FileResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
 from django.shortcuts import redirect, render
 from django.utils import timezone
-import pandas as pd
-from pathlib import Path
 
+from waveforms.catalog import catalog
+from waveforms.dash_apps.finished_apps.waveform_vis_tools import WaveformVizTools
+from waveforms.event_data import get_data_events, iter_event_data_npz
+from waveforms.exports import (get_event_consensus, get_export_annotations,
+                               iter_annotations_csv, pq,
+                               write_annotations_parquet,
+                               write_consensus_parquet)
 from waveforms.forms import GraphSettings, InviteUserForm
-from waveforms.models import Annotation, InvitedEmails, User, UserSettings
+from waveforms.models import (LEADERBOARD_CACHE_KEY, Annotation, Assignment,
+                              ConflictingEvent, InvitedEmails, User,
+                              UserProgress, UserSettings)
 from website.settings import base
 
 
@@ -45,42 +56,10 @@ def user_rank(global_ranks, username):
     return user_data
 
 
-def update_assignments(csv_data, project_folder):
-    """
-    Update the assignment CSV file to include new assignments.
-
-    Parameters
-    ----------
-    csv_data : str : [str]
-        A map where event names are the keys and lists of assigned users are
-        the values.
-    project_folder : str
-        The name of the folder whose assignments will be updated.
-
-    Returns
-    -------
-    N/A
-
-    """
-    csv_path = Path(base.HEAD_DIR)/'record-files'/project_folder/base.ASSIGNMENT_FILE
-    with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
-        csvwriter = csv.writer(csv_file)
-        csvwriter.writerow(['Events', 'Users Assigned'])
-        for event,user in csv_data.items():
-            if user:
-                row = [event]
-                if type(user) is str:
-                    row.extend({user})
-                else:
-                    row.extend(set(user))
-                csvwriter.writerows([row])
-
-
 def get_all_assignments(project_folder):
     """
     Return a dictionary that holds events as keys and a list assigned to users
-    as values, based on the assignment CSV file as well as completed
-    annotations.
+    as values, based on the assignments as well as completed annotations.
 
     Parameters
     ----------
@@ -90,32 +69,15 @@ def get_all_assignments(project_folder):
     Returns
     -------
     N/A : dict
-        Data within the CSV file.
+        The users assigned to each event.
 
     """
-    # Find the files
-    BASE_DIR = base.BASE_DIR
-    FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-    FILE_LOCAL = os.path.join('record-files')
-    PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
-    csv_path = os.path.join(PROJECT_PATH, project_folder, base.ASSIGNMENT_FILE)
-
     csv_data = {}
-    with open(csv_path, 'r') as csv_file:
-        csvreader = csv.reader(csv_file, delimiter=',')
-        try:
-            next(csvreader)
-        except StopIteration:
-            return csv_data
-        for row in csvreader:
-            names = []
-            for val in row[1:]:
-                if val:
-                    names.append(val)
-            try:
-                csv_data[row[0]] = names
-            except IndexError:
-                break
+    assignments = Assignment.objects.filter(
+        project=project_folder
+    ).order_by('id').values_list('event', 'user__username')
+    for event, username in assignments:
+        csv_data.setdefault(event, []).append(username)
 
     anns = Annotation.objects.filter(
         project=project_folder, is_adjudication=False).values_list(*['event','user__username'])
@@ -154,7 +116,7 @@ def get_practice_anns(ann):
 
 def get_user_events(user, project_folder):
     """
-    Get the events assigned to a user in the CSV file.
+    Get the events assigned to a user in a project.
 
     Parameters
     ----------
@@ -169,12 +131,6 @@ def get_user_events(user, project_folder):
         List of events assigned to the user.
 
     """
-    # Find the files
-    BASE_DIR = base.BASE_DIR
-    FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-    FILE_LOCAL = os.path.join('record-files')
-    PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
-
     if user.practice_status != 'ED':
         events_per_proj = [list(events.keys()) for events in base.PRACTICE_SET.values()]
         events = []
@@ -182,22 +138,9 @@ def get_user_events(user, project_folder):
             events += i
         return events
     else:
-        csv_path = os.path.join(PROJECT_PATH, project_folder,
-                                base.ASSIGNMENT_FILE)
-        event_list = []
-        with open(csv_path, 'r') as csv_file:
-            csvreader = csv.reader(csv_file, delimiter=',')
-            try:
-                next(csvreader)
-                for row in csvreader:
-                    names = []
-                    for val in row[1:]:
-                        if val:
-                            names.append(val)
-                    if user.username in names:
-                        event_list.append(row[0])
-            except StopIteration:
-                pass
+        event_list = list(Assignment.objects.filter(
+            user=user, project=project_folder
+        ).order_by('id').values_list('event', flat=True))
 
         user_ann = Annotation.objects.filter(user=user,
                                              project=project_folder,
@@ -266,24 +209,28 @@ def admin_console(request):
 
     if request.method == 'POST':
         if 'ann_to_csv' in request.POST:
-            all_anns_keys = [
-                'user__username', 'project', 'record', 'event', 'decision',
-                'comments', 'decision_date', 'is_adjudication'
-            ]
-            all_anns = list(Annotation.objects.values(*all_anns_keys))
-            all_anns = [
-                a for a in all_anns if not (base.PRACTICE_SET.get(a['project']) and \
-                    base.PRACTICE_SET.get(a['project']).get(a['event'])) 
-            ]
-            csv_columns = ['username', 'project', 'record', 'event',
-                           'decision', 'comments', 'date', 'is_adjudication']
-            all_anns = {csv_columns[i]: [d.get(k) for d in all_anns] for i,k in enumerate(all_anns_keys)}
-            all_anns['decision'] = [str(d) for d in all_anns['decision']]
-            csv_df = pd.DataFrame.from_dict(all_anns)
-            response = HttpResponse(content_type='text/csv')
+            response = StreamingHttpResponse(
+                iter_annotations_csv(get_export_annotations()),
+                content_type='text/csv'
+            )
             response['Content-Disposition'] = 'attachment; filename=all_anns.csv'
-            csv_df.to_csv(path_or_buf=response, sep=',', index=False)
             return response
+        elif ('ann_to_parquet' in request.POST) or ('consensus_to_parquet' in request.POST):
+            if pq is None:
+                messages.error(request, 'Parquet downloads require pyarrow '
+                                        'to be installed.')
+            else:
+                parquet_file = tempfile.TemporaryFile()
+                if 'ann_to_parquet' in request.POST:
+                    file_name = 'all_anns.parquet'
+                    write_annotations_parquet(parquet_file,
+                                              get_export_annotations())
+                else:
+                    file_name = 'event_consensus.parquet'
+                    write_consensus_parquet(parquet_file)
+                parquet_file.seek(0)
+                return FileResponse(parquet_file, as_attachment=True,
+                                    filename=file_name)
         elif 'invite_user' in request.POST:
             invite_user_form = InviteUserForm(request.POST)
             if invite_user_form.is_valid():
@@ -299,17 +246,19 @@ def admin_console(request):
                     contacted.""")
         elif 'end_assignment' in request.POST:
             user = User.objects.get(username=request.POST['user_info'])
-            for project in base.ALL_PROJECTS:
-                csv_data = get_all_assignments(project)
-                for event, names in csv_data.items():
-                    if user.username in names:
-                        try:
-                            Annotation.objects.get(user=user, project=project,
-                                                   event=event,
-                                                   is_adjudication=False)
-                        except Annotation.DoesNotExist:
-                            csv_data[event].remove(user.username)
-                update_assignments(csv_data, project)
+            # Remove the user's assignments which they have not annotated
+            user_anns = Annotation.objects.filter(
+                user=user, project=OuterRef('project'),
+                event=OuterRef('event'), is_adjudication=False
+            )
+            with transaction.atomic():
+                Assignment.objects.filter(
+                    user=user, project__in=base.ALL_PROJECTS
+                ).annotate(
+                    is_annotated=Exists(user_anns)
+                ).filter(is_annotated=False).delete()
+                for project in base.ALL_PROJECTS:
+                    UserProgress.refresh(user.id, project)
             return redirect('admin_console')
         elif 'add_admin' in request.POST:
             new_admin = User.objects.get(
@@ -336,11 +285,16 @@ def admin_console(request):
             new_adjudicator.is_adjudicator = False
             new_adjudicator.save()
 
-    # Find the files
-    BASE_DIR = base.BASE_DIR
-    FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-    FILE_LOCAL = os.path.join('record-files')
-    PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
+    # Get all the annotations at once, grouped by event
+    event_anns = defaultdict(list)
+    all_annotations = Annotation.objects.filter(
+        project__in=base.ALL_PROJECTS
+    ).order_by('id').values_list(
+        *['project', 'record', 'event', 'user__username', 'decision',
+          'comments', 'decision_date', 'is_adjudication']
+    )
+    for ann in all_annotations:
+        event_anns[ann[:3]].append(list(ann[3:]))
 
     # Hold all of the annotation information
     all_records = {}
@@ -348,16 +302,7 @@ def admin_console(request):
     unanimous_anns = {}
     all_anns = {}
     for project in base.ALL_PROJECTS:
-        records_path = os.path.join(PROJECT_PATH, project,
-                                    base.RECORDS_FILE)
-        with open(records_path, 'r') as f:
-            all_records[project] = f.read().splitlines()
-
-        # Get all the annotations
-        all_annotations = Annotation.objects.filter(
-            project=project).values_list(*['record','event'])
-        records = [a[0] for a in all_annotations]
-        events = [a[1] for a in all_annotations]
+        all_records[project] = catalog.get_records(project)
 
         conflict_anns[project] = defaultdict(dict)
         unanimous_anns[project] = defaultdict(dict)
@@ -365,42 +310,16 @@ def admin_console(request):
 
         # Get the events
         for rec in all_records[project]:
-            records_path = os.path.join(PROJECT_PATH, project, rec,
-                                        base.RECORDS_FILE)
-            with open(records_path, 'r') as f:
-                all_events = f.read().splitlines()
-            all_events = [e for e in all_events if '_' in e]
-            for evt in all_events:
+            for evt in catalog.get_events(project, rec):
                 # Add annotations by event
-                temp_conflict_anns = []
-                temp_unanimous_anns = []
-                temp_all_anns = []
-                if (rec in records) and (evt in events):
-                    same_anns = Annotation.objects.filter(
-                        project=project, record=rec, event=evt
-                    ).values_list(
-                        *['decision', 'user__username', 'comments',
-                          'decision_date', 'is_adjudication']
-                    )
-                    if len(set([a[0] for a in same_anns])) > 1:
-                        for ann in same_anns:
-                            temp_conflict_anns.append([ann[1], ann[0], ann[2],
-                                                       ann[3], ann[4]])
-                    else:
-                        for ann in same_anns:
-                            temp_unanimous_anns.append([ann[1], ann[0], ann[2],
-                                                        ann[3], ann[4]])
+                same_anns = event_anns.get((project, rec, evt))
+                if not same_anns:
+                    all_anns[project][rec][evt] = [['-', '-', '-', '-', '-']]
+                elif len(set([a[1] for a in same_anns])) > 1:
+                    conflict_anns[project][rec][evt] = same_anns
                 else:
-                    temp_all_anns.append(['-', '-', '-', '-', '-'])
-                
-                # Get the completion stats for each record
-                if temp_conflict_anns != []:
-                    conflict_anns[project][rec][evt] = temp_conflict_anns
-                if temp_unanimous_anns != []:
-                    unanimous_anns[project][rec][evt] = temp_unanimous_anns
-                if temp_all_anns != []:
-                    all_anns[project][rec][evt] = temp_all_anns
-        
+                    unanimous_anns[project][rec][evt] = same_anns
+
         conf_page_num = request.GET.get(f"{project}_conflicts")
         unan_page_num = request.GET.get(f"{project}_unanimous")
         unfi_page_num = request.GET.get(f"{project}_unfinished")
@@ -432,6 +351,13 @@ def admin_console(request):
 
     # Get all the current and invited users
     all_users = User.objects.all()
+    events_remaining = dict(UserProgress.objects.filter(
+        project__in=base.ALL_PROJECTS
+    ).values('user_id').annotate(
+        n_remaining=Sum(F('assigned') - F('completed'))
+    ).values_list('user_id', 'n_remaining').order_by())
+    for u in all_users:
+        u.n_remaining = events_remaining.get(u.id, 0)
     invited_users = InvitedEmails.objects.all()
 
     return render(request, 'waveforms/admin_console.html',
@@ -440,6 +366,7 @@ def admin_console(request):
                    'conflict_anns': conflict_anns,
                    'unanimous_anns': unanimous_anns, 'all_anns': all_anns,
                    'all_users': all_users, 'ann_to_csv_form': ann_to_csv_form,
+                   'parquet_available': pq is not None,
                    'invite_user_form': invite_user_form,
                    'add_admin_form': add_admin_form,
                    'remove_admin_form': remove_admin_form})
@@ -480,6 +407,37 @@ def adjudicator_console(request, set_project='', set_record='', set_event=''):
                   {'user': user, 'dash_context': dash_context})
 
 
+def get_event_annotations(events):
+    """
+    Get all of the annotations of each event using a single query.
+
+    Parameters
+    ----------
+    events : list[tuple]
+        The project, record, and event of each event, beginning with those
+        three values if longer.
+
+    Returns
+    -------
+    N/A : list[list]
+        The project, record, event, username, decision, comments, and
+        decision date of each annotation of each event, in the order of the
+        events.
+
+    """
+    events = [tuple(e[:3]) for e in events]
+    event_anns = defaultdict(list)
+    all_anns = Annotation.objects.filter(
+        project__in={e[0] for e in events}, event__in={e[2] for e in events}
+    ).order_by('id').values_list(
+        'project', 'record', 'event', 'user__username', 'decision',
+        'comments', 'decision_date'
+    )
+    for ann in all_anns:
+        event_anns[ann[:3]].append(list(ann))
+    return [event_anns[e] for e in events]
+
+
 @login_required
 def render_adjudications(request):
     """
@@ -500,96 +458,69 @@ def render_adjudications(request):
     if not user.is_adjudicator:
         return redirect('waveform_published_home')
 
-    # Get info of all non-adjudicated annotations assuming non-unique event names
-    # Do not include rejected annotations
-    non_adjudicated_anns = Annotation.objects.filter(
+    # Get the completed events (should be two non-rejected annotations but I
+    # guess could be more if glitch or old data) which are conflicting and
+    # have not been adjudicated, most recent first
+    conflicting_event = ConflictingEvent.objects.filter(
+        project=OuterRef('project'), record=OuterRef('record'),
+        event=OuterRef('event')
+    )
+    incomplete_events = Annotation.objects.filter(
         is_adjudication=False, decision__in=['True', 'False', 'Uncertain']
-    ).order_by(
-        '-decision_date'
-    ).values(
+    ).values_list(
         'project', 'record', 'event'
-    )
-    all_info = [tuple(ann.values()) for ann in non_adjudicated_anns]
-    unique_anns = Counter(all_info).keys()
-    ann_counts = Counter(all_info).values()
-    # Get completed annotations (should be two but I guess could be more if
-    # glitch or old data)
-    completed_anns = [c[0] for c in list(zip(unique_anns,ann_counts)) if c[1]>=2]
-
-    # Find out which ones are conflicting
-    conflicting_anns = []
-    # Collect the unfinished adjudications
-    incomplete_adjudications = []
-    for c in completed_anns:
-        # Get all the annotations for this event
-        all_anns = Annotation.objects.filter(
-            project=c[0], record=c[1], event=c[2]
-        )
-        is_adjudicated = True in [a.is_adjudication for a in all_anns]
-        if not is_adjudicated:
-            # Make sure the annotations are complete
-            current_anns = all_anns.filter(is_adjudication=False).values_list('decision', flat=True)
-            is_conflicting = len(set(current_anns)) >= 2
-            # Make sure there are conflicting decisions and no adjudications already
-            if is_conflicting:
-                conflicting_anns.append(c)
-                # Add the unfinished adjudications
-                temp_anns = all_anns.values_list(
-                    'project', 'record', 'event', 'user__username',
-                    'decision', 'comments', 'decision_date'
-                )
-                incomplete_adjudications.append([list(ann) for ann in temp_anns])
+    ).annotate(
+        n_anns=Count('id'), last_date=Max('decision_date'),
+        is_conflicting=Exists(conflicting_event)
+    ).filter(
+        n_anns__gte=2, is_conflicting=True
+    ).order_by('-last_date', 'project', 'record', 'event')
 
     # Get info of all adjudicated annotations
-    adjudicated_anns = Annotation.objects.filter(
+    complete_events = Annotation.objects.filter(
         is_adjudication=True
     ).order_by(
-        '-decision_date'
+        '-decision_date', 'id'
     ).values_list(
         'project', 'record', 'event'
     )
-    # Collect the finished adjudications
-    complete_adjudications = []
-    for current_ann in adjudicated_anns:
-        all_anns = Annotation.objects.filter(
-            project=current_ann[0], record=current_ann[1], event=current_ann[2]
-        ).values_list(
-            'project', 'record', 'event', 'user__username', 'decision',
-            'comments', 'decision_date'
-        )
-        complete_adjudications.append([list(ann) for ann in all_anns])
 
     search = {}
     if request.GET.get('record'):
-        # TODO: only works if > 0 of each adjudication
-        all_inc_recs = [v[0][1] for v in incomplete_adjudications]
-        all_com_recs = [v[0][1] for v in complete_adjudications]
         results = {
-            'com' : [complete_adjudications[i] for i,x in enumerate(all_com_recs) if x==request.GET['record']],
-            'inc' : [incomplete_adjudications[i] for i,x in enumerate(all_inc_recs) if x==request.GET['record']]
+            'com': get_event_annotations(
+                complete_events.filter(record=request.GET['record'])
+            ),
+            'inc': get_event_annotations(
+                incomplete_events.filter(record=request.GET['record'])
+            )
         }
-        if list(results.values()) == [None, None]:
+        if not any(results.values()):
             messages.error(request, 'Record not found')
         else:
             search = {k:v for k,v in results.items() if v}
 
     # TODO: let the user decide the max annotations per page?
-    n_complete = len(complete_adjudications)
+    n_complete = complete_events.count()
     complete_page_num = request.GET.get('complete_page')
     if complete_page_num == 'all':
-        pag_complete = Paginator(tuple(complete_adjudications), len(complete_adjudications))
+        pag_complete = Paginator(complete_events, n_complete)
     else:
-        pag_complete = Paginator(tuple(complete_adjudications), 5)
+        pag_complete = Paginator(complete_events, 5)
     complete_page = pag_complete.get_page(complete_page_num)
+    complete_page.object_list = get_event_annotations(complete_page.object_list)
     complete_adjudications = complete_page
 
-    n_incomplete = len(incomplete_adjudications)
+    n_incomplete = incomplete_events.count()
     incomplete_page_num = request.GET.get('incomplete_page')
     if incomplete_page_num == 'all':
-        pag_incomplete = Paginator(tuple(incomplete_adjudications), len(incomplete_adjudications))
+        pag_incomplete = Paginator(incomplete_events, n_incomplete)
     else:
-        pag_incomplete = Paginator(tuple(incomplete_adjudications), 5)
+        pag_incomplete = Paginator(incomplete_events, 5)
     incomplete_page = pag_incomplete.get_page(incomplete_page_num)
+    incomplete_page.object_list = get_event_annotations(
+        incomplete_page.object_list
+    )
     incomplete_adjudications = incomplete_page
 
     categories = [
@@ -599,8 +530,8 @@ def render_adjudications(request):
         'comments',
         'decision_date'
     ]
-    total_anns = len(adjudicated_anns) + len(conflicting_anns)
-    all_anns_frac = f'{len(adjudicated_anns)}/{total_anns}'
+    total_anns = n_complete + n_incomplete
+    all_anns_frac = f'{n_complete}/{total_anns}'
 
     return render(request, 'waveforms/adjudications.html',
                   {'user': user, 'all_anns_frac': all_anns_frac,
@@ -659,12 +590,6 @@ def render_annotations(request):
         HTML webpage responsible for displaying the annotations.
 
     """
-    # Find the files
-    BASE_DIR = base.BASE_DIR
-    FILE_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
-    FILE_LOCAL = os.path.join('record-files')
-    PROJECT_PATH = os.path.join(FILE_ROOT, FILE_LOCAL)
-
     # Get all the annotations for the requested user
     user = User.objects.get(username=request.user)
     # All annotations
@@ -705,17 +630,8 @@ def render_annotations(request):
     user_events = {}
     if user.is_admin and user.practice_status == 'ED':
         for project in all_projects:
-            user_events[project] = []
-            records_path = os.path.join(PROJECT_PATH, project,
-                                        base.RECORDS_FILE)
-            with open(records_path, 'r') as f:
-                user_records[project] = f.read().splitlines()
-            for record in user_records[project]:
-                event_path = os.path.join(PROJECT_PATH, project, record,
-                                        base.RECORDS_FILE)
-                with open(event_path, 'r') as f:
-                    user_events[project] += f.read().splitlines()
-            user_events[project] = [e for e in user_events[project] if '_' in e]
+            user_records[project] = catalog.get_records(project)
+            user_events[project] = catalog.get_events(project)
     else:
         for project in all_projects:
             user_events[project] = get_user_events(user, project) if user.practice_status == 'ED' \
@@ -728,8 +644,18 @@ def render_annotations(request):
                 if rec not in user_records[project]:
                     user_records[project].append(rec)
 
-    # Get the total number of annotations
-    total_anns = sum([len(user_events[k]) for k in user_events.keys()])
+    # Get the total number of annotations, from the progress counters for
+    # annotators working on their assignment
+    if user.is_admin or user.practice_status != 'ED':
+        total_anns = sum([len(user_events[k]) for k in user_events.keys()])
+        n_completed = len(completed_annotations)
+    else:
+        progress = user.progress.filter(project__in=all_projects).aggregate(
+            assigned=Coalesce(Sum('assigned'), 0),
+            completed=Coalesce(Sum('completed'), 0)
+        )
+        total_anns = progress['assigned']
+        n_completed = progress['completed']
 
     # Display user events
     for project,record_list in user_records.items():
@@ -828,31 +754,19 @@ def render_annotations(request):
         'comments',
         'decision_date'
     ]
-    all_anns_frac = f'{len(completed_annotations)}/{total_anns}'
-    finished_assignment = len(completed_annotations) == total_anns
+    all_anns_frac = f'{n_completed}/{total_anns}'
+    finished_assignment = n_completed == total_anns
     if request.method == 'POST':
         if 'new_assignment' in request.POST:
-            record_dir = Path(base.HEAD_DIR)/'record-files'
             available_projects = [p for p in all_projects if p not in base.BLACKLIST]
             num_events = int(request.POST['num_events'])
             assigned_events = {}
             unassigned_events = {}
+            new_assignments = []
 
             for project in available_projects:
                 assigned_events[project] = get_all_assignments(project)
-                project_dir = record_dir/project
-
-                records_path = project_dir/base.RECORDS_FILE
-                with open(records_path, 'r') as f:
-                    record_list = f.read().splitlines()
-                proj_events = []
-
-                for record in record_list:
-                    event_path = project_dir/record/base.RECORDS_FILE
-                    with open(event_path, 'r') as f:
-                        proj_events += f.read().splitlines()
-                proj_events = [e for e in proj_events if '_' in e]
-                for event in proj_events:
+                for event in catalog.get_events(project):
                     if event not in assigned_events[project].keys():
                         try:
                             unassigned_events[project].append(event)
@@ -865,6 +779,7 @@ def render_annotations(request):
                     if (len(assignees) == 1) and (user.username not in assignees):
                         assignees.append(user.username)
                         assigned_events[project][event] = assignees
+                        new_assignments.append((project, event))
                         num_events -= 1
                         if num_events == 0:
                             break
@@ -882,13 +797,20 @@ def render_annotations(request):
                 if unassigned_events.get(rand_project):
                     rand_event = rd.choice(unassigned_events[rand_project])
                     assigned_events[rand_project][rand_event] = [user.username]
+                    new_assignments.append((rand_project, rand_event))
                     unassigned_events[rand_project].remove(rand_event)
                     num_events -= 1
                 else:
                     available_projects.remove(rand_project)
 
-            for proj,data in assigned_events.items():
-                update_assignments(data, proj)
+            with transaction.atomic():
+                Assignment.objects.bulk_create([
+                    Assignment(user=user, project=proj,
+                               record=event.split('_')[0], event=event)
+                    for proj,event in new_assignments
+                ], ignore_conflicts=True)
+                for project in {proj for proj,_ in new_assignments}:
+                    UserProgress.refresh(user.id, project)
 
             # Update the user's assignment start date
             if num_events:
@@ -911,7 +833,7 @@ def render_annotations(request):
                    'incompleted_anns': incompleted_anns,
                    'incomplete_page': incomplete_page,
                    'finished_assignment': finished_assignment,
-                   'remaining': total_anns - len(completed_annotations),
+                   'remaining': total_anns - n_completed,
                    'save_warning': save_warning})
 
 
@@ -948,160 +870,140 @@ def delete_annotation(request, set_project, set_record, set_event):
     return render_annotations(request)
 
 
+def get_leaderboard_stats():
+    """
+    Get the annotation counts of every user and the consensus of every
+    event, cached for a short time or until the annotations change.
+
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    stats : dict
+        The ranked `[username, count]` lists of each user category
+        (`glob_today`, `glob_week`, `glob_month`, `glob_all`, `glob_true`,
+        `glob_false`) and the number of events in each consensus category.
+
+    """
+    stats = cache.get(LEADERBOARD_CACHE_KEY)
+    if stats is not None:
+        return stats
+
+    # Compare against the start of each day so the date index can be used
+    now = timezone.localdate()
+    one_day, one_week, one_month = [
+        timezone.make_aware(datetime.combine(now - timedelta(days=d),
+                                             time.min))
+        for d in [1, 7, 30]
+    ]
+
+    # Get global leaderboard info
+    user_anns = Q(annotation__is_adjudication=False) & ~Q(
+        annotation__decision='Save for Later'
+    )
+    user_counts = User.objects.annotate(
+        num_today=Count('annotation', filter=user_anns & Q(
+            annotation__decision_date__gte=one_day
+        )),
+        num_week=Count('annotation', filter=user_anns & Q(
+            annotation__decision_date__gte=one_week
+        )),
+        num_month=Count('annotation', filter=user_anns & Q(
+            annotation__decision_date__gte=one_month
+        )),
+        num_all=Count('annotation', filter=user_anns),
+        num_true=Count('annotation', filter=user_anns & Q(
+            annotation__decision='True'
+        ))
+    ).order_by('id').values_list(
+        'username', 'num_today', 'num_week', 'num_month', 'num_all',
+        'num_true'
+    )
+    stats = {
+        'glob_today': [], 'glob_week': [], 'glob_month': [], 'glob_all': [],
+        'glob_true': [], 'glob_false': []
+    }
+    for username, *counts in user_counts:
+        # Everything except true alarms counts as false
+        counts.append(counts[3] - counts[4])
+        for category,count in zip(stats, counts):
+            stats[category].append([username, count])
+    for category in stats:
+        stats[category] = sorted(stats[category], key=itemgetter(1),
+                                 reverse=True)
+
+    # Get number of all events
+    event_stats = dict.fromkeys([
+        'num_events', 'no_anns', 'one_ann', 'unan_true', 'unan_false',
+        'unan_uncertain', 'unan_reject', 'conflict', 'true_adj', 'false_adj',
+        'uncertain_adj', 'reject_adj'
+    ], 0)
+    for _, _, _, _, outcome, _ in get_event_consensus():
+        event_stats['num_events'] += 1
+        if outcome:
+            event_stats[outcome] += 1
+    stats.update(event_stats)
+
+    cache.set(LEADERBOARD_CACHE_KEY, stats, base.LEADERBOARD_CACHE_TIMEOUT)
+    return stats
+
+
 @login_required()
 def leaderboard(request):
     current_user = User.objects.get(username=request.user.username)
-    all_users = User.objects.all()
-    now = timezone.now().date()
-    one_day = now - timedelta(days=1)
-    one_week = now - timedelta(days=7)
-    one_month = now - timedelta(days=30)
-
-    # Get global leaderboard info
-    glob_today = []
-    glob_week = []
-    glob_month = []
-    glob_all = []
-    glob_true = []
-    glob_false = []
-    for user in all_users:
-        user_anns = Annotation.objects.filter(
-            user=user, is_adjudication=False
-        ).exclude(
-            decision='Save for Later'
-        ).values_list(
-            'decision_date__date', 'decision'
-        )
-        num_today = 0
-        num_week = 0
-        num_month = 0
-        num_all = 0
-        num_true = 0
-        num_false = 0
-        for ann in user_anns:
-            if ann[0] >= one_day:
-                num_today += 1
-            if ann[0] >= one_week:
-                num_week += 1
-            if ann[0] >= one_month:
-                num_month += 1
-            if ann[1] == 'True':
-                num_true += 1
-            else:
-                num_false += 1
-            num_all += 1
-        glob_today.append([user.username, num_today])
-        glob_week.append([user.username, num_week])
-        glob_month.append([user.username, num_month])
-        glob_all.append([user.username, num_all])
-        glob_true.append([user.username, num_true])
-        glob_false.append([user.username, num_false])
-
-    glob_today = sorted(glob_today, key=itemgetter(1), reverse=True)
-    glob_week = sorted(glob_week, key=itemgetter(1), reverse=True)
-    glob_month = sorted(glob_month, key=itemgetter(1), reverse=True)
-    glob_all = sorted(glob_all, key=itemgetter(1), reverse=True)
-    glob_true = sorted(glob_true, key=itemgetter(1), reverse=True)
-    glob_false = sorted(glob_false, key=itemgetter(1), reverse=True)
+    stats = get_leaderboard_stats()
 
     # Extract User stats
     username = current_user.username
-    user_today = user_rank(glob_today, username)
-    user_week = user_rank(glob_week, username)
-    user_month = user_rank(glob_month, username)
-    user_all = user_rank(glob_all, username)
-    user_true = user_rank(glob_true, username)
-    user_false = user_rank(glob_false, username)
+    user_stats = {
+        'user_today': user_rank(stats['glob_today'], username),
+        'user_week': user_rank(stats['glob_week'], username),
+        'user_month': user_rank(stats['glob_month'], username),
+        'user_all': user_rank(stats['glob_all'], username),
+        'user_true': user_rank(stats['glob_true'], username),
+        'user_false': user_rank(stats['glob_false'], username)
+    }
 
-    # Get number of all events
-    record_dir = Path(base.HEAD_DIR)/'record-files'
-    project_list = [p for p in base.ALL_PROJECTS if p not in base.BLACKLIST]
+    return render(request, 'waveforms/leaderboard.html',
+                  {'user': current_user, **stats, **user_stats})
 
-    all_annotations = Annotation.objects.all()
-    ann_counts = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
 
-    for ann in all_annotations:
-        proj = ann.project
-        rec = ann.record
-        evt = ann.event
-        is_adj = ann.is_adjudication
-        decision = ann.decision
-        ann_counts[proj][rec][evt].append((decision, is_adj))
-
-    num_events = 0
-    no_anns = 0
-    one_ann = 0
-    unan_true = 0
-    unan_false = 0
-    unan_uncertain = 0
-    unan_reject = 0
-    conflict = 0
-    true_adj = 0
-    false_adj = 0
-    uncertain_adj = 0
-    reject_adj = 0
-    for project in project_list:
-        project_dir = record_dir/project
-        record_dirs = project_dir/base.RECORDS_FILE
-        with open(record_dirs, 'r') as f:
-            record_list = f.read().splitlines()
-        record_list = [project_dir/r for r in record_list]
-        for record in record_list:
-            record_file = record/base.RECORDS_FILE
-            try:
-                with open(record_file, 'r') as f:
-                    events = f.read().splitlines()[1:]
-            except FileNotFoundError:
-                continue
-
-            for event in events:
-                num_events += 1
-                anns = ann_counts[project][record.stem][event]
-                adj = [a for a in anns if a[1]]
-
-                if not adj:
-                    if len(anns) == 0:
-                        no_anns += 1
-                    elif len(anns) == 1:
-                        one_ann += 1
-                    elif len(anns) == 2:
-                        if (anns[0][0] == 'True') and (anns[1][0] == 'True'):
-                            unan_true += 1
-                        elif (anns[0][0] == 'False') and (anns[1][0] == 'False'):
-                            unan_false += 1
-                        elif (anns[0][0] == 'Uncertain') and (anns[1][0] == 'Uncertain'):
-                            unan_uncertain += 1
-                        elif 'Reject' in [anns[0][0], anns[1][0]]:
-                            # Annotation is rejected if only one person thinks
-                            # it should be
-                            unan_reject += 1
-                        else:
-                            conflict += 1
-                else:
-                    decision = adj[0][0]
-                    if decision == 'True':
-                        true_adj += 1
-                    elif decision == 'False':
-                        false_adj += 1
-                    elif decision == 'Uncertain':
-                        uncertain_adj += 1
-                    elif decision == 'Reject':
-                        reject_adj += 1
+@login_required
+def event_data(request):
+    """
+    Download the signals shown to the annotators and the labels of a set of
+    events as a NumPy `.npz` archive, for training models offline. The
+    events can be filtered with the `project`, `record`, `event` and
+    `outcome` query parameters, each of which may be repeated.
 
-    return render(request, 'waveforms/leaderboard.html',
-                  {'user': current_user, 'glob_today': glob_today,
-                   'glob_week': glob_week, 'glob_month': glob_month,
-                   'glob_all': glob_all, 'glob_true': glob_true,
-                   'glob_false': glob_false, 'user_today': user_today,
-                   'user_week': user_week, 'user_month': user_month,
-                   'user_all': user_all, 'user_true': user_true,
-                   'user_false': user_false, 'one_ann': one_ann,
-                   'unan_true': unan_true, 'unan_false': unan_false,
-                   'unan_uncertain': unan_uncertain, 'unan_reject': unan_reject,
-                   'true_adj': true_adj, 'false_adj': false_adj,
-                   'uncertain_adj': uncertain_adj, 'reject_adj': reject_adj,
-                   'conflict': conflict, 'no_anns': no_anns,
-                   'num_events': num_events})
+    Parameters
+    ----------
+    N/A
+
+    Returns
+    -------
+    N/A : StreamingHttpResponse
+        The archive made by `iter_event_data_npz`.
+
+    """
+    user = User.objects.get(username=request.user.username)
+    if not user.is_admin:
+        return HttpResponseForbidden()
+
+    data_events = get_data_events(
+        projects=request.GET.getlist('project'),
+        records=request.GET.getlist('record'),
+        events=request.GET.getlist('event'),
+        outcomes=request.GET.getlist('outcome')
+    )
+    response = StreamingHttpResponse(
+        iter_event_data_npz(WaveformVizTools(user.username), data_events),
+        content_type='application/octet-stream'
+    )
+    response['Content-Disposition'] = 'attachment; filename=event_data.npz'
+    return response
 
 
 @login_required
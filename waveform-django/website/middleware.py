@@ -21,6 +21,22 @@ def get_current_user():
         return temp_user.username
 
 
+def get_request_object(model, **lookup):
+    """
+    returns `model.objects.get(**lookup)`, fetched at most once per request
+    so callbacks and helpers can look up the same row without new queries
+    """
+    request = get_current_request()
+    if request is None:
+        return model.objects.get(**lookup)
+    if not hasattr(request, "_object_cache"):
+        request._object_cache = {}
+    key = (model, tuple(sorted(lookup.items())))
+    if key not in request._object_cache:
+        request._object_cache[key] = model.objects.get(**lookup)
+    return request._object_cache[key]
+
+
 def thread_local_middleware(get_response):
     # One-time configuration and initialization.
     def middleware(request):
@@ -106,6 +106,47 @@ if CACHE:
         }
     }
 
+# How long rendered figures are kept in the cache shared by all workers
+# (seconds)
+FIGURE_CACHE_TIMEOUT = config('FIGURE_CACHE_TIMEOUT', default=24*60*60,
+                              cast=int)
+
+# How long the leaderboard is cached between annotations (seconds)
+LEADERBOARD_CACHE_TIMEOUT = config('LEADERBOARD_CACHE_TIMEOUT', default=60,
+                                   cast=int)
+
+# The maximum size of the in-process cache of decoded event signals (bytes)
+EVENT_CACHE_BYTES = config('EVENT_CACHE_BYTES', default=128*1024*1024,
+                           cast=int)
+
+# How many of the next events in an annotator's queue to render in the
+# background after each event is shown (0 to disable), and with how many
+# threads per process
+PREFETCH_EVENTS = config('PREFETCH_EVENTS', default=3, cast=int)
+PREFETCH_WORKERS = config('PREFETCH_WORKERS', default=2, cast=int)
+
+# How often the RECORDS files are checked for changes to the records and
+# events of the projects (seconds)
+CATALOG_CHECK_INTERVAL = config('CATALOG_CHECK_INTERVAL', default=30,
+                                cast=float)
+
+# Where the nightly annotation backups are written, and how often a full
+# copy is written instead of only the annotations changed since the last
+# backup (days)
+BACKUP_DIR = os.path.join(HEAD_DIR, 'backups')
+BACKUP_FULL_INTERVAL = config('BACKUP_FULL_INTERVAL', default=7, cast=int)
+
+# The most nodes a GraphQL export connection returns per page (the ceiling
+# of `first` and `last`), and the deepest nesting and most fields a query
+# may resolve before it is rejected
+GRAPHENE = {
+    'SCHEMA': 'schema.schema',
+    'RELAY_CONNECTION_MAX_LIMIT': config('GRAPHQL_MAX_PAGE_SIZE',
+                                         default=1000, cast=int),
+}
+GRAPHQL_MAX_DEPTH = config('GRAPHQL_MAX_DEPTH', default=10, cast=int)
+GRAPHQL_MAX_COST = config('GRAPHQL_MAX_COST', default=50000, cast=int)
+
 # .---------------- minute (0 - 59)
 # |  .------------- hour (0 - 23)
 # |  |  .---------- day of month (1 - 31)
@@ -232,6 +273,9 @@ STATICFILE_FINDERS = [
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 RECORDS_FILE = 'RECORDS_VTVF_LIMIT-5'
+# Where `./manage.py build_signal_store` writes the memory-mapped signals
+SIGNAL_STORE_DIR = os.path.join(HEAD_DIR, 'signal-store')
+# Used by `./manage.py assignments` to import or export the assignments
 ASSIGNMENT_FILE = 'user_assignments.csv'
 ALL_PROJECTS = ['sample_data']
 